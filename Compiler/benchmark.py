@@ -0,0 +1,147 @@
+"""Micro-benchmarks for the compiler front end.
+
+Usage: python3 benchmark.py tokenizer|parser|ast|frontend PATH [PATH ...]
+       python3 benchmark.py nesting DEPTH [DEPTH ...]
+where each PATH is a .jack file or a directory containing .jack files.
+  tokenizer  compares the tokenizer engines
+  parser     measures the parser on tokens that were already scanned, in tokens/s
+  ast        compares parsing to a JackAST with parsing and generating the VM code from the tree
+  frontend   compares XML plus VM output from separate parses with both from a single parse
+  nesting    compiles generated expressions that nest parentheses, unary operators and array
+             indexes DEPTH deep"""
+from compilationengine import CompilationEngine, compile_to_vm
+from jackast import JackParser, parse_class
+from jacktokenizer import TOKENIZERS, RegexJackTokenizer
+import io
+import os
+import sys
+import time
+
+REPEAT = 5
+
+
+def jack_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+        else:
+            files += [os.path.join(path, f) for f in sorted(os.listdir(path)) if f[-5:] == ".jack"]
+    return files
+
+
+def bench_tokenizer(files):
+    for name in sorted(TOKENIZERS):
+        best = None
+        for i in range(0, REPEAT):
+            start = time.perf_counter()
+            n_tokens = 0
+            for fpath in files:
+                tokenizer = TOKENIZERS[name](fpath)
+                while tokenizer.has_more_tokens():
+                    tokenizer.advance()
+                    n_tokens += 1
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        print(f"{name:>8}: {n_tokens} tokens in {best * 1000:.1f} ms ({n_tokens / best:,.0f} tokens/s)")
+
+
+def bench_parser(files):
+    streams = {fpath: RegexJackTokenizer(fpath).stream for fpath in files}
+    n_tokens = sum(len(stream) for stream in streams.values())
+    best = None
+    for i in range(0, REPEAT):
+        start = time.perf_counter()
+        for fpath, stream in streams.items():
+            JackParser(stream, fpath).parse()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print(f"{n_tokens} tokens in {best * 1000:.1f} ms ({n_tokens / best:,.0f} tokens/s)")
+
+
+# best time of REPEAT runs of run(source, fpath) over all files
+def best_time(files, run):
+    sources = {}
+    for fpath in files:
+        with open(fpath, 'r') as file:
+            sources[fpath] = file.read()
+    best = None
+    for i in range(0, REPEAT):
+        start = time.perf_counter()
+        for fpath, source in sources.items():
+            run(source, fpath)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_ast(files):
+    n_nodes = 0
+    n_bytes = 0
+    for fpath in files:
+        ast = parse_class(fpath)
+        n_nodes += len(ast)
+        n_bytes += sum(a.itemsize * len(a) for a in (ast.kinds, ast.token_index, ast.first_child,
+                                                     ast.next_sibling, ast.last_child))
+    print(f"{len(files)} files, {n_nodes} nodes in {n_bytes:,} bytes of node arrays")
+    for name, run in (("engine", lambda source, fpath: compile_to_vm(fpath, source)),
+                      ("parse", lambda source, fpath: parse_class(fpath, source))):
+        print(f"{name:>12}: {best_time(files, run) * 1000:.1f} ms")
+
+
+def xml_and_vm_separately(source, fpath):
+    parse_class(fpath, source).write_xml(io.StringIO())
+    compile_to_vm(fpath, source)
+
+
+def xml_and_vm_shared(source, fpath):
+    ast = parse_class(fpath, source)
+    ast.write_xml(io.StringIO())
+    CompilationEngine(fpath, outfile=io.StringIO(), ast=ast).compile_class()
+
+
+def bench_frontend(files):
+    for name, run in (("separate", xml_and_vm_separately), ("shared", xml_and_vm_shared)):
+        print(f"{name:>8}: {best_time(files, run) * 1000:.1f} ms")
+
+
+# expressions nested depth deep, by kind of nesting
+def nested_expressions(depth):
+    return {"parentheses": "(" * depth + "x" + " + 1)" * depth,
+            "unary": "-" * depth + "x",
+            "index": "a[" * depth + "0" + "]" * depth}
+
+
+def bench_nesting(depths):
+    for depth in depths:
+        for name, expression in nested_expressions(depth).items():
+            source = "class Main { function void main() { var int x; var Array a; let x = " + expression + \
+                "; return; } }"
+            best = best_time_of_source(source, lambda source, fpath: compile_to_vm(fpath, source))
+            print(f"{name:>12} depth {depth}: {best * 1000:.1f} ms ({best * 1e6 / depth:.2f} us per level)")
+
+
+def best_time_of_source(source, run):
+    best = None
+    for i in range(0, REPEAT):
+        start = time.perf_counter()
+        run(source, "Main.jack")
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+BENCHMARKS = {"tokenizer": bench_tokenizer, "parser": bench_parser, "ast": bench_ast, "frontend": bench_frontend}
+DEPTH_BENCHMARKS = {"nesting": bench_nesting}         # these take nesting depths instead of paths
+
+if len(sys.argv) < 3 or sys.argv[1] not in BENCHMARKS and sys.argv[1] not in DEPTH_BENCHMARKS:
+    print(__doc__)
+    sys.exit(1)
+if sys.argv[1] in DEPTH_BENCHMARKS:
+    DEPTH_BENCHMARKS[sys.argv[1]]([int(depth) for depth in sys.argv[2:]])
+else:
+    BENCHMARKS[sys.argv[1]](jack_files(sys.argv[2:]))
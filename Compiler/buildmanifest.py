@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = ".jackbuild.json"
+
+
+def file_hash(fpath):
+    with open(fpath, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+# hash of a file that an output depends on, or None if it does not exist
+def dependency_hash(fpath):
+    return file_hash(fpath) if os.path.isfile(fpath) else None
+
+# the compiler's modules whose code decides what is written for a source, directly or through the compile
+# server; editing any other file, such as a benchmark or a test script, leaves recorded outputs current
+CODE_GENERATION_MODULES = ("compilationengine.py", "compileoptions.py", "constantfolding.py", "intrinsics.py",
+                           "jackast.py", "jackinterface.py", "jacktoken.py", "jacktokenizer.py", "peephole.py",
+                           "pointerreuse.py", "symboltable.py", "vmbytecode.py", "vmwriter.py")
+
+'''compiler_version identifies the compiler that produced an output: a hash of the source files of the
+code generation modules, so that any change to the code generator invalidates previously recorded outputs'''
+def compiler_version():
+    compiler_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for fname in CODE_GENERATION_MODULES:
+        digest.update(fname.encode())
+        with open(os.path.join(compiler_dir, fname), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """Record of the last build of a directory, stored next to its outputs.
+    For each source file it keeps the hash of the source and of the output written for it,
+    together with the version of the compiler that wrote all outputs and the options that change
+    the generated code (code_key). An output may also depend on other files in the directory, such as
+    the interface files of the classes it calls: their hashes are kept too, None for files that did not exist."""
+
+    def __init__(self, directory, code_key=""):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.version = compiler_version() + " " + code_key
+        self.files = {}
+        try:
+            with open(self.path, 'r') as file:
+                recorded = json.load(file)
+            if recorded.get("compiler") == self.version:
+                self.files = recorded.get("files", {})
+        except (FileNotFoundError, ValueError):
+            pass                          # no usable manifest: everything is rebuilt
+
+    '''is_current tells whether the output of fpath was written by this compiler from the current
+    source and dependencies, and has not been changed or removed since'''
+    def is_current(self, fpath, outpath):
+        record = self.files.get(os.path.basename(fpath))
+        if record is None or not os.path.isfile(outpath):
+            return False
+        if record["source"] != file_hash(fpath) or record["output"] != file_hash(outpath):
+            return False
+        return all(dependency_hash(os.path.join(self.directory, name)) == digest
+                   for name, digest in record.get("dependencies", {}).items())
+
+    # records the output of fpath, and the files in the same directory that it was built from besides fpath
+    def record(self, fpath, outpath, dependencies=()):
+        record = {"source": file_hash(fpath), "output": file_hash(outpath)}
+        if dependencies:
+            record["dependencies"] = {os.path.basename(dpath): dependency_hash(dpath) for dpath in dependencies}
+        self.files[os.path.basename(fpath)] = record
+
+    def forget(self, fpath):
+        self.files.pop(os.path.basename(fpath), None)
+
+    # writes the manifest, without the records of sources that no longer exist
+    def save(self):
+        self.files = {name: record for name, record in self.files.items()
+                      if os.path.isfile(os.path.join(self.directory, name))}
+        temppath = self.path + ".tmp"
+        with open(temppath, 'w') as file:
+            json.dump({"compiler": self.version, "files": self.files}, file, indent=1, sort_keys=True)
+        os.replace(temppath, self.path)
@@ -0,0 +1,121 @@
+"""Checks of incremental builds with the build manifest (buildmanifest.py), on copies of tests/Square:
+  a second build skips all files, and a changed source, removed output or other options rebuild,
+  the records of deleted sources are dropped,
+  with --interfaces, a changed signature also rebuilds the classes that call it, and a changed body does not,
+  the compiler version only depends on the code generation modules.
+Usage: python3 buildmanifest_unittest.py"""
+from buildmanifest import MANIFEST_NAME, CODE_GENERATION_MODULES
+from unittestsupport import check, finish, read, write, jack_files, run_compiler, COMPILER_DIR, TESTS_DIR
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+# copies the program in tests/name to workdir and returns the copy's directory
+def copy_program(name, workdir):
+    copy = os.path.join(workdir, name)
+    shutil.rmtree(copy, ignore_errors=True)
+    os.mkdir(copy)
+    for fpath in jack_files(os.path.join(TESTS_DIR, name)):
+        shutil.copy(fpath, copy)
+    return copy
+
+# builds directory and returns the names of the sources it compiled
+def build(directory, flags=()):
+    result = run_compiler(list(flags) + [directory])
+    check(result.returncode == 0, "build of " + directory + " failed: " + result.stderr)
+    return sorted(os.path.basename(line.split()[-1]) for line in result.stdout.splitlines()
+                  if line.startswith("VM file written for "))
+
+
+def check_rebuilds(workdir):
+    square = copy_program("Square", workdir)
+    check(build(square) == ["Main.jack", "Square.jack", "SquareGame.jack"], "first build does not compile every file")
+    check(build(square) == [], "second build compiles files that did not change")
+
+    with open(os.path.join(square, "Square.jack"), 'a') as file:
+        file.write("// changed\n")
+    check(build(square) == ["Square.jack"], "changing Square.jack rebuilds other files than Square.jack")
+
+    os.remove(os.path.join(square, "Main.vm"))
+    check(build(square) == ["Main.jack"], "removing Main.vm does not rebuild exactly Main.jack")
+
+    write(os.path.join(square, "Main.vm"), "// edited by hand\n")
+    check(build(square) == ["Main.jack"], "editing Main.vm does not rebuild exactly Main.jack")
+
+    check(len(build(square, ["--fold"])) == 3, "other options do not rebuild every file")
+    check(build(square, ["--fold"]) == [], "second build with --fold compiles files that did not change")
+    check(build(square, ["--force", "--fold"]) == ["Main.jack", "Square.jack", "SquareGame.jack"],
+          "--force does not rebuild every file")
+
+
+def check_deleted_sources(workdir):
+    square = copy_program("Square", workdir)
+    build(square)
+    os.remove(os.path.join(square, "SquareGame.jack"))
+    build(square)
+    recorded = json.loads(read(os.path.join(square, MANIFEST_NAME)))["files"]
+    check(sorted(recorded) == ["Main.jack", "Square.jack"],
+          "the manifest keeps records of deleted sources: " + ", ".join(sorted(recorded)))
+
+
+def check_interface_dependencies(workdir):
+    square = copy_program("Square", workdir)
+    check(build(square, ["--interfaces"]) == ["Main.jack", "Square.jack", "SquareGame.jack"],
+          "first build with --interfaces does not compile every file")
+    fpath = os.path.join(square, "Square.jack")
+    source = read(fpath)
+    write(fpath, source.replace("do erase();", "do erase();\n      do erase();", 1))
+    check(build(square, ["--interfaces"]) == ["Square.jack"],
+          "changing the body of a subroutine of Square.jack rebuilds the classes that call it")
+    # SquareGame.jack calls moveUp without the new argument, which its rebuild must find
+    write(fpath, source.replace("method void moveUp() {", "method void moveUp(int step) {", 1))
+    result = run_compiler(["--interfaces", square])
+    rebuilt = sorted(os.path.basename(line.split()[-1]) for line in result.stdout.splitlines()
+                     if line.startswith("VM file written for "))
+    check(result.returncode == 1 and rebuilt == ["Square.jack"] and
+          "Square.moveUp takes 1 arguments, but is called with 0" in result.stdout + result.stderr,
+          "changing the signature of Square.moveUp does not rebuild SquareGame.jack:\n" + result.stdout)
+
+
+# the compiler version computed by the buildmanifest.py in directory
+def version_in(directory):
+    return subprocess.run([sys.executable, "-c", "import buildmanifest; print(buildmanifest.compiler_version())"],
+                          cwd=directory, check=True, capture_output=True, text=True).stdout
+
+
+def check_version(workdir):
+    copy = os.path.join(workdir, "compiler")
+    os.mkdir(copy)
+    for fname in CODE_GENERATION_MODULES + ("buildmanifest.py", "benchmark.py"):
+        shutil.copy(os.path.join(COMPILER_DIR, fname), copy)
+    version = version_in(copy)
+    with open(os.path.join(copy, "benchmark.py"), 'a') as file:
+        file.write("# changed\n")
+    check(version_in(copy) == version, "changing benchmark.py changes the compiler version")
+    with open(os.path.join(copy, "peephole.py"), 'a') as file:
+        file.write("# changed\n")
+    check(version_in(copy) != version, "changing peephole.py does not change the compiler version")
+
+# every module of the compiler that compiling a file imports must be part of the compiler version
+def check_generation_modules():
+    program = "import compilationengine, vmbytecode, os, sys\n" + \
+        "print('\\n'.join(sorted(os.path.basename(m.__file__) for m in list(sys.modules.values())\n" + \
+        "    if getattr(m, '__file__', None) and os.path.dirname(os.path.abspath(m.__file__)) == os.getcwd())))"
+    imported = subprocess.run([sys.executable, "-c", program], cwd=COMPILER_DIR, check=True,
+                              capture_output=True, text=True).stdout.split()
+    missing = [fname for fname in imported if fname not in CODE_GENERATION_MODULES]
+    check(not missing, "modules of the code generator missing from CODE_GENERATION_MODULES: " + ", ".join(missing))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as workdir:
+        check_rebuilds(workdir)
+        check_deleted_sources(workdir)
+        check_interface_dependencies(workdir)
+        check_version(workdir)
+    check_generation_modules()
+    finish()
@@ -1,11 +1,18 @@
-from jacktokenizer import JackTokenizer
+from collections import Counter
+import io
+from compileoptions import CompileOptions
+from constantfolding import fold_unary, fold_binary, to_int16, IDENTITY_LEFT, IDENTITY_RIGHT, ABSORBING
+from intrinsics import INTRINSICS
+from jackast import parse_class, NO_NODE, TERMINAL, CLASS_VAR_DEC, SUBROUTINE_DEC, VAR_DEC, STATEMENTS, \
+    LET_STATEMENT, IF_STATEMENT, WHILE_STATEMENT, DO_STATEMENT, RETURN_STATEMENT
+from jackinterface import InterfaceLoader
+from jacktoken import TEXT_CODE, CONSTANT_KINDS, INTEGER_CONSTANT, STRING_CONSTANT
+from peephole import PeepholeOptimizer
+from pointerreuse import PointerReuse
 from symboltable import SymbolTable
 from vmwriter import VMWriter
+import os
 
-JACK_SUBROUTINE_NAMES = ["constructor", "function", "method"]
-JACK_STATEMENT_KEYWORDS = ["if", "let", "while", "do", "return"]
-VM_SEGMENT_NAME = {"arg": "argument", "var": "local",
-                   "static": "static", "field": "this"}
 VM_UNARY_OP_NAME = {"-": "neg", "~": "not"}
 VM_BINARY_OP_NAME = {"+": "add",
                      "-": "sub",
@@ -17,83 +24,100 @@ VM_BINARY_OP_NAME = {"+": "add",
                      "*": "call Math.multiply 2",
                      "/": "call Math.divide 2"}
 JACK_UNARY_OP = "-~"
-JACK_BINARY_OP = "+-*/&|<>="
-INDENT_SIZE = 2
+# the engine looks at the integer code of a terminal's text (jacktoken.TEXT_CODE), not at the text itself
+UNARY_OP_CODES = frozenset(TEXT_CODE[op] for op in JACK_UNARY_OP)
+OPEN_PAREN, OPEN_BRACKET, DOT = (TEXT_CODE[symbol] for symbol in "([.")
+# kinds of the frames on the stack of compile_expression
+EXPRESSION, UNARY_OP, ARRAY_INDEX = range(3)
+# commands that leave a boolean (-1 for true, 0 for false) on the stack, whatever the values they work on
+BOOLEAN_COMMANDS = ("eq", "lt", "gt", "push constant 0")
+# longest add sequence that replaces a call of Math.multiply
+MAX_MULTIPLY_COMMANDS = 32
 
 SUBROUTINES_TO_DEBUG = [] # set this to a subroutine name (without classname. ) to show symboltable when compiling it
 
 
 class CompilationEngine:
+    """Writes the VM code of a class by walking its parse tree (jackast.JackAST) once, node by node."""
+
     # constructor
-    def __init__(self, filename):
-        self.writer = VMWriter(filename[:-4] + "vm")
-        self.tokenizer = JackTokenizer(filename)
+    # source and outfile optionally replace reading filename and writing the .vm file next to it,
+    # and a parse tree that was already built for the class (jackast.parse_class) replaces parsing it again.
+    # The class is parsed before the output is opened, so that a syntax error leaves an existing .vm file alone.
+    # With the interfaces option, interfaces gives the interface (jackinterface.ClassInterface) of a class name
+    # through its get method, or None for a class without one; by default, the .jif files next to filename are read
+    def __init__(self, filename, options=None, source=None, outfile=None, ast=None, interfaces=None):
+        self.options = options if options is not None else CompileOptions()
+        if ast is None:
+            ast = parse_class(filename, source, self.options.tokenizer)
+        self.ast = ast
+        self.optimizers = []
+        if self.options.array_access:
+            self.optimizers.append(PointerReuse())
+        if self.options.peephole:
+            self.optimizers.append(PeepholeOptimizer())
+        self.writer = VMWriter(filename[:-4] + "vm", outfile, self.optimizers)
+        if self.options.interfaces and interfaces is None:
+            interfaces = InterfaceLoader(os.path.dirname(filename) or ".")
+        self.interfaces = interfaces
         self.classname = None
+        self.stats = Counter()
 
         self.next_label = 1
+        # string pool: static slot of each literal of the class
+        self.string_slots = {}
+
+    # counts of the optimizations applied while compiling this class
+    def statistics(self):
+        stats = Counter(self.stats)
+        for optimizer in self.optimizers:
+            stats.update({optimizer.STATS_PREFIX + name: hits for name, hits in optimizer.hits.items()})
+        return stats
 
-    def eat(self, s):
-        for word in s.split(" "):
-            if self.tokenizer.next_content() != word:
-                raise ValueError(self.get_error(word))
-            self.tokenizer.advance()
-
-    def get_contents(self, n):
-        contents = []
-        for i in range(0, n):
-            self.tokenizer.advance()
-            contents.append(self.tokenizer.content())
-        return contents
-
-    def get_content(self):
-        self.tokenizer.advance()
-        return self.tokenizer.content()
-
-    # error message when trying to eat
-    def get_error(self, s):
-        return "while writing class " + self.classname + \
-            ", expected token " + s + \
-            ", but found token " + \
-            self.tokenizer.next_content() + \
-            " on line " + str(self.tokenizer.current_line)
+    # texts of the terminal children of node, such as the words of a declaration
+    def words(self, node):
+        return [self.ast.content(child) for child in self.ast.children(node) if self.ast.kinds[child] == TERMINAL]
 
     def compile_class(self):
         self.symboltable = SymbolTable()
-        self.eat("class")                       # class
-        self.classname = self.get_content()     # name
-        self.eat("{")                           # {
+        children = self.ast.children(0)                 # class name { classVarDec* subroutineDec* }
+        self.classname = self.ast.content(children[1])
 
         # variable declarations
-        while (self.tokenizer.next_content() != '}' and
-               self.tokenizer.next_token.content not in JACK_SUBROUTINE_NAMES):
-            self.compile_class_var_dec()
-
-        # subroutine declarations
-        while self.tokenizer.next_content() != '}':
-            self.compile_subroutine_dec()
+        for node in children:
+            if self.ast.kinds[node] == CLASS_VAR_DEC:
+                self.compile_var_dec(node)
 
-        self.eat("}")                            # }
+        # the string pool's flag and literals take the static slots after the class's own statics
+        self.string_slots = {}
+        self.string_pool_flag = self.symboltable.var_count("static")
 
-    def compile_class_var_dec(self):  # class variable declaration
-        if not (self.tokenizer.next_content() == "static" or self.tokenizer.next_content() == "field"):
-            raise ValueError("Expected static or field, but found " + self.tokenizer.next_content())
-
-        # static or field, type declaration, identifier name
-        [skind, stype, sname] = self.get_contents(3)
-        self.symboltable.define(sname, stype, skind)
-
-        while (self.tokenizer.next_content() == ","):
-            self.eat(",")
-            sname = self.get_content()
+        # subroutine declarations
+        for node in children:
+            if self.ast.kinds[node] == SUBROUTINE_DEC:
+                self.compile_subroutine_dec(node)
+
+        if self.string_slots:
+            self.compile_string_pool()
+        self.writer.close()
+
+    '''compile_var_dec defines the variables of a classVarDec or varDec node: kind, type, name (, name)* ;'''
+    def compile_var_dec(self, node):
+        words = self.words(node)
+        skind, stype = words[0], words[1]
+        for sname in words[2:-1:2]:
             self.symboltable.define(sname, stype, skind)
 
-        self.eat(";")
-
-    def compile_subroutine_dec(self):
-        [skind, rettype, sname] = self.get_contents(3)          # subroutine kind, return type, name
+    def compile_subroutine_dec(self, node):
+        children = self.ast.children(node)      # kind, return type, name ( parameterList ) subroutineBody
+        [skind, rettype, sname] = [self.ast.content(child) for child in children[:3]]
 
         self.symboltable.start_subroutine()
 
+        # the check for the string pool comes first, before the object is set up
+        if self.options.string_pool and self.uses_string_constant(node):
+            self.guard_string_pool()
+
         if skind == "constructor":
             n_fields = self.symboltable.var_count("field")
             self.writer.push("constant", n_fields)
@@ -106,85 +130,58 @@ class CompilationEngine:
             self.writer.pop("pointer", 0)                       # set the "this" pointer to argument 0
 
         # get parameters
-        self.eat("(")
-        params = self.compile_parameter_list()
-        self.eat(")")
-            
+        self.compile_parameter_list(children[4])
+
         if sname in SUBROUTINES_TO_DEBUG:
             print("current subroutine: " + sname)
             self.symboltable.diagnostics()
 
-        self.eat("{")
-        while (self.tokenizer.next_content() not in JACK_STATEMENT_KEYWORDS):  # variable declarations
-            self.compile_var_dec()
+        for child in self.ast.children(children[6]):           # { varDec* statements }
+            if self.ast.kinds[child] == VAR_DEC:
+                self.compile_var_dec(child)
+            elif self.ast.kinds[child] == STATEMENTS:
+                self.compile_statements(child)
 
-        while (self.tokenizer.next_content() != '}'):                         # statements
-            self.compile_statement()
-
-        self.eat("}")
         self.writer.putnow("function " + self.classname + "." +
                            sname + " " + str(self.symboltable.assign_next["var"]))
         self.writer.flush()
 
     '''compile_parameter_list adds parameter names to symbol table'''
-    def compile_parameter_list(self):
-        while self.tokenizer.next_content() != ')':
-            param = self.get_contents(2)
-            self.symboltable.define(param[1], param[0], "arg")
-            if self.tokenizer.next_content() != ')':  
-                self.eat(",")
-
-    def compile_var_dec(self):
-        [skind, stype, sname] = self.get_contents(3)
-        self.symboltable.define(sname, stype, skind)
-
-        while (self.tokenizer.next_content() != ';'):
-            self.eat(",")
-            sname = self.get_content()
-            self.symboltable.define(sname, stype, skind)
-
-        self.eat(";")
-
-    def compile_statement(self):
-        if self.tokenizer.next_content() not in JACK_STATEMENT_KEYWORDS:
-            raise ValueError("Expected keyword, found: " + self.tokenizer.next_content())
-
-        # dispatch to the correct statement compiler
-        statement_type = self.tokenizer.next_content()
-        if statement_type == "let":
-            self.compile_let_statement()
-        if statement_type == "do":
-            self.compile_do_statement()
-        if statement_type == "while":
-            self.compile_while_statement()
-        if statement_type == "if":
-            self.compile_if_statement()
-        if statement_type == "return":
-            self.compile_return_statement()
-
-    def compile_let_statement(self):
-        self.eat("let")                          # let
-        sname = self.get_content()               # variable name
-        stype, skind, idx = self.symboltable.get_record(sname).values()
+    def compile_parameter_list(self, node):
+        words = self.words(node)                # type name (, type name)*
+        for i in range(0, len(words), 3):
+            self.symboltable.define(words[i + 1], words[i], "arg")
+
+    def compile_statements(self, node):
+        # dispatch to the correct statement compiler through the jump table
+        statement = self.ast.first_child[node]
+        while statement != NO_NODE:
+            STATEMENT_COMPILERS[self.ast.kinds[statement]](self, statement)
+            statement = self.ast.next_sibling[statement]
+
+    def compile_let_statement(self, node):
+        children = self.ast.children(node)      # let name ([ expression ])? = expression ;
+        sname = self.ast.content(children[1])   # variable name
+        symbol = self.symboltable.get_record(sname)
 
         # are we assigning to an array?
-        assign_to_array = self.tokenizer.next_content() == '['
+        assign_to_array = self.ast.code(children[2]) == OPEN_BRACKET
 
         # then the intermediate temp register is needed to deal with examples like
         # let a[some_method(4)] = 10 * another_method(b[5]) - 3
+        if assign_to_array and self.options.array_access:
+            self.compile_array_store(symbol.segment, symbol.idx, children[3], children[6])
+            return
         if assign_to_array:
-            self.eat('[')
-            self.compile_expression()
+            self.compile_expression(children[3])
             self.writer.pop("temp", 1)
-            self.eat(']')
 
-        self.eat('=')
         # push value X of expression on top of stack
-        self.compile_expression()
+        self.compile_expression(children[-2])
 
         if assign_to_array:
             # find destination address in memory
-            self.writer.push(VM_SEGMENT_NAME[skind], idx)
+            self.writer.push(symbol.segment, symbol.idx)
             self.writer.push("temp", 1)
             self.writer.arithmetic("add")
             # pop this address to the pointer
@@ -192,19 +189,52 @@ class CompilationEngine:
             # now pop the value X to that
             self.writer.pop("that", 0)
         else:
-            self.writer.pop(VM_SEGMENT_NAME[skind], idx)
-
-        self.eat(';')                            # ;
+            self.writer.pop(symbol.segment, symbol.idx)
+
+    '''compile_array_store compiles  let a[index] = value;  for the array a in segment[idx], from the expression
+    nodes index and value, with cheaper code than the general case, which keeps the index in temp 1 while the
+    value is computed: a constant index k becomes the address offset in  pop that k, and if computing the value
+    cannot change pointer 1, the address is set before the value is computed'''
+    def compile_array_store(self, segment, idx, index, value):
+        index_start = self.writer.mark()
+        index = self.compile_expression(index)
+        value_start = self.writer.mark()
+        self.compile_expression(value)
+
+        if index is not None and index >= 0:
+            self.writer.cut(index_start, value_start)
+            self.writer.push(segment, idx)
+            self.writer.pop("pointer", 1)
+            self.writer.pop("that", index)
+            self.stats["array access: constant index"] += 1
+            return
+        value = self.writer.cut(value_start)
+        if "call " not in value and "pointer 1" not in value:
+            self.writer.push(segment, idx)
+            self.writer.arithmetic("add")
+            self.writer.pop("pointer", 1)
+            self.writer.insert(self.writer.mark(), value)
+            self.writer.pop("that", 0)
+            self.stats["array access: store without temp 1"] += 1
+            return
+        self.writer.pop("temp", 1)
+        self.writer.insert(self.writer.mark(), value)
+        self.writer.push(segment, idx)
+        self.writer.push("temp", 1)
+        self.writer.arithmetic("add")
+        self.writer.pop("pointer", 1)
+        self.writer.pop("that", 0)
 
     def fresh_label(self):
         self.next_label += 1
         return "L" + str(self.next_label - 1)
 
-    def compile_if_statement(self):
-        self.eat("if")                              # if
-        self.eat("(")                               # (condition)
-        self.compile_expression()
-        self.eat(")")
+    def compile_if_statement(self, node):
+        if self.options.branch_layout:
+            self.compile_if_statement_laid_out(node)
+            return
+        children = self.ast.children(node)          # if ( expression ) { statements } (else { statements })?
+        self.compile_expression(children[2])        # condition
 
         self.writer.arithmetic("not")
 
@@ -212,121 +242,505 @@ class CompilationEngine:
         afterif = self.fresh_label()
         self.writer.ifgoto(elseblock)
 
-        self.eat("{")                               # statement block
-        self.compile_statements()
-        self.eat("}")
+        self.compile_statements(children[5])        # statement block
         self.writer.goto(afterif)
-        
+
         self.writer.label(elseblock)
-        if self.tokenizer.next_content() == "else":  # else
-            self.eat("else")                        # statement block
-            self.eat("{")
-            self.compile_statements()
-            self.eat("}")
+        if len(children) > 7:                       # else statement block
+            self.compile_statements(children[9])
         self.writer.label(afterif)
 
-    def compile_do_statement(self):
-        self.eat("do")                   # do
-        sname = self.get_content()       # read first identifier
-        # possibly add .identifier2, push parameterlist onto stack and call
-        self.compile_call(sname)
+    def compile_do_statement(self, node):
+        # do name (. name)? ( expressionList ) ;
+        # push parameterlist onto stack and call
+        value_pushed = self.compile_call(self.ast.next_sibling[self.ast.first_child[node]], value_needed=False)
 
         # dump return value (do statement treats called function as void)
-        self.writer.pop("temp", 0)
-        self.eat(";")                         # ;
-
-    """compile_call gets the full info of a subroutine call, after having read the first name,
-    and writes the parameters and then the call command."""
-    def compile_call(self, firstname):
-        
+        if value_pushed:
+            self.writer.pop("temp", 0)
+
+    """compile_call writes the parameters and then the call command of the subroutine call whose first name
+    is the terminal node name, followed by the sibling nodes (. name)? ( expressionList ).
+    With intrinsics, some OS functions are expanded inline instead, and those that do not return a value
+    push none unless value_needed. Returns whether a return value was pushed.
+    With interfaces, firstname.secondname is a method call exactly when firstname is a variable, and calls
+    of subroutines of classes with an interface are checked against it."""
+    def compile_call(self, name, value_needed=True):
+        firstname = self.ast.content(name)
+        node = self.ast.next_sibling[name]
         n_params = 0
-        if self.tokenizer.next_content() == '.':       # CASE 1: firstname.secondname
-            self.eat(".")                              # .
-            secondname = self.get_content()            # read subroutine name
-            
-            if firstname[0].islower():                 # CASE 1a: firstname = identifier of some object instance, secondname = method
+        if self.ast.code(node) == DOT:                 # CASE 1: firstname.secondname
+            node = self.ast.next_sibling[node]
+            secondname = self.ast.content(node)         # subroutine name
+            node = self.ast.next_sibling[node]
+            if self.interfaces is not None:
+                is_method_call = self.symboltable.find(firstname) is not None
+            else:
+                is_method_call = firstname[0].islower()
+
+            if is_method_call:                         # CASE 1a: firstname = identifier of some object instance, secondname = method
                 # pass that instance as first argument
-                objkind = self.symboltable.kind_of(firstname)
-                objidx = self.symboltable.idx_of(firstname)
-                self.writer.push(VM_SEGMENT_NAME[objkind], objidx)
+                symbol = self.symboltable.get_record(firstname)
+                self.writer.push(symbol.segment, symbol.idx)
                 n_params = 1
                 # and need to call the method from that class
-                fullname = self.symboltable.type_of(firstname) + "." + secondname
+                classname = symbol.type
             else:                                       # CASE 1b: firstname = class name, secondname = function name
-                fullname = firstname + "." + secondname
+                classname = firstname
         else:                                           # CASE 2: firstname only, then the callee must be a method (!) from this class
-            fullname = self.classname + "." + firstname   
-            # pass "this" as first argument
-            self.writer.push("pointer", 0)
-            n_params = 1
-
-        self.eat("(")
-        # push expressions for explicit parameters onto stack
-        n_params += self.compile_expression_list()
-        self.eat(")")
+            classname, secondname = self.classname, firstname
+            is_method_call = True
+            if self.interfaces is not None:
+                # unless the interface of this class says that it is a function
+                interface = self.interfaces.get(self.classname)
+                if interface is not None and interface.subroutines.get(firstname, ("method",))[0] != "method":
+                    is_method_call = False
+            if is_method_call:
+                # pass "this" as first argument
+                self.writer.push("pointer", 0)
+                n_params = 1
+        fullname = classname + "." + secondname
+
+        # push expressions for explicit parameters onto stack: node is the ( before the expressionList
+        n_params += self.compile_expression_list(self.ast.next_sibling[node])
+        if self.interfaces is not None:
+            line = self.ast.tokens.position(self.ast.token_index[name])[0]
+            self.check_call(classname, secondname, n_params - is_method_call, is_method_call, line)
+        if self.options.intrinsics and fullname in INTRINSICS and INTRINSICS[fullname][0] == n_params:
+            value_pushed = INTRINSICS[fullname][1](self.writer, self.fresh_label)
+            self.stats["intrinsic " + fullname] += 1
+            if value_needed and not value_pushed:
+                self.writer.push("constant", 0)
+                value_pushed = True
+            return value_pushed
         self.writer.call(fullname, n_params)
-
-    '''compile_expression pushes expressions in list onto stack, one by one'''
-    def compile_expression_list(self):
+        return True
+
+    '''check_call checks a call of the subroutine sname of class classname with n_args explicit arguments
+    on the given source line against the interface of the class, if it has one (the OS classes have none)'''
+    def check_call(self, classname, sname, n_args, is_method_call, line):
+        interface = self.interfaces.get(classname)
+        if interface is None:
+            return
+        callee = classname + "." + sname
+        where = "while writing class " + str(self.classname) + ", on line " + str(line) + ": "
+        if sname not in interface.subroutines:
+            raise ValueError(where + "class " + classname + " has no subroutine " + sname)
+        skind, _, params = interface.subroutines[sname]
+        if is_method_call and skind != "method":
+            raise ValueError(where + callee + " is a " + skind + ", but is called as a method")
+        if not is_method_call and skind == "method":
+            raise ValueError(where + callee + " is a method, but is called without an object")
+        if n_args != len(params):
+            raise ValueError(where + callee + " takes " + str(len(params)) + " arguments, but is called with " +
+                             str(n_args))
+        self.stats["interfaces: calls checked"] += 1
+
+    '''compile_expression_list pushes the expressions of an expressionList node onto stack, one by one'''
+    def compile_expression_list(self, node):
         n = 0
-        while self.tokenizer.next_content() != ')':
-            n += 1
-            self.compile_expression()
-            if self.tokenizer.next_content() == ',':
-                self.eat(",")
+        for child in self.ast.children(node):
+            if self.ast.kinds[child] != TERMINAL:       # not a comma
+                n += 1
+                self.compile_expression(child)
         return n
 
-    def compile_while_statement(self):
+    '''compile_if_statement_laid_out compiles an if statement without the jumps that are not needed:
+    without else, the code is  condition; jump to afterif unless it holds; if block; label afterif,
+    and with else and a boolean condition, it is
+    condition; if-goto then; else block; goto afterif; label then; if block; label afterif,
+    which tests the condition without negating it. Any other condition may be neither 0 nor -1, and
+    the if block runs only if it is -1, so it keeps the order of the plain compiler'''
+    def compile_if_statement_laid_out(self, node):
+        children = self.ast.children(node)          # if ( expression ) { statements } (else { statements })?
+        condition_start = self.writer.mark()
+        self.compile_expression(children[2])
+        ifblock = children[5]
+
+        if len(children) <= 7:
+            afterif = self.fresh_label()
+            self.jump_unless(condition_start, afterif)
+            self.compile_statements(ifblock)
+            self.writer.label(afterif)
+            self.stats["branch layout: goto removed"] += 1
+            return
+
+        if not self.is_boolean(condition_start):
+            elseblock = self.fresh_label()
+            afterif = self.fresh_label()
+            self.jump_unless(condition_start, elseblock)
+            self.compile_statements(ifblock)
+            self.writer.goto(afterif)
+            self.writer.label(elseblock)
+            self.compile_statements(children[9])    # else statement block
+            self.writer.label(afterif)
+            return
+
+        thenblock = self.fresh_label()
+        afterif = self.fresh_label()
+        self.jump_if(condition_start, thenblock)
+        self.compile_statements(children[9])        # else statement block
+        self.writer.goto(afterif)
+        self.writer.label(thenblock)
+        self.compile_statements(ifblock)
+        self.writer.label(afterif)
+
+    '''is_boolean tells whether the condition emitted since mark start is sure to be -1 or 0: a comparison
+    or false, followed by any number of not. The not of another value, such as ~1, is neither'''
+    def is_boolean(self, start):
+        end = self.writer.mark()
+        while end > start and self.writer.command(end - 1) == "not":
+            end -= 1
+        return end > start and self.writer.command(end - 1) in BOOLEAN_COMMANDS
+
+    '''jump_if emits a jump to label that is taken if the boolean condition (is_boolean) emitted since mark start
+    holds. A condition that ends with  eq; not  holds exactly if the difference of the compared values is not 0.'''
+    def jump_if(self, start, label):
+        if self.writer.ends_with(start, ["eq", "not"]):
+            self.writer.cut(self.writer.mark() - 2)
+            self.writer.arithmetic("sub")
+            self.stats["branch layout: not removed"] += 1
+        self.writer.ifgoto(label)
+
+    '''jump_unless emits a jump to label that is taken if the condition emitted since mark start does not hold.
+    Instead of negating the condition, a final not of the condition is dropped, and a final eq
+    becomes sub, whose result is 0 exactly if the compared values are equal'''
+    def jump_unless(self, start, label):
+        if self.writer.ends_with(start, ["not"]):
+            self.writer.cut(self.writer.mark() - 1)
+            self.stats["branch layout: not removed"] += 1
+        elif self.writer.ends_with(start, ["eq"]):
+            self.writer.cut(self.writer.mark() - 1)
+            self.writer.arithmetic("sub")
+            self.stats["branch layout: not removed"] += 1
+        else:
+            self.writer.arithmetic("not")
+        self.writer.ifgoto(label)
+
+    '''compile_while_statement_inverted compiles a while loop with a boolean condition (is_boolean) at the bottom:
+    goto test; label top; block; label test; condition; if-goto top
+    so that every iteration takes a single jump and does not negate the condition.
+    A loop on any other condition runs only while it is -1, so it keeps the test at the top:
+    label top; condition; jump to end unless it holds; block; goto top; label end'''
+    def compile_while_statement_inverted(self, node):
+        top = self.fresh_label()
+        test = self.fresh_label()
+
+        children = self.ast.children(node)     # while ( expression ) { statements }
+        condition_start = self.writer.mark()
+        self.compile_expression(children[2])
+        inverted = self.is_boolean(condition_start)
+        condition = self.writer.cut(condition_start)     # emitted again after the block, or after label top
+
+        if inverted:
+            self.writer.goto(test)
+            self.writer.label(top)
+        else:
+            self.writer.label(top)
+            condition_start = self.writer.mark()
+            self.writer.insert(condition_start, condition)
+            self.jump_unless(condition_start, test)
+        self.compile_statements(children[5])   # statement block
+        if not inverted:
+            self.writer.goto(top)
+            self.writer.label(test)
+            return
+        self.writer.label(test)
+        condition_start = self.writer.mark()
+        self.writer.insert(condition_start, condition)
+        self.jump_if(condition_start, top)
+        self.stats["branch layout: loop inverted"] += 1
+
+    def compile_while_statement(self, node):
+        if self.options.branch_layout:
+            self.compile_while_statement_inverted(node)
+            return
         beginwhile = self.fresh_label()
         endwhile = self.fresh_label()
 
         self.writer.label(beginwhile)    # label beginning of while loop
 
-        self.eat("while")                # while (condition)
-        self.eat("(")
-        self.compile_expression()
-        self.eat(")")
-        self.writer.arithmetic("not")    
+        children = self.ast.children(node)     # while ( expression ) { statements }
+        self.compile_expression(children[2])
+        self.writer.arithmetic("not")
         self.writer.ifgoto(endwhile)     # if not (condition), jump to end while
 
-        self.eat("{")                    # statement block
-        self.compile_statements()
-        self.eat("}")
+        self.compile_statements(children[5])
         self.writer.goto(beginwhile)     # go back to beginwhile
 
         self.writer.label(endwhile)      # label end of while loop
 
-    def compile_statements(self):
-        while self.tokenizer.next_content() != '}':
-            self.compile_statement()
-
-    def compile_return_statement(self):
-        self.eat("return")                # return
-        if self.tokenizer.next_content() == "this":
-            # "return this" should push pointer 0 (in a constructor)
-            self.writer.push("pointer", 0)
-            self.eat("this")
-        elif self.tokenizer.next_content() == ";":
+    def compile_return_statement(self, node):
+        expression = self.ast.next_sibling[self.ast.first_child[node]]     # return expression? ;
+        if self.ast.kinds[expression] == TERMINAL:
             # for a void function, push constant 0 as return value
             self.writer.push("constant", 0)
         else:
-            self.compile_expression()     # expression
-        self.eat(";")                     # ;
+            self.compile_expression(expression)     # "return this" pushes pointer 0 (in a constructor)
         self.writer.ret()
 
-    '''compile_expression pushes the result of evaluating the next expression on top of the stack'''
-    def compile_expression(self):
-        # expression is a term, possibly followed by a number of repetitions of (op term)
-        self.compile_term()
-        while self.tokenizer.next_content() in JACK_BINARY_OP:
-            operation = self.get_content()
-            self.compile_term()
-            self.writer.arithmetic(VM_BINARY_OP_NAME[operation])
+    '''compile_expression pushes the result of evaluating the expression node on top of the stack,
+    and returns the value of the expression if that is a known constant, and None otherwise.
+    Parenthesized subexpressions, unary operations and array indexes nest without recursion: the
+    expressions and terms that are still open are kept on an explicit stack, so that the nesting depth
+    is not bounded by Python's recursion limit. Only the arguments of subroutine calls recurse.'''
+    def compile_expression(self, node):
+        first_child, next_sibling, code = self.ast.first_child, self.ast.next_sibling, self.ast.code
+        # an expression is a term, possibly followed by a number of repetitions of (op term),
+        # evaluated from left to right. Its frame is [EXPRESSION, start, lhs, operation, rhs_start, term]
+        # while its term node after operation is compiled (operation is None for the first term).
+        term = first_child[node]
+        stack = [[EXPRESSION, self.writer.mark(), None, None, None, term]]
+        while True:
+            # opening part of a term: unary operators and the starts of (expression) and name[expression]
+            while True:
+                first = first_child[term]
+                if self.ast.token_kind(first) in CONSTANT_KINDS:
+                    value = self.compile_constant_term(first)
+                    break
+                if code(first) in UNARY_OP_CODES:                      # op term
+                    stack.append((UNARY_OP, self.ast.content(first), self.writer.mark()))
+                    term = next_sibling[first]
+                    continue
+                if code(first) == OPEN_PAREN:                          # ( expression )
+                    expression = next_sibling[first]
+                elif code(next_sibling[first]) == OPEN_BRACKET:        # name [ expression ]
+                    record = self.symboltable.get_record(self.ast.content(first))
+                    stack.append((ARRAY_INDEX, record, self.writer.mark()))
+                    expression = next_sibling[next_sibling[first]]
+                else:
+                    value = self.compile_name_term(first)
+                    break
+                term = first_child[expression]
+                stack.append([EXPRESSION, self.writer.mark(), None, None, None, term])
+
+            # closing part: the term's value goes to the operations, expressions and terms it completes
+            while True:
+                frame = stack[-1]
+                if frame[0] == UNARY_OP:
+                    stack.pop()
+                    value = self.compile_unary_op(frame[1], frame[2], value)
+                    continue
+                if frame[0] == ARRAY_INDEX:
+                    stack.pop()
+                    value = self.compile_array_element(frame[1], frame[2], value)
+                    continue
+                kind, start, lhs, operation, rhs_start, term = frame
+                if operation is not None:
+                    value = self.compile_binary_op(operation, start, lhs, rhs_start, value)
+                operator = next_sibling[term]
+                if operator != NO_NODE:
+                    term = next_sibling[operator]
+                    frame[2] = value
+                    frame[3] = self.ast.content(operator)
+                    frame[4] = self.writer.mark()
+                    frame[5] = term
+                    break                           # on to the next term of this expression
+                stack.pop()
+                if not stack:
+                    return value
+
+    '''compile_binary_op is called when the code of both operands is on the stack: the left operand
+    from mark start, with constant value lhs (or None), and the right operand from mark rhs_start,
+    with constant value rhs (or None). It emits the operation and returns the constant value of the result.
+    With constant folding, constant operations and identities are simplified in the code already emitted.'''
+    def compile_binary_op(self, operation, start, lhs, rhs_start, rhs):
+        if self.options.fold:
+            if lhs is not None and rhs is not None:
+                value = fold_binary(operation, lhs, rhs)
+                if value is not None:
+                    self.writer.cut(start)
+                    self.push_constant_value(value)
+                    self.stats["fold constant operation"] += 1
+                    return value
+            if rhs is not None and (operation, rhs) in IDENTITY_RIGHT:                  # x + 0
+                self.writer.cut(rhs_start)
+                self.stats["fold identity"] += 1
+                return None
+            if lhs is not None and (operation, lhs) in IDENTITY_LEFT:                   # 1 * x
+                self.writer.cut(start, rhs_start)
+                self.stats["fold identity"] += 1
+                return None
+            if rhs is not None and (operation, rhs) in ABSORBING and self.is_pure(start):    # x * 0
+                self.writer.cut(start)
+                self.push_constant_value(rhs)
+                self.stats["fold identity"] += 1
+                return rhs
+            if lhs is not None and (operation, lhs) in ABSORBING and self.is_pure(start):    # 0 * x
+                self.writer.cut(start)
+                self.push_constant_value(lhs)
+                self.stats["fold identity"] += 1
+                return lhs
+            if operation == "-" and lhs == 0:                                           # 0 - x
+                self.writer.cut(start, rhs_start)
+                self.writer.arithmetic("neg")
+                self.stats["fold identity"] += 1
+                return None
+            if operation == "*" and rhs == -1:                                          # x * -1
+                self.writer.cut(rhs_start)
+                self.writer.arithmetic("neg")
+                self.stats["fold identity"] += 1
+                return None
+        if self.options.strength and self.reduce_strength(operation, start, lhs, rhs_start, rhs):
+            return None
+        self.writer.arithmetic(VM_BINARY_OP_NAME[operation])
+        return None
+
+    '''reduce_strength replaces the Math.multiply or Math.divide call of a multiplication or division
+    by a constant with cheaper code, and returns whether it did so.
+    x * c becomes a sequence of doublings and additions of x, following the binary digits of c
+    (with a final neg if c is negative), as long as that is shorter than MAX_MULTIPLY_COMMANDS.
+    x / 1 and x / -1 become x and -x. The VM has no shift operation, so other divisions
+    by powers of two, which would have to round towards zero for negative x, still call Math.divide.'''
+    def reduce_strength(self, operation, start, lhs, rhs_start, rhs):
+        if operation == "/":
+            if rhs not in (1, -1):
+                return False
+            self.writer.cut(rhs_start)
+            if rhs == -1:
+                self.writer.arithmetic("neg")
+            self.stats["strength reduction: Math.divide calls removed"] += 1
+            return True
+        if operation != "*" or (lhs is None and rhs is None):
+            return False
+        factor = rhs if rhs is not None else lhs
+        if factor == -32768:
+            return False
+        # segment and index of the single push that computes x, so that x can be pushed again,
+        # or None if x has to be saved in temp 2 first
+        if rhs is not None:
+            x_code = self.writer.text_since(start, rhs_start)
+        else:
+            x_code = self.writer.text_since(rhs_start)
+        x_commands = x_code.split()
+        repush = x_commands[1:] if len(x_commands) == 3 and x_commands[0] == "push" else None
+        if self.multiply_cost(abs(factor), repush is not None) > MAX_MULTIPLY_COMMANDS:
+            return False
+
+        if rhs is not None:
+            self.writer.cut(rhs_start)                # x c  -->  x
+        else:
+            self.writer.cut(start, rhs_start)         # c x  -->  x
+        self.stats["strength reduction: Math.multiply calls removed"] += 1
+        if factor == 0:
+            if repush is not None:
+                self.writer.cut(start)
+            else:
+                self.writer.pop("temp", 0)            # x may have side effects
+            self.writer.push("constant", 0)
+            return True
+        if repush is None and abs(factor) > 1:
+            self.writer.pop("temp", 2)
+            self.writer.push("temp", 2)
+            repush = ["temp", 2]
+        # x is on the stack, and the result so far is x: follow the binary digits of the factor after the first
+        digits = bin(abs(factor))[3:]
+        for i, digit in enumerate(digits):
+            if i == 0:
+                self.writer.push(*repush)             # x + x
+            else:
+                self.writer.pop("temp", 3)            # result + result
+                self.writer.push("temp", 3)
+                self.writer.push("temp", 3)
+            self.writer.arithmetic("add")
+            if digit == "1":
+                self.writer.push(*repush)
+                self.writer.arithmetic("add")
+        if factor < 0:
+            self.writer.arithmetic("neg")
+        return True
+
+    # number of commands that reduce_strength emits for x * factor, for factor > 0
+    @staticmethod
+    def multiply_cost(factor, repushable):
+        digits = bin(factor)[3:]
+        if digits == "":
+            return 0
+        cost = 0 if repushable else 2
+        cost += 2 + 4 * (len(digits) - 1) + 2 * digits.count("1")
+        return cost
+
+    '''compile_unary_op emits a unary operation on the operand emitted from mark start with constant value
+    operand (or None), and returns the constant value of the result'''
+    def compile_unary_op(self, operation, start, operand):
+        command = VM_UNARY_OP_NAME[operation]
+        if self.options.fold:
+            if operand is not None:
+                value = fold_unary(operation, operand)
+                self.writer.cut(start)
+                self.push_constant_value(value)
+                self.stats["fold constant operation"] += 1
+                return value
+            # the last command of the operand's code is applied to the value of everything before it,
+            # so if that is the same negation, the two cancel out: -(-x) or ~(~x)
+            if self.writer.mark() - start >= 2 and self.writer.ends_with(start, [command]):
+                self.writer.cut(self.writer.mark() - 1)
+                self.stats["fold double negation"] += 1
+                return None
+        self.writer.arithmetic(command)
+        return None
+
+    # shortest code that pushes the 16-bit value on the stack
+    def push_constant_value(self, value):
+        value = to_int16(value)
+        if value >= 0:
+            self.writer.push("constant", value)
+        elif value == -1:
+            self.writer.push("constant", 0)
+            self.writer.arithmetic("not")
+        elif value == -32768:
+            self.writer.push("constant", 32767)
+            self.writer.arithmetic("not")
+        else:
+            self.writer.push("constant", -value)
+            self.writer.arithmetic("neg")
+
+    # whether the code emitted since mark start can be dropped without losing side effects
+    def is_pure(self, start):
+        code = self.writer.text_since(start)
+        return "call " not in code and "pop that" not in code
 
     def lookup_and_push(self, sname):
-        record = self.symboltable.get_record(sname)
-        segment = VM_SEGMENT_NAME[record["kind"]]
-        self.writer.push(segment, record["idx"])
+        symbol = self.symboltable.get_record(sname)
+        self.writer.push(symbol.segment, symbol.idx)
+
+    '''push_pooled_string pushes the string literal content from its static slot in the string pool.
+    The pool is built by the function Class.$strings (a name that no Jack subroutine can have),
+    which every subroutine using a literal calls on entry unless the pool's flag says it already ran'''
+    def push_pooled_string(self, content):
+        if content not in self.string_slots:
+            self.string_slots[content] = self.string_pool_flag + 1 + len(self.string_slots)
+        self.writer.push("static", self.string_slots[content])
+        self.stats["string pool literal uses"] += 1
+
+    # whether the subroutineDec node has a string literal among its tokens
+    def uses_string_constant(self, node):
+        first = self.ast.token_index[self.ast.first_child[node]]
+        body = self.ast.children(node)[-1]
+        last = self.ast.token_index[self.ast.children(body)[-1]]       # its closing }
+        return STRING_CONSTANT in self.ast.tokens.kinds[first:last]
+
+    # emits the check for the string pool, which starts the code of a subroutine that uses a literal
+    def guard_string_pool(self):
+        ready = self.fresh_label()
+        self.writer.push("static", self.string_pool_flag)
+        self.writer.ifgoto(ready)
+        self.writer.call(self.classname + ".$strings", 0)
+        self.writer.pop("temp", 0)
+        self.writer.label(ready)
+
+    # emits the function that creates the string literals of the class once and sets the pool's flag
+    def compile_string_pool(self):
+        self.writer.putnow("function " + self.classname + ".$strings 0")
+        self.push_constant_value(-1)
+        self.writer.pop("static", self.string_pool_flag)
+        for content, slot in self.string_slots.items():
+            self.create_string(content)
+            self.writer.pop("static", slot)
+        self.writer.push("constant", 0)
+        self.writer.ret()
+        self.writer.flush()
+        self.stats["string pool literals"] += len(self.string_slots)
 
     """create_string asks OS to create a new string constant containing "content"
     and pushes its address on top of the stack"""
@@ -342,63 +756,76 @@ class CompilationEngine:
             # which may be used for the next character
         # at the end, we have the new string's base address on top of the stack
 
-
-    def compile_constant_term(self):
-        self.tokenizer.advance()
-        const_token = self.tokenizer.current_token
-
-        if not const_token.is_constant():
-            raise ValueError("Expected constant token but found: " + const_token.content)
-
-        if const_token.token_type == "integerConstant":
-            self.writer.push("constant", const_token.content)
-        elif const_token.token_type == "stringConstant":
-            self.create_string(const_token.content)
-        elif const_token.content == "this":
+    # pushes the constant of the terminal node,
+    # returns the value of integer and keyword constants other than this, and None for the others
+    def compile_constant_term(self, node):
+        const_type = self.ast.token_kind(node)
+        const_content = self.ast.content(node)
+
+        if const_type == INTEGER_CONSTANT:
+            self.writer.push("constant", const_content)
+            return to_int16(int(const_content))
+        elif const_type == STRING_CONSTANT:
+            if self.options.string_pool:
+                self.push_pooled_string(const_content)
+            else:
+                self.create_string(const_content)
+        elif const_content == "this":
             self.writer.push("pointer", 0)
-        elif const_token.content in ["false", "null"]:
+        elif const_content in ["false", "null"]:
             self.writer.push("constant", 0)
-        elif const_token.content == "true":
+            return 0
+        elif const_content == "true":
             self.writer.push("constant", 0)
             self.writer.arithmetic("not")
+            return -1
         else:
-            raise ValueError("Could not handle constant token : " + const_token.content)
-    
-    '''Pushes the result of evaluating the term on top of the stack'''
-    def compile_term(self):
-        # first checks:
-        # is the term a constant
-        if self.tokenizer.next_token.is_constant():
-            self.compile_constant_term()
-        # is it unary operator applied to a term
-        elif self.tokenizer.next_content() in JACK_UNARY_OP:
-            operation = self.get_content()
-            self.compile_term()
-            self.writer.arithmetic(VM_UNARY_OP_NAME[operation])
-        # is it a (expression)
-        elif self.tokenizer.next_content() == '(':
-            self.eat('(')
-            self.compile_expression()
-            self.eat(')')
-
-        # if we did not succeed yet, then we must be reading an identifier
-        # we look ahead to the next symbol, which can be [, (, ., or something else
+            raise ValueError("Could not handle constant token : " + const_content)
+        return None
+
+    '''compile_array_element pushes the element of the array in the variable of the given symbol record,
+    whose index was pushed from mark index_start on, with constant value index (or None)'''
+    def compile_array_element(self, record, index_start, index):
+        if self.options.array_access and index is not None and index >= 0:
+            # a constant index is the offset from the array base
+            self.writer.cut(index_start)
+            self.writer.push(record.segment, record.idx)
+            self.writer.pop("pointer", 1)
+            self.writer.push("that", index)
+            self.stats["array access: constant index"] += 1
+            return None
+        self.writer.push(record.segment, record.idx) # array base location
+        self.writer.arithmetic("add")
+        self.writer.pop("pointer", 1) # set "that" pointer to correct location
+        self.writer.push("that", 0)   # push that 0 onto stack
+        return None
+
+    '''compile_name_term pushes a term that starts with the identifier in the terminal node name and is not
+    an array element: a subroutine call or a variable'''
+    def compile_name_term(self, name):
+        # we look at the next sibling, which can be (, ., or nothing
+        code = self.ast.code(self.ast.next_sibling[name])
+        if code == DOT or code == OPEN_PAREN:
+            self.compile_call(name)
         else:
-            sname = self.get_content()  # get the identifier
-            # the identifier names an array
-            if self.tokenizer.next_content() == '[':
-                record = self.symboltable.get_record(sname)
-                self.eat('[')
-                self.compile_expression()
-                self.eat(']')
-                self.writer.push(VM_SEGMENT_NAME[record["kind"]], record["idx"]) # array base location
-                self.writer.arithmetic("add")
-                self.writer.pop("pointer", 1) # set "that" pointer to correct location
-                self.writer.push("that", 0)   # push that 0 onto stack
-            # the identifier is part of a subroutine call TODO check that this works?
-            elif self.tokenizer.next_content() == '.' or self.tokenizer.next_content() == '(':
-                self.compile_call(sname)
-            else:
-                # if we are in none of these cases, then the identifier must have been a simple varname,
-                # so we look it up and push it to the stack
-                self.lookup_and_push(sname)
\ No newline at end of file
+            # if we are in none of these cases, then the identifier must have been a simple varname,
+            # so we look it up and push it to the stack
+            self.lookup_and_push(self.ast.content(name))
+        return None
+
+
+# jump table of compile_statements: kind of the statement node -> method that compiles the statement
+STATEMENT_COMPILERS = {LET_STATEMENT: CompilationEngine.compile_let_statement,
+                       DO_STATEMENT: CompilationEngine.compile_do_statement,
+                       WHILE_STATEMENT: CompilationEngine.compile_while_statement,
+                       IF_STATEMENT: CompilationEngine.compile_if_statement,
+                       RETURN_STATEMENT: CompilationEngine.compile_return_statement}
+
+
+# compiles the class in source without touching the disk, returns the VM text and the optimization statistics;
+# with the interfaces option, interfaces (such as a dictionary class name -> interface) replaces reading .jif files
+def compile_to_vm(name, source, options=None, interfaces=None):
+    outfile = io.StringIO()
+    engine = CompilationEngine(name, options, source, outfile, interfaces=interfaces)
+    engine.compile_class()
+    return outfile.getvalue(), engine.statistics()
@@ -1,5 +1,380 @@
-from compilationengine import CompilationEngine
+"""Checks of the code that the compilation engine generates with each optimization:
+  --fold folds constant subexpressions, in Jack's left to right order and with 16-bit arithmetic, and
+  simplifies identities without dropping side effects,
+  --strength replaces calls of Math.multiply by a constant with doublings and additions, and of Math.divide by
+  1 and -1, and leaves long sequences and other divisions to the OS,
+  --string-pool creates each distinct literal of a class once, in static slots after the class's statics,
+  --branch-layout tests boolean loop conditions at the bottom, and leaves out jumps and negations in ifs,
+  --intrinsics expands calls of Memory.peek and poke and Math.abs, min and max inline,
+  --array-access reads and writes constant indexes through that k and sets pointer 1 before the value of
+  an assignment that cannot change it,
+and code compiled with the optimization runs like the plain code on sample expressions and statements, also
+on conditions that are not booleans, and so does code compiled with all optimizations together.
+Expressions that nest parentheses, unary operators and array indexes tens of thousands deep compile without
+recursion, into one command per level and operation, and evaluate from left to right.
+Usage: python3 compilationengine_unittest.py"""
+from compilationengine import compile_to_vm
+from compileoptions import CompileOptions
+from jackinterface import interface_of
+from unittestsupport import check, finish, s16, option_sets, VMRunner, CONDITIONS, X_VALUES, condition_class
 
-engine = CompilationEngine("tests/Square/Main.jack")
-engine.compile_class()
+# nesting depth of the expressions that must compile without recursion, far beyond Python's recursion limit
+DEEP = 20000
 
+# expressions of x and the local y (which is 3) to run with each optimization
+EXPRESSIONS = ["x + 0", "0 + x", "x - 0", "0 - x", "x * 1", "1 * x", "x * 0", "0 * x", "x * -1", "x / 1", "x / -1",
+               "x & -1", "x | 0", "x | -1", "x & 0", "-(-x)", "~(~x)", "-(-(-x))", "2 + 3 * 4", "x + 16 * 32",
+               "(x + 16) * 32", "x * (16 * 32)", "32767 + 1", "-32767 - 2", "~0", "7 / 2", "-7 / 2", "7 / 0 + x",
+               "(1 < 2) & (x = x)", "y * 3", "x * 10", "x * -6", "(x + y) * 7", "5 * x", "x / 2", "-x * 1000",
+               "(x * y) * 0", "x * 256 + y"]
+
+
+# a class whose function Main.run(x) returns the value of expression
+def expression_class(expression):
+    return """class Main {
+    function int run(int x) {
+        var int y, r;
+        let y = 3;
+        let r = %s;
+        return r;
+    }
+    function int f(int x) {
+        return x + 1;
+    }
+}""" % expression
+
+
+# the commands that compute expression in Main.run with options, separated by ;
+def expression_code(expression, options):
+    vm, stats = compile_to_vm("Main.jack", expression_class(expression), options)
+    lines = vm.splitlines()
+    start = lines.index("pop local 0") + 1
+    return "; ".join(lines[start:lines.index("pop local 1", start)])
+
+
+# the commands of the function with the given name and number of locals in vm
+def function_code(vm, name):
+    lines = vm.splitlines()
+    start = lines.index("function " + name) + 1
+    end = next((i for i in range(start, len(lines)) if lines[i].startswith("function ")), len(lines))
+    return lines[start:end]
+
+
+# the commands of Main.run(x), whose local r is returned, for statements, separated by ; and with the labels
+# named A, B, ... in order of their first use, so that the code does not depend on how labels are numbered
+def statements_code(statements, options):
+    vm, stats = compile_to_vm("Main.jack", "class Main { function int run(int x) { var int r; " + statements +
+                              " return r; } }", options)
+    names = {}
+    commands = []
+    for line in function_code(vm, "Main.run 1")[:-2]:
+        words = line.split()
+        if words[0] in ("label", "goto", "if-goto"):
+            words[1] = names.setdefault(words[1], chr(ord("A") + len(names)))
+        commands.append(" ".join(words))
+    return "; ".join(commands)
+
+
+# compiles every sample program plainly and with options, and checks that run returns the same values and
+# prints the same output; with the interfaces option, calls are checked against the class's own interface
+def check_runs_like_plain(name, options, sources, args_list, entry="Main.run"):
+    for source in sources:
+        plain, stats = compile_to_vm("Main.jack", source)
+        interfaces = {"Main": interface_of("Main.jack", source)} if options.interfaces else None
+        vm, stats = compile_to_vm("Main.jack", source, options, interfaces)
+        for args in args_list:
+            expected = VMRunner({"Main": plain})
+            value = expected.run(entry, args)
+            check(value is not None, "plain code does not stop for " + source)
+            runner = VMRunner({"Main": vm})
+            check(runner.run(entry, args) == value and runner.output == expected.output,
+                  name + ": " + source + " runs differently with arguments " + str(args))
+
+
+def check_fold():
+    fold = CompileOptions(fold=True)
+    expected = {"2 + 3 * 4": "push constant 20",                   # (2 + 3) * 4
+                "32767 + 1": "push constant 32767; not",            # -32768
+                "~0": "push constant 0; not",
+                "x + 0": "push argument 0", "0 + x": "push argument 0", "x * 1": "push argument 0",
+                "x & -1": "push argument 0", "-(-x)": "push argument 0", "~(~x)": "push argument 0",
+                "x * 0": "push constant 0", "0 * x": "push constant 0", "x | -1": "push constant 0; not",
+                "0 - x": "push argument 0; neg", "x * -1": "push argument 0; neg",
+                "7 / 2": "push constant 3", "-7 / 2": "push constant 3; neg",
+                # operators are evaluated left to right, so there is no constant subexpression 16 * 32
+                "x + 16 * 32": "push argument 0; push constant 16; add; push constant 32; call Math.multiply 2",
+                "x * (16 * 32)": "push argument 0; push constant 512; call Math.multiply 2",
+                # division by 0 is left to Math.divide, which reports it
+                "7 / 0 + x": "push constant 7; push constant 0; call Math.divide 2; push argument 0; add",
+                # the call has a side effect, so it stays
+                "Main.f(x) * 0": "push argument 0; call Main.f 1; push constant 0; call Math.multiply 2"}
+    for expression, code in expected.items():
+        check(expression_code(expression, fold) == code,
+              "--fold: " + expression + " compiles to " + expression_code(expression, fold))
+    plain = CompileOptions()
+    check(expression_code("2 + 3", plain) == "push constant 2; push constant 3; add",
+          "constants are folded without --fold")
+    check_runs_like_plain("--fold", fold, [expression_class(e) for e in EXPRESSIONS if "/ 0" not in e],
+                          [[x] for x in X_VALUES])
+
+
+def check_strength():
+    strength = CompileOptions(strength=True)
+    doubling = "pop temp 3; push temp 3; push temp 3; add"
+    expected = {"y * 3": "push local 0; push local 0; add; push local 0; add",
+                "x * 32": "push argument 0; push argument 0; add; " + "; ".join([doubling] * 4),
+                "32 * x": "push argument 0; push argument 0; add; " + "; ".join([doubling] * 4),
+                # x is computed once, into temp 2
+                "(x + y) * 7": "push argument 0; push local 0; add; pop temp 2; push temp 2; push temp 2; add; "
+                               "push temp 2; add; " + doubling + "; push temp 2; add",
+                "x * 0": "push constant 0",
+                "Main.f(x) * 0": "push argument 0; call Main.f 1; pop temp 0; push constant 0",
+                "x * 12345": "push argument 0; push constant 12345; call Math.multiply 2",
+                "x / 2": "push argument 0; push constant 2; call Math.divide 2",
+                "x / 1": "push argument 0"}
+    for expression, code in expected.items():
+        check(expression_code(expression, strength) == code,
+              "--strength: " + expression + " compiles to " + expression_code(expression, strength))
+    # negative constants are only known as constants with --fold
+    both = CompileOptions(strength=True, fold=True)
+    check(expression_code("x / -1", both) == "push argument 0; neg", "--strength --fold: x / -1 calls Math.divide")
+    check(expression_code("x * -6", both).endswith("add; neg"), "--strength --fold: x * -6 calls Math.multiply")
+    vm, stats = compile_to_vm("Main.jack", expression_class("x * 32 + (x / 1) + (x * 12345)"), strength)
+    check(stats["strength reduction: Math.multiply calls removed"] == 1 and
+          stats["strength reduction: Math.divide calls removed"] == 1, "--strength counts wrongly: " + str(stats))
+    sources = [expression_class(e) for e in EXPRESSIONS if "/ 0" not in e]
+    check_runs_like_plain("--strength", strength, sources, [[x] for x in X_VALUES])
+    check_runs_like_plain("--strength --fold", both, sources, [[x] for x in X_VALUES])
+
+
+# prints literals in a loop, from two functions, to check that the string pool creates each of them once
+STRINGS_CLASS = """class Main {
+    static int count;
+    function int run(int n) {
+        var int i;
+        while (i < n) {
+            do Output.printString("score");
+            do Main.show();
+            let i = i + 1;
+        }
+        do Output.printString("");
+        return count;
+    }
+    function void show() {
+        let count = count + 1;
+        do Output.printString("score");
+        do Output.printString("lives");
+        return;
+    }
+}"""
+
+
+def check_string_pool():
+    vm, stats = compile_to_vm("Main.jack", STRINGS_CLASS, CompileOptions(string_pool=True))
+    lines = vm.splitlines()
+    # static 0 is count, static 1 the pool's flag
+    check(lines.count("function Main.$strings 0") == 1, "--string-pool: no function Main.$strings")
+    for name in ("Main.run 1", "Main.show 0"):
+        code = function_code(vm, name)
+        check(code[:4] == ["push static 1", "if-goto " + code[4].split()[-1], "call Main.$strings 0", "pop temp 0"]
+              and code[4].startswith("label "), "--string-pool: " + name + " does not create the pool on entry")
+    # "score" is in slot 2 for both uses, "" in slot 3 and "lives" in slot 4
+    check(lines.count("push static 2") == 2 and lines.count("push static 3") == 1 and
+          lines.count("push static 4") == 1, "--string-pool: literals do not get one slot each")
+    check(stats["string pool literals"] == 3 and stats["string pool literal uses"] == 4,
+          "--string-pool counts wrongly: " + str(stats))
+    plain, stats = compile_to_vm("Main.jack", STRINGS_CLASS)
+    for n in (0, 1, 5):
+        expected = VMRunner({"Main": plain})
+        pooled = VMRunner({"Main": vm})
+        check(pooled.run("Main.run", [n]) == expected.run("Main.run", [n]) and pooled.output == expected.output,
+              "--string-pool: the program prints other strings for n = " + str(n))
+        check(len(expected.strings) == 3 * n + 1 and len(pooled.strings) == 3,
+              "--string-pool: " + str(len(pooled.strings)) + " strings created for n = " + str(n))
+
+
+def check_branch_layout():
+    layout = CompileOptions(branch_layout=True)
+    expected = {
+        "while (x < 5) { let x = x + 1; }":
+            "goto A; label B; push argument 0; push constant 1; add; pop argument 0; "
+            "label A; push argument 0; push constant 5; lt; if-goto B",
+        # a jump on x = 9 being false is a jump on x - 9
+        "while (~(x = 9)) { let x = x + 1; }":
+            "goto A; label B; push argument 0; push constant 1; add; pop argument 0; "
+            "label A; push argument 0; push constant 9; sub; if-goto B",
+        # x & 1 may be neither true nor false: the plain layout, which runs the block only on -1
+        "while (x & 1) { let x = x + 1; }":
+            "label A; push argument 0; push constant 1; and; not; if-goto B; "
+            "push argument 0; push constant 1; add; pop argument 0; goto A; label B",
+        "if (x = 3) { let r = 1; }":
+            "push argument 0; push constant 3; sub; if-goto A; push constant 1; pop local 0; label A",
+        "if (x > 3) { let r = 2; } else { let r = 3; }":
+            "push argument 0; push constant 3; gt; if-goto A; push constant 3; pop local 0; goto B; "
+            "label A; push constant 2; pop local 0; label B",
+        "if (x & 1) { let r = 4; } else { let r = 5; }":
+            "push argument 0; push constant 1; and; not; if-goto A; push constant 4; pop local 0; goto B; "
+            "label A; push constant 5; pop local 0; label B"}
+    for statements, code in expected.items():
+        check(statements_code(statements, layout) == code,
+              "--branch-layout: " + statements + " compiles to " + statements_code(statements, layout))
+    sources = [condition_class(condition) for condition in CONDITIONS]
+    check_runs_like_plain("--branch-layout", layout, sources, [[x] for x in X_VALUES])
+    check_runs_like_plain("--branch-layout --peephole --fold", CompileOptions(branch_layout=True, peephole=True,
+                                                                                fold=True),
+                          sources, [[x] for x in X_VALUES])
+
+
+# uses the OS functions that --intrinsics expands, also in an array assignment, which keeps its index in temp 1
+INTRINSICS_CLASS = """class Main {
+    function int run(int x) {
+        var Array a;
+        var int y;
+        let a = Array.new(4);
+        do Memory.poke(a + 1, x);
+        let y = Memory.peek(a + 1) + Math.abs(x - 3);
+        let a[2] = Math.max(x, Math.min(y, 7)) + Memory.peek(a + 1);
+        let a[Math.abs(x) & 3] = Math.min(a[2], -x);
+        do Memory.poke(a, Math.abs(-32767 - 1));
+        return (a[0] + a[1] + a[2] + a[3]) - Math.max(Math.abs(x), Memory.peek(a + 2));
+    }
+}"""
+
+
+def check_intrinsics():
+    intrinsics = CompileOptions(intrinsics=True)
+    expected = {"Memory.peek(x)": "push argument 0; pop pointer 1; push that 0",
+                "Math.abs(x)": "push argument 0; pop temp 2; push temp 2; push temp 2; push constant 0; lt; not; "
+                               "if-goto A; neg; label A",
+                "Math.min(x, r)": "push argument 0; push local 0; pop temp 3; pop temp 2; push temp 2; push temp 2; "
+                                  "push temp 3; gt; not; if-goto A; pop temp 0; push temp 3; label A",
+                "Math.max(x, r)": "push argument 0; push local 0; pop temp 3; pop temp 2; push temp 2; push temp 2; "
+                                  "push temp 3; lt; not; if-goto A; pop temp 0; push temp 3; label A",
+                # a call with the wrong number of arguments is left to the OS
+                "Math.abs(x, r)": "push argument 0; push local 0; call Math.abs 2"}
+    for expression, code in expected.items():
+        actual = statements_code("let r = " + expression + ";", intrinsics)[:-len("; pop local 0")]
+        check(actual == code,
+              "--intrinsics: " + expression + " compiles to " + actual)
+    check(statements_code("do Memory.poke(x, 5);", intrinsics) ==
+          "push argument 0; push constant 5; pop temp 0; pop pointer 1; push temp 0; pop that 0",
+          "--intrinsics: do Memory.poke(x, 5) compiles to " + statements_code("do Memory.poke(x, 5);", intrinsics))
+    vm, stats = compile_to_vm("Main.jack", INTRINSICS_CLASS, intrinsics)
+    check("call Memory" not in vm and "call Math.abs" not in vm and "call Math.m" not in vm,
+          "--intrinsics leaves calls of the expanded functions")
+    check(stats["intrinsic Memory.poke"] == 2 and stats["intrinsic Math.abs"] == 4,
+          "--intrinsics counts wrongly: " + str(stats))
+    check_runs_like_plain("--intrinsics", intrinsics, [INTRINSICS_CLASS], [[x] for x in X_VALUES])
+    check_runs_like_plain("--intrinsics", intrinsics, [expression_class(e) for e in
+                                                       ["Math.abs(x) * Math.min(x, y)", "Math.max(-x, y - x)"]],
+                          [[x] for x in X_VALUES])
+
+
+# array accesses whose address computations repeat, with and without assignments in between
+ARRAY_CLASS = """class Main {
+    static Array s;
+    function int run(int x) {
+        var Array a;
+        var int i, r;
+        let a = Array.new(8);
+        let s = Array.new(4);
+        while (i < 8) {
+            let a[i] = (i * 3) + 1 & 7;
+            let i = i + 1;
+        }
+        let i = x & 7;
+        let r = a[i] + a[i];
+        let i = a[i];
+        let i = a[i];
+        let r = r + i + a[i];
+        let a[i] = a[i] + 1;
+        let a[i] = a[i] + a[i];
+        let s[0] = a;
+        let s[1] = a[3] + s[0];
+        let a[0] = s[1];
+        let s[2] = Main.f(a[2]);
+        let r = r + a[0] + a[2] + s[2] + a[Main.f(i) & 7];
+        let a[x & 3] = a[(x + 1) & 3];
+        return r + a[x & 3] - s[1];
+    }
+    function int f(int x) {
+        return x + 1;
+    }
+}"""
+
+
+def check_array_access():
+    array_access = CompileOptions(array_access=True)
+    statements = {"let x = r[3];": "push local 0; pop pointer 1; push that 3; pop argument 0",
+                  "let r[3] = x;": "push argument 0; push local 0; pop pointer 1; pop that 3",
+                  "let r[x] = x + 1;": "push argument 0; push local 0; add; pop pointer 1; "
+                                       "push argument 0; push constant 1; add; pop that 0",
+                  # the value sets pointer 1 itself, so the index waits in temp 1
+                  "let r[x] = r[1];": "push argument 0; pop temp 1; push local 0; pop pointer 1; push that 1; "
+                                      "push local 0; push temp 1; add; pop pointer 1; pop that 0",
+                  "let x = r[x] + r[x];": "push argument 0; push local 0; add; pop pointer 1; push that 0; "
+                                          "push that 0; add; pop argument 0",
+                  "let x = r[x]; let x = r[x];": "push argument 0; push local 0; add; pop pointer 1; push that 0; "
+                                                 "pop argument 0; push argument 0; push local 0; add; "
+                                                 "pop pointer 1; push that 0; pop argument 0"}
+    for statement, code in statements.items():
+        actual = statements_code(statement, array_access)
+        check(actual == code, "--array-access: " + statement + " compiles to " + actual)
+    sources = [ARRAY_CLASS]
+    check_runs_like_plain("--array-access", array_access, sources, [[x] for x in X_VALUES])
+    check_runs_like_plain("--array-access --intrinsics --peephole",
+                          CompileOptions(array_access=True, intrinsics=True, peephole=True), sources,
+                          [[x] for x in X_VALUES])
+
+
+# expressions nested depth deep, by kind of nesting, as in benchmark.py nesting
+def nested_expressions(depth):
+    return {"parentheses": "(" * depth + "x" + " + 1)" * depth,
+            "unary": "-" * depth + "x",
+            "index": "a[" * depth + "0" + "]" * depth}
+
+
+def check_nesting():
+    # the commands of each level: + 1 in parentheses, a negation, and an array element
+    level_commands = {"parentheses": ["push constant 1", "add"], "unary": ["neg"],
+                      "index": ["push local 1", "add", "pop pointer 1", "push that 0"]}
+    for name, expression in nested_expressions(DEEP).items():
+        vm, stats = compile_to_vm("Main.jack", "class Main { function int run(int x) { var int r; var Array a; "
+                                  "let r = " + expression + "; return r; } }")
+        commands = function_code(vm, "Main.run 2")
+        n_commands = len(commands) - len(level_commands[name]) * DEEP
+        check(n_commands == 4 and commands.count(level_commands[name][-1]) == DEEP,
+              name + " nested " + str(DEEP) + " deep compiles to " + str(len(commands)) + " commands")
+    for depth in (1, 2, 51):
+        expressions = nested_expressions(depth)
+        for expression, value in ((expressions["parentheses"], lambda x: x + depth),
+                                  (expressions["unary"], lambda x: -x if depth % 2 else x),
+                                  ("(" * depth + "x" + " - 1) * 2" * depth,
+                                   lambda x: x * 2 ** depth - 2 ** (depth + 1) + 2),
+                                  ("x - (" * depth + "x" + ")" * depth, lambda x: 0 if depth % 2 else x),
+                                  ("(x" + " - y" * depth + ")", lambda x: x - 3 * depth)):
+            vm, stats = compile_to_vm("Main.jack", expression_class(expression))
+            for x in X_VALUES:
+                result = VMRunner({"Main": vm}).run("Main.run", [x])
+                check(result == s16(value(x)), expression[:40] + " is " + str(result) + " for x = " + str(x))
+
+
+# every sample runs like the plain code with each option set, including all optimizations together
+def check_option_sets():
+    sources = [expression_class(e) for e in EXPRESSIONS if "/ 0" not in e] + \
+        [condition_class(c) for c in CONDITIONS] + [INTRINSICS_CLASS, ARRAY_CLASS]
+    for name, options in option_sets():
+        check_runs_like_plain(name, options, sources, [[x] for x in X_VALUES])
+        check_runs_like_plain(name, options, [STRINGS_CLASS], [[n] for n in (0, 1, 5)])
+
+
+if __name__ == "__main__":
+    check_fold()
+    check_strength()
+    check_string_pool()
+    check_branch_layout()
+    check_intrinsics()
+    check_array_access()
+    check_nesting()
+    check_option_sets()
+    finish()
@@ -0,0 +1,52 @@
+"""Client side of the compile server in compileserver.py.
+This module is kept free of compiler imports, so that a client starts quickly."""
+import json
+import os
+import socket
+import tempfile
+
+SOCKET_PATH = os.environ.get("JACK_COMPILER_SOCKET",
+                             os.path.join(tempfile.gettempdir(), "jackcompiler-" + str(os.getuid()) + ".sock"))
+
+
+class CompileClient:
+    """Connection to a running compile server"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.rfile = sock.makefile('rb')
+
+    '''connect returns a client for the server listening on socket_path,
+    or None if no server is running there'''
+    @classmethod
+    def connect(cls, socket_path=SOCKET_PATH):
+        if not os.path.exists(socket_path):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            sock.close()
+            return None
+        return cls(sock)
+
+    def request(self, request):
+        self.sock.sendall((json.dumps(request) + "\n").encode())
+        return json.loads(self.rfile.readline())
+
+    def version(self):
+        return self.request({"op": "ping"})["version"]
+
+    # returns (vm text, None, statistics) or (None, error message, None);
+    # options is the dictionary form of a CompileOptions
+    def compile_file(self, fpath, options):
+        response = self.request({"path": os.path.abspath(fpath), "options": options})
+        return response.get("vm"), response.get("error"), response.get("stats")
+
+    def compile_source(self, name, source, options):
+        response = self.request({"name": name, "source": source, "options": options})
+        return response.get("vm"), response.get("error"), response.get("stats")
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
@@ -0,0 +1,66 @@
+from jacktokenizer import TOKENIZERS, DEFAULT_TOKENIZER
+
+
+class CompileOptions:
+    """Settings of one compilation. The defaults reproduce the output of the plain compiler;
+    every optimization has to be switched on explicitly."""
+
+    def __init__(self, tokenizer=DEFAULT_TOKENIZER, peephole=False, fold=False, strength=False, string_pool=False,
+                 branch_layout=False, intrinsics=False, array_access=False, interfaces=False):
+        self.tokenizer = tokenizer
+        self.peephole = peephole
+        self.fold = fold
+        self.strength = strength
+        self.string_pool = string_pool
+        self.branch_layout = branch_layout
+        self.intrinsics = intrinsics
+        self.array_access = array_access
+        self.interfaces = interfaces
+
+    '''code_key describes the options that change the generated code,
+    so that a build manifest can tell outputs of different settings apart'''
+    def code_key(self):
+        return "peephole=" + str(self.peephole) + " fold=" + str(self.fold) + " strength=" + str(self.strength) + \
+            " string_pool=" + str(self.string_pool) + " branch_layout=" + str(self.branch_layout) + \
+            " intrinsics=" + str(self.intrinsics) + " array_access=" + str(self.array_access) + \
+            " interfaces=" + str(self.interfaces)
+
+    # plain dictionary form, used to send the options to the compile server
+    def as_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument("--tokenizer", choices=sorted(TOKENIZERS), default=DEFAULT_TOKENIZER,
+                            help="tokenizer engine: whole-buffer regex scanner or the old per-character scanner " +
+                                 "(default: " + DEFAULT_TOKENIZER + ")")
+        parser.add_argument("--peephole", action="store_true",
+                            help="run the peephole optimizer over the VM code of every subroutine")
+        parser.add_argument("--fold", action="store_true",
+                            help="fold constant subexpressions and simplify algebraic identities such as x * 1")
+        parser.add_argument("--strength", action="store_true",
+                            help="replace multiplications by small constants and divisions by 1 or -1 " +
+                                 "with code that does not call the OS")
+        parser.add_argument("--string-pool", action="store_true",
+                            help="create each string literal of a class once and keep it in a static variable")
+        parser.add_argument("--branch-layout", action="store_true",
+                            help="test while conditions at the bottom of the loop and leave out jumps " +
+                                 "and negations of conditions in if statements")
+        parser.add_argument("--intrinsics", action="store_true",
+                            help="expand calls of Memory.peek, Memory.poke, Math.abs, Math.min and Math.max inline")
+        parser.add_argument("--array-access", action="store_true",
+                            help="address array elements with a constant index directly, reuse pointer 1 " +
+                                 "for repeated accesses and store without temp 1 where possible")
+        parser.add_argument("--interfaces", action="store_true",
+                            help="write an interface file (.jif) for every class, and resolve and check the calls " +
+                                 "of other classes' subroutines against their interface files")
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(args.tokenizer, args.peephole, args.fold, args.strength, args.string_pool,
+                   args.branch_layout, args.intrinsics,
+                   args.array_access, args.interfaces)
@@ -0,0 +1,95 @@
+"""Long-running compile server, so that repeated builds do not pay for interpreter startup and imports.
+
+Start it with:  python3 compileserver.py [--socket PATH]
+Stop it with:   python3 compileserver.py --stop
+
+While it is running, jackcompiler.py sends its files to the server instead of compiling them itself.
+The server listens on a local Unix socket. Each request and each response is one line of JSON:
+  {"path": "dir/Main.jack", "options": {...}}              compile a file, which the server reads itself
+  {"name": "Main.jack", "source": "class Main {...}"}     compile an in-memory source
+  {"op": "ping"} / {"op": "stop"}
+where options is the dictionary form of a CompileOptions (default options if it is left out),
+and the answer is {"vm": "...", "stats": {...}} with the VM text and optimization counts,
+or {"error": "..."} with the diagnostics."""
+from buildmanifest import compiler_version
+from compileclient import CompileClient, SOCKET_PATH
+from compilationengine import compile_to_vm
+from compileoptions import CompileOptions
+import argparse
+import json
+import os
+import socketserver
+import threading
+import traceback
+
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            request = json.loads(line)
+            response = self.answer(request)
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+            if request.get("op") == "stop":
+                # shutdown waits for serve_forever to return, so it cannot run in this handler's thread
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+    def answer(self, request):
+        op = request.get("op", "compile")
+        if op == "ping":
+            return {"version": self.server.version}
+        if op == "stop":
+            return {"stopped": True}
+        try:
+            name = request.get("path", request.get("name"))
+            source = request.get("source")
+            if source is None:
+                with open(name, 'r') as file:
+                    source = file.read()
+            vm, stats = compile_to_vm(name, source, CompileOptions.from_dict(request.get("options", {})))
+            return {"vm": vm, "stats": stats}
+        except BaseException as e:
+            # also a SystemExit or other non-Exception from the compiler: it must not end this thread
+            # without an answer, which the client would fail to decode
+            return {"error": "".join(traceback.format_exception_only(type(e), e)).strip()}
+
+
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)        # left over from a server that did not stop cleanly
+        super().__init__(socket_path, CompileRequestHandler)
+        self.version = compiler_version()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a compile server on a local Unix socket.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="socket path (default: " + SOCKET_PATH + ")")
+    parser.add_argument("--stop", action="store_true", help="stop the server listening on the socket")
+    args = parser.parse_args()
+
+    if args.stop:
+        client = CompileClient.connect(args.socket)
+        if client is None:
+            print("No compile server running on " + args.socket)
+        else:
+            client.request({"op": "stop"})
+            client.close()
+        return
+
+    server = CompileServer(args.socket)
+    print("Compile server listening on " + args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Checks of the compile server (compileserver.py) and its client, with a server in a thread of this process:
+  files and in-memory sources compile to the same VM code as without the server,
+  errors, also those of the per-character tokenizer on unclosed comments and strings, and exceptions that
+  are not an Exception come back as error answers, after which the server still answers,
+  jackcompiler.py hands its files to a running server, but does not connect to it for --emit,
+  and stop ends the server.
+Usage: python3 compileserver_unittest.py"""
+from buildmanifest import compiler_version
+from compilationengine import compile_to_vm
+from compileclient import CompileClient
+from compileoptions import CompileOptions
+from unittestsupport import check, finish, read, jack_files, program_dirs, COMPILER, TESTS_DIR
+import compileserver
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+BROKEN_SOURCES = {"unclosed comment": "class Main { /* never closed",
+                  "unclosed string": 'class Main { function void f() { var String s; let s = "abc',
+                  "truncated class": "class Main { function void f() { return;",
+                  "syntax error": "class Main { function void f() { let = 1; return; } }"}
+
+
+def check_compile(client):
+    check(client.version() == compiler_version(), "the server reports another compiler version")
+    for directory in program_dirs():
+        for fpath in jack_files(directory):
+            vm, error, stats = client.compile_file(fpath, CompileOptions().as_dict())
+            check(error is None and vm == read(fpath[:-4] + "vm"), "server output of " + fpath + " differs")
+    source = read(jack_files(program_dirs()[0])[0])
+    options = CompileOptions(fold=True, peephole=True)
+    vm, error, stats = client.compile_source("Main.jack", source, options.as_dict())
+    expected, expected_stats = compile_to_vm("Main.jack", source, options)
+    check(error is None and vm == expected and stats == dict(expected_stats),
+          "server output of an in-memory source differs")
+
+
+def check_errors(client):
+    for tokenizer in ("regex", "char"):
+        options = CompileOptions(tokenizer=tokenizer).as_dict()
+        for name, source in BROKEN_SOURCES.items():
+            vm, error, stats = client.compile_source("Main.jack", source, options)
+            check(vm is None and error is not None and error.startswith("ValueError"),
+                  tokenizer + " tokenizer, " + name + ": no ValueError answer, but " + str(error))
+        check(client.version() == compiler_version(), tokenizer + " tokenizer: no answer after the errors")
+    vm, error, stats = client.compile_file("NoSuchFile.jack", CompileOptions().as_dict())
+    check(error is not None and "NoSuchFile.jack" in error, "compiling a missing file gives no error answer")
+
+
+# an exception that is not an Exception, such as the SystemExit of sys.exit, is an error answer too
+def check_base_exceptions(client):
+    def compile_and_exit(name, source, options):
+        sys.exit(0)
+    compile_to_vm_of_server = compileserver.compile_to_vm
+    compileserver.compile_to_vm = compile_and_exit
+    try:
+        vm, error, stats = client.compile_source("Main.jack", "class Main { }", CompileOptions().as_dict())
+    finally:
+        compileserver.compile_to_vm = compile_to_vm_of_server
+    check(error is not None and error.startswith("SystemExit"), "a SystemExit gives no error answer")
+    check(client.version() == compiler_version(), "no answer after a SystemExit")
+
+
+def check_compiler_uses_server(socket_path, workdir):
+    copy = os.path.join(workdir, "Square")
+    os.mkdir(copy)
+    for fpath in jack_files(os.path.join(TESTS_DIR, "Square")):
+        shutil.copy(fpath, copy)
+    env = dict(os.environ, JACK_COMPILER_SOCKET=socket_path)
+    result = subprocess.run([sys.executable, COMPILER, "--jobs", "1", copy], env=env, capture_output=True, text=True)
+    lines = result.stdout.splitlines()
+    check(result.returncode == 0 and len(lines) == 3 and all(line.endswith("by compile server") for line in lines),
+          "jackcompiler.py does not compile with the running server: " + result.stdout + result.stderr)
+    for fpath in jack_files(copy):
+        expected = read(os.path.join(TESTS_DIR, "Square", os.path.basename(fpath)[:-4] + "vm"))
+        check(read(fpath[:-4] + "vm") == expected, "VM file written with the server differs for " + fpath)
+
+
+# --emit compiles in this process, so it must not even connect to a server: the listener counts the connections
+# and closes each one at once, which makes a client compile locally
+def check_emit_skips_server(workdir):
+    copy = os.path.join(workdir, "Seven")
+    os.mkdir(copy)
+    for fpath in jack_files(os.path.join(TESTS_DIR, "Seven")):
+        shutil.copy(fpath, copy)
+    socket_path = os.path.join(workdir, "listener.sock")
+    connections = []
+    done = threading.Event()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(socket_path)
+        listener.listen(1)
+        listener.settimeout(0.1)
+
+        def count_connections():
+            while not done.is_set():
+                try:
+                    connection = listener.accept()[0]
+                except socket.timeout:
+                    continue
+                connections.append(connection)
+                connection.close()
+        counter = threading.Thread(target=count_connections)
+        counter.start()
+        env = dict(os.environ, JACK_COMPILER_SOCKET=socket_path)
+        result = subprocess.run([sys.executable, COMPILER, "--emit", "vm", copy], env=env, capture_output=True,
+                                text=True)
+        done.set()
+        counter.join()
+    check(result.returncode == 0, "--emit vm fails: " + result.stdout + result.stderr)
+    check(not connections, "--emit connects to the compile server")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as workdir:
+        socket_path = os.path.join(workdir, "server.sock")
+        server = compileserver.CompileServer(socket_path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        client = CompileClient.connect(socket_path)
+        client.sock.settimeout(60)                # a compile that never ends fails the script instead
+        try:
+            check_compile(client)
+            check_errors(client)
+            check_base_exceptions(client)
+            check_compiler_uses_server(socket_path, workdir)
+            check_emit_skips_server(workdir)
+            check(client.request({"op": "stop"}) == {"stopped": True}, "stop is not acknowledged")
+            thread.join(10)
+            check(not thread.is_alive(), "the server does not stop")
+        finally:
+            client.close()
+            if thread.is_alive():
+                server.shutdown()
+            server.server_close()
+    finish()
@@ -0,0 +1,49 @@
+"""Evaluation of Jack operators on constants, with the 16-bit two's complement arithmetic of the Hack platform.
+Used by the compilation engine to fold constant subexpressions and simplify algebraic identities."""
+
+TRUE = -1
+FALSE = 0
+
+# x op c == x for these (op, c), and c op x == x for IDENTITY_LEFT
+IDENTITY_RIGHT = {("+", 0), ("-", 0), ("|", 0), ("*", 1), ("/", 1), ("&", TRUE)}
+IDENTITY_LEFT = {("+", 0), ("|", 0), ("*", 1), ("&", TRUE)}
+# x op c == c and c op x == c for these (op, c), as long as evaluating x has no side effects
+ABSORBING = {("*", 0), ("&", 0), ("|", TRUE)}
+
+
+def to_int16(value):
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def fold_unary(operation, value):
+    if operation == "-":
+        return to_int16(-value)
+    return to_int16(~value)               # "~"
+
+
+'''fold_binary returns the value of "a operation b", or None if the operation
+cannot be evaluated at compile time (division by zero, and overflowing divisions)'''
+def fold_binary(operation, a, b):
+    if operation == "+":
+        return to_int16(a + b)
+    if operation == "-":
+        return to_int16(a - b)
+    if operation == "*":
+        return to_int16(a * b)            # Math.multiply keeps the low 16 bits of the product
+    if operation == "/":
+        if b == 0 or a == -32768 or b == -32768:
+            return None                   # left to Math.divide, which also reports division by zero
+        quotient = abs(a) // abs(b)       # Math.divide rounds towards zero
+        return quotient if (a < 0) == (b < 0) else -quotient
+    if operation == "&":
+        return to_int16(a & b)
+    if operation == "|":
+        return to_int16(a | b)
+    if operation == "<":
+        return TRUE if a < b else FALSE
+    if operation == ">":
+        return TRUE if a > b else FALSE
+    if operation == "=":
+        return TRUE if a == b else FALSE
+    return None
@@ -0,0 +1,68 @@
+"""Front end shared by the syntax analyzer's XML output and the compiler's VM output.
+
+A class is tokenized once and parsed into its parse tree (jackast.py), which is then handed to any
+combination of sinks: XmlSink writes the XML of the syntax analyzer, VmSink the VM code and NullSink
+nothing at all, so that files that only need to be checked are parsed without writing any output."""
+from collections import Counter
+from compileoptions import CompileOptions
+from jackast import parse_class
+from jacktokenizer import DEFAULT_TOKENIZER
+
+
+class XmlSink:
+    """Writes the parse tree to the .xml file next to the source."""
+
+    output = "XML"
+
+    def emit(self, fpath, ast):
+        with open(fpath[:-4] + "xml", 'w') as file:
+            ast.write_xml(file)
+        return Counter()
+
+
+class VmSink:
+    """Writes the VM code of the class to the .vm file next to the source. The compilation engine generates it
+    from the tree itself, so there is a single code generator for every way of compiling."""
+
+    output = "VM"
+
+    def __init__(self, options=None):
+        self.options = options if options is not None else CompileOptions()
+
+    def emit(self, fpath, ast):
+        from compilationengine import CompilationEngine
+        engine = CompilationEngine(fpath, self.options, ast=ast)
+        engine.compile_class()
+        return engine.statistics()
+
+
+class NullSink:
+    """Writes nothing: the parse alone checks the syntax of the class."""
+
+    output = None
+
+    def emit(self, fpath, ast):
+        return Counter()
+
+
+SINKS = {"xml": XmlSink, "vm": VmSink, "none": NullSink}
+
+
+# the sinks named in names (keys of SINKS), in that order; the VM sink uses options
+def make_sinks(names, options=None):
+    sinks = []
+    for name in names:
+        if name not in SINKS:
+            raise ValueError("Unknown output " + name + ", expected one of " + ", ".join(SINKS))
+        sinks.append(VmSink(options) if name == "vm" else SINKS[name]())
+    return sinks
+
+'''run_front_end parses the class in the file fpath (or in source, if it is given) once, with the tokenizer
+engine of the given name (jacktokenizer.TOKENIZERS), and hands its tree to every sink.
+Returns the statistics of the sinks.'''
+def run_front_end(fpath, sinks, source=None, tokenizer=DEFAULT_TOKENIZER):
+    ast = parse_class(fpath, source, tokenizer)
+    stats = Counter()
+    for sink in sinks:
+        stats.update(sink.emit(fpath, ast))
+    return stats
@@ -0,0 +1,106 @@
+"""Checks of the shared front end (frontend.py):
+  --emit vm,xml writes the committed .vm files and the syntax analyzer's expected XML, with each tokenizer,
+  the VM sink compiles the tree it is given without reading the source again,
+  each file is parsed once with the tokenizer of the options, and --emit none writes nothing.
+Usage: python3 frontend_unittest.py"""
+from collections import Counter
+from compileoptions import CompileOptions
+from jackast import parse_class
+from jackcompiler import treatfile_front_end
+from jacktokenizer import TOKENIZERS
+from unittestsupport import check, finish, read, jack_files, program_dirs, run_compiler, COMPILER_DIR
+import frontend
+import glob
+import os
+import shutil
+import tempfile
+
+ANALYZER_DIR = os.path.join(os.path.dirname(COMPILER_DIR), "SyntaxAnalyzer")
+
+
+# copies the .jack files of directory to a new directory in workdir and returns it
+def copy_sources(directory, workdir):
+    copy = os.path.join(workdir, os.path.basename(directory))
+    os.mkdir(copy)
+    for fpath in jack_files(directory):
+        shutil.copy(fpath, copy)
+    return copy
+
+
+def check_emit(workdir):
+    for tokenizer in sorted(TOKENIZERS):
+        analyzer_dirs = sorted(os.path.dirname(fpath) for fpath in glob.glob(os.path.join(ANALYZER_DIR, "*", "")))
+        for i, directory in enumerate(program_dirs() + analyzer_dirs):
+            copy_dir = os.path.join(workdir, tokenizer + str(i))
+            os.mkdir(copy_dir)
+            copy = copy_sources(directory, copy_dir)
+            result = run_compiler(["--emit", "vm,xml", "--tokenizer", tokenizer, copy])
+            check(result.returncode == 0, tokenizer + ": --emit vm,xml fails on " + directory + ": " + result.stdout)
+            for fpath in jack_files(directory):
+                output = os.path.join(copy, os.path.basename(fpath))[:-4]
+                if os.path.exists(fpath[:-4] + "vm"):
+                    check(read(output + "vm") == read(fpath[:-4] + "vm"),
+                          tokenizer + ": --emit vm,xml writes another " + fpath[:-4] + "vm")
+                if os.path.exists(fpath[:-5] + "-correct.xml"):
+                    check(read(output + "xml") == read(fpath[:-5] + "-correct.xml"),
+                          tokenizer + ": --emit vm,xml writes another XML for " + fpath)
+
+
+def check_vm_sink(workdir):
+    for fpath in jack_files(program_dirs()[0]):
+        ast = parse_class(fpath)
+        # the sink's file name has no source next to it, so the code can only come from the tree
+        name = os.path.join(workdir, os.path.basename(fpath))
+        frontend.VmSink().emit(name, ast)
+        check(read(name[:-4] + "vm") == read(fpath[:-4] + "vm"), "the VM sink writes another " + fpath[:-4] + "vm")
+
+
+class CountingSink(frontend.NullSink):
+    """Counts the trees it receives."""
+
+    def __init__(self):
+        self.trees = 0
+
+    def emit(self, fpath, ast):
+        self.trees += 1
+        return Counter()
+
+
+def check_single_parse():
+    parses = []
+    parse = frontend.parse_class
+
+    def counting_parse(fpath, source=None, tokenizer=None):
+        parses.append(tokenizer)
+        return parse(fpath, source, tokenizer)
+
+    frontend.parse_class = counting_parse
+    try:
+        for tokenizer in sorted(TOKENIZERS):
+            for fpath in jack_files(program_dirs()[0]):
+                del parses[:]
+                sinks = [CountingSink(), CountingSink()]
+                frontend.run_front_end(fpath, sinks, read(fpath), tokenizer)
+                check(parses == [tokenizer] and [sink.trees for sink in sinks] == [1, 1],
+                      "the front end parses " + fpath + " with " + str(parses) + " instead of once with " + tokenizer)
+                # the compiler hands the tokenizer of its options to the front end
+                del parses[:]
+                treatfile_front_end(fpath, CompileOptions(tokenizer=tokenizer), ["none"])
+                check(parses == [tokenizer], "--emit parses " + fpath + " with " + str(parses))
+    finally:
+        frontend.parse_class = parse
+
+
+def check_emit_none(workdir):
+    copy = copy_sources(program_dirs()[0], workdir)
+    result = run_compiler(["--emit", "none", copy])
+    check(result.returncode == 0 and sorted(os.listdir(copy)) == sorted(map(os.path.basename, jack_files(copy))),
+          "--emit none writes " + ", ".join(sorted(os.listdir(copy))))
+
+
+if __name__ == "__main__":
+    check_single_parse()
+    for check_output in (check_emit, check_vm_sink, check_emit_none):
+        with tempfile.TemporaryDirectory() as workdir:
+            check_output(workdir)
+    finish()
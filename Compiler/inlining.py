@@ -0,0 +1,137 @@
+"""Inlining of small subroutines into their callers, on the VM code of a whole program (vmprogram.py).
+
+A subroutine can be inlined if its code is straight-line (no labels or jumps, so no loops) and ends
+with its only return. At a call site, the arguments on the stack are popped into fresh locals of the
+caller, the subroutine's own locals get fresh caller locals as well, and the code is copied with its
+argument and local references moved to those locals. A method works on its object through the that
+segment instead of this, so the caller's this stays untouched: a call of an accessor such as getX()
+becomes  pop pointer 1; push that 0."""
+from collections import Counter
+
+DEFAULT_MAX_SIZE = 12           # longest subroutine that is inlined, in commands without the return
+DEFAULT_BUDGET = 1000           # maximal number of commands the program may grow by
+
+METHOD_ENTRY = ["push argument 0", "pop pointer 0"]
+
+
+class InlineCandidate:
+    """The code of a subroutine that can be inlined, as lists of words without the final return."""
+
+    def __init__(self, name, n_locals, commands, is_method):
+        self.name = name
+        self.classname = name.split(".")[0]
+        self.n_locals = n_locals
+        self.commands = commands
+        self.is_method = is_method
+        self.uses_statics = any(command[1:2] == ["static"] for command in commands)
+        # a method that needs its object only for the entry code gets it straight into pointer 1
+        self.object_only_on_entry = is_method and \
+            all(command[1:] != ["argument", "0"] for command in commands[len(METHOD_ENTRY):])
+
+    '''candidate returns the InlineCandidate for the code of a subroutine given as lines,
+    or None if it cannot or should not be inlined'''
+    @classmethod
+    def candidate(cls, lines, max_size):
+        name, n_locals = lines[0].split()[1:]
+        body = lines[1:]
+        if len(body) - 1 > max_size or body[-1] != "return" or "return" in body[:-1]:
+            return None
+        commands = [line.split() for line in body[:-1]]
+        for command in commands:
+            if command[0] in ("label", "goto", "if-goto") or command == ["call", name] + command[2:]:
+                return None
+        is_method = body[:len(METHOD_ENTRY)] == METHOD_ENTRY
+        for command in commands[len(METHOD_ENTRY) if is_method else 0:]:
+            if command[1:] == ["pointer", "0"] and (command[0] == "pop" or not is_method):
+                return None     # constructors, and methods that change their this
+            if command[1:2] == ["this"] and not is_method:
+                return None
+            if command[1:2] == ["that"] or command[1:] == ["pointer", "1"]:
+                if is_method:
+                    return None     # the that segment holds the object
+        return cls(name, int(n_locals), commands, is_method)
+
+    '''code returns the lines that replace a call with n_args arguments,
+    in a caller whose fresh locals start at index base'''
+    def code(self, n_args, base):
+        lines = []
+        commands = self.commands
+        for i in reversed(range(n_args)):
+            if i == 0 and self.object_only_on_entry:
+                lines.append("pop pointer 1")
+                commands = commands[len(METHOD_ENTRY):]
+            else:
+                lines.append("pop local " + str(base + i))
+        for j in range(self.n_locals):
+            lines += ["push constant 0", "pop local " + str(base + n_args + j)]
+        for command in commands:
+            lines.append(" ".join(self.relocate(command, n_args, base)))
+        return lines
+
+    def relocate(self, command, n_args, base):
+        if len(command) != 3 or command[0] not in ("push", "pop"):
+            return command
+        operation, segment, idx = command
+        if segment == "argument":
+            return [operation, "local", str(base + int(idx))]
+        if segment == "local":
+            return [operation, "local", str(base + n_args + int(idx))]
+        if segment == "this":
+            return [operation, "that", idx]
+        if segment == "pointer":
+            return [operation, "pointer", "1"]
+        return command
+
+
+class Inliner:
+    """Inlines the calls of small subroutines in all functions of a VMProgram, as long as the program
+    grows by at most budget commands. Calls are inlined once: the calls in inlined code stay calls.
+    Subroutines that are no longer called afterwards are left for VMProgram.shake to drop."""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, budget=DEFAULT_BUDGET, optimizer=None):
+        self.max_size = max_size
+        self.budget = budget
+        self.optimizer = optimizer      # peephole optimizer for the functions that received inlined code
+        self.stats = Counter()
+
+    def inline(self, program):
+        candidates = {}
+        for name, lines in program.functions.items():
+            candidate = InlineCandidate.candidate(lines, self.max_size)
+            if candidate is not None:
+                candidates[name] = candidate
+
+        growth = 0
+        for name, lines in program.functions.items():
+            caller_class = name.split(".")[0]
+            header = lines[0].split()
+            base = int(header[2])
+            n_extra_locals = 0
+            new_lines = [lines[0]]
+            for line in lines[1:]:
+                command = line.split()
+                candidate = candidates.get(command[1]) if command[0] == "call" else None
+                if candidate is None or candidate.name == name or \
+                        (candidate.uses_statics and candidate.classname != caller_class):
+                    new_lines.append(line)
+                    continue
+                n_args = int(command[2])
+                code = candidate.code(n_args, base)
+                if growth + len(code) - 1 > self.budget:
+                    new_lines.append(line)
+                    continue
+                growth += len(code) - 1
+                new_lines += code
+                n_extra_locals = max(n_extra_locals, n_args + candidate.n_locals)
+                self.stats["inlining: calls inlined"] += 1
+            if new_lines != lines:
+                new_lines[0] = " ".join(header[:2] + [str(base + n_extra_locals)])
+                if self.optimizer is not None:
+                    code = self.optimizer.optimize("".join(line + "\n" for line in new_lines[1:]))
+                    new_lines = new_lines[:1] + code.splitlines()
+                program.functions[name] = new_lines
+        self.stats["inlining: commands added"] += growth
+        if self.optimizer is not None:
+            prefix = self.optimizer.STATS_PREFIX
+            self.stats.update({prefix + name: hits for name, hits in self.optimizer.hits.items()})
+        return self.stats
@@ -0,0 +1,153 @@
+"""Checks of the inlining of small subroutines (inlining.py):
+  an accessor call becomes  pop pointer 1; push that 0  and the caller gets locals for inlined arguments,
+  subroutines with jumps, recursion, constructors, methods that use that, long subroutines and functions
+  using statics of another class are not inlined, the budget bounds the growth,
+  and inlined programs run like the programs without inlining.
+Usage: python3 inlining_unittest.py"""
+from inlining import Inliner
+from jackapi import compile_sources
+from peephole import PeepholeOptimizer
+from unittestsupport import check, finish, VMRunner
+
+SOURCES = {"Main": """class Main {
+    static int calls;
+    function void main() {
+        var Point p, q;
+        var int i;
+        let p = Point.new(3, 4);
+        let q = Point.new(-2, 7);
+        do Output.printInt(p.getX());
+        do p.moveBy(5, -1);
+        do Output.printInt(p.getX() + p.getY());
+        do Output.printInt(p.dot(q));
+        do Output.printInt(q.first(p));
+        do Output.printInt(Main.square(p.getY()));
+        do Output.printInt(Main.sum(4));
+        do Output.printInt(Main.fact(5));
+        do Output.printInt(Main.count());
+        do Output.printInt(Main.count());
+        do Output.printInt(Point.origins());
+        while (i < 3) {
+            do Output.printInt(Main.mix(i, p.getX(), q.getY()));
+            let i = i + 1;
+        }
+        return;
+    }
+    function int square(int x) {
+        return x * x;
+    }
+    function int mix(int a, int b, int c) {
+        var int t;
+        let t = a - b;
+        return (t * c) + a;
+    }
+    function int sum(int n) {
+        var int s;
+        while (n > 0) {
+            let s = s + n;
+            let n = n - 1;
+        }
+        return s;
+    }
+    function int fact(int n) {
+        if (n < 2) {
+            return 1;
+        }
+        return n * Main.fact(n - 1);
+    }
+    function int count() {
+        let calls = calls + 1;
+        return calls;
+    }
+}""",
+           "Point": """class Point {
+    field int x, y;
+    static int origins;
+    constructor Point new(int ax, int ay) {
+        let x = ax;
+        let y = ay;
+        let origins = origins + 1;
+        return this;
+    }
+    method int getX() {
+        return x;
+    }
+    method int getY() {
+        return y;
+    }
+    method void moveBy(int dx, int dy) {
+        let x = x + dx;
+        let y = y + dy;
+        return;
+    }
+    method int dot(Point other) {
+        return (x * other.getX()) + (y * other.getY());
+    }
+    method int first(Array a) {
+        return a[0] + x;
+    }
+    function int origins() {
+        return origins;
+    }
+}"""}
+
+
+def function_lines(vms, name):
+    lines = vms[name.split(".")[0]].splitlines()
+    start = next(i for i, line in enumerate(lines) if line.startswith("function " + name + " "))
+    end = next((i for i in range(start + 1, len(lines)) if lines[i].startswith("function ")), len(lines))
+    return lines[start:end]
+
+
+def calls_in(vms, name):
+    return [line.split()[1] for line in function_lines(vms, name) if line.startswith("call ")]
+
+
+def output_of(vms):
+    runner = VMRunner(vms)
+    check(runner.run("Main.main") is not None, "Main.main does not return")
+    return runner.output
+
+
+def check_inlined_calls():
+    plain = compile_sources(SOURCES)
+    vms = compile_sources(SOURCES, inliner=Inliner())
+    # not inlined: the constructor, the loop, the recursion, the method that needs that, and the function that
+    # reads a static of another class; the calls in the inlined code of Point.dot stay calls
+    check(sorted(set(calls_in(vms, "Main.main"))) == ["Main.fact", "Main.sum", "Math.multiply", "Output.printInt",
+                                                      "Point.first", "Point.getX", "Point.getY", "Point.new",
+                                                      "Point.origins"],
+          "wrong calls inlined: " + ", ".join(sorted(set(calls_in(vms, "Main.main")))))
+    check(calls_in(vms, "Main.main").count("Point.getX") == 1, "p.getX() is not inlined")
+    check("function Point.moveBy 0" not in vms["Point"] and "function Main.square 0" not in vms["Main"],
+          "inlined subroutines are still in the program")
+    check("push local 0\npop pointer 1\npush that 0\ncall Output.printInt 1\n" in vms["Main"],
+          "p.getX() does not read through that")
+    header = function_lines(vms, "Main.main")[0].split()
+    check(int(header[2]) > 3, "Main.main gets no locals for the inlined arguments: " + " ".join(header))
+    check(output_of(vms) == output_of(plain), "the inlined program prints " + str(output_of(vms)))
+
+
+def check_limits():
+    plain = compile_sources(SOURCES)
+    vms = compile_sources(SOURCES, inliner=Inliner(max_size=3))
+    check("Main.mix" in calls_in(vms, "Main.main") and "Point.getX" not in calls_in(vms, "Main.main"),
+          "max_size does not bound the inlined subroutines")
+    inliner = Inliner(budget=0)
+    vms = compile_sources(SOURCES, inliner=inliner)
+    check(inliner.stats["inlining: calls inlined"] == 0 and "Point.getX" in calls_in(vms, "Main.main"),
+          "calls are inlined beyond a budget of 0")
+    inliner = Inliner(budget=20)
+    vms = compile_sources(SOURCES, inliner=inliner)
+    check(0 < inliner.stats["inlining: commands added"] <= 20, "inlining grows the program by " +
+          str(inliner.stats["inlining: commands added"]) + " commands with a budget of 20")
+    check(output_of(vms) == output_of(plain), "the program inlined with a budget prints " + str(output_of(vms)))
+    inliner = Inliner(optimizer=PeepholeOptimizer())
+    vms = compile_sources(SOURCES, inliner=inliner)
+    check(output_of(vms) == output_of(plain), "the inlined and optimized program prints " + str(output_of(vms)))
+
+
+if __name__ == "__main__":
+    check_inlined_calls()
+    check_limits()
+    finish()
@@ -0,0 +1,62 @@
+"""Inline expansions of small OS functions, used instead of calling them when intrinsics are switched on.
+
+An expansion finds the arguments of the call on the stack, like the called function would. It gets
+the VMWriter to emit its code to and a function that returns fresh labels, and returns whether it
+leaves a return value on the stack: Memory.poke does not, so that a do statement need not discard one.
+Expansions keep values in temp 0, temp 2 and temp 3, which hold nothing across the evaluation of
+an expression (temp 1 keeps the index of an array assignment, so it is not used)."""
+
+
+# Memory.peek(address)
+def memory_peek(writer, fresh_label):
+    writer.pop("pointer", 1)
+    writer.push("that", 0)
+    return True
+
+# Memory.poke(address, value)
+def memory_poke(writer, fresh_label):
+    writer.pop("temp", 0)
+    writer.pop("pointer", 1)
+    writer.push("temp", 0)
+    writer.pop("that", 0)
+    return False
+
+# Math.abs(x): x, negated if it is negative (like the OS function, -32768 stays -32768)
+def math_abs(writer, fresh_label):
+    done = fresh_label()
+    writer.pop("temp", 2)
+    writer.push("temp", 2)
+    writer.push("temp", 2)
+    writer.push("constant", 0)
+    writer.arithmetic("lt")
+    writer.arithmetic("not")
+    writer.ifgoto(done)
+    writer.arithmetic("neg")
+    writer.label(done)
+    return True
+
+# Math.min(a, b) and Math.max(a, b): a is replaced by b if b is smaller (or larger)
+def min_or_max(comparison):
+    def expand(writer, fresh_label):
+        done = fresh_label()
+        writer.pop("temp", 3)
+        writer.pop("temp", 2)
+        writer.push("temp", 2)
+        writer.push("temp", 2)
+        writer.push("temp", 3)
+        writer.arithmetic(comparison)
+        writer.arithmetic("not")
+        writer.ifgoto(done)
+        writer.pop("temp", 0)
+        writer.push("temp", 3)
+        writer.label(done)
+        return True
+    return expand
+
+
+# OS function -> (number of arguments, expansion)
+INTRINSICS = {"Memory.peek": (1, memory_peek),
+              "Memory.poke": (2, memory_poke),
+              "Math.abs": (1, math_abs),
+              "Math.min": (2, min_or_max("gt")),
+              "Math.max": (2, min_or_max("lt"))}
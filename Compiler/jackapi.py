@@ -0,0 +1,68 @@
+"""Library interface of the compiler and the syntax analyzer, working on source text in memory.
+
+Nothing is read from or written to disk: sources are strings, and results are the VM text or the XML
+of the syntax analyzer, as strings. A single class is given as its source, a program as a mapping from
+class names to sources, for example:
+
+    from jackapi import compile_sources
+    vm = compile_sources({"Main": "class Main { function void main() { return; } }"})
+    vm["Main"]        # 'function Main.main 0\\npush constant 0\\nreturn\\n'
+
+The name of a class is only used in error messages and as the key of the results; compile_source and
+analyze_source do not need one."""
+from collections import Counter
+from compilationengine import compile_to_vm
+from jackast import parse_class
+from jackinterface import interface_of
+from vmprogram import VMProgram
+import io
+
+SOURCE_NAME = "<source>.jack"             # name of a source in error messages, when it has none
+
+
+'''compile_source compiles the class in source and returns its VM text.
+options is a CompileOptions (default: the plain compiler), and the optimization counts are added
+to stats if it is a Counter. With the interfaces option, calls are checked against the mapping
+interfaces (class name -> jackinterface.ClassInterface), by default only the class's own interface'''
+def compile_source(source, name=SOURCE_NAME, options=None, stats=None, interfaces=None):
+    if options is not None and options.interfaces and interfaces is None:
+        interface = interface_of(name, source)
+        interfaces = {interface.name: interface}
+    vm, file_stats = compile_to_vm(name, source, options, interfaces)
+    if stats is not None:
+        stats.update(file_stats)
+    return vm
+
+'''compile_sources compiles the classes of the mapping sources (class name -> source) and returns
+a dictionary class name -> VM text, in the order of sources.
+With whole_program, the classes are one program: if an inliner (inlining.Inliner) is given, small
+subroutines are inlined, and subroutines that cannot be reached from Main.main are dropped, as are
+the classes that have none left.
+With the interfaces option, the calls between the classes are checked against their interfaces'''
+def compile_sources(sources, options=None, stats=None, whole_program=False, inliner=None):
+    stats = stats if stats is not None else Counter()
+    interfaces = None
+    if options is not None and options.interfaces:
+        interfaces = {classname: interface_of(classname + ".jack", source) for classname, source in sources.items()}
+    vms = {classname: compile_source(source, classname + ".jack", options, stats, interfaces)
+           for classname, source in sources.items()}
+    if not whole_program and inliner is None:
+        return vms
+    program = VMProgram()
+    for classname, vm in vms.items():
+        program.add_class(classname, vm)
+    if inliner is not None:
+        stats.update(inliner.inline(program))
+    stats["tree shaking: subroutines dropped"] += len(program.shake())
+    empty = program.empty_classes()
+    return {classname: program.vm_text(classname) for classname in vms if classname not in empty}
+
+# the XML parse tree of the class in source, as written by the syntax analyzer
+def analyze_source(source, name=SOURCE_NAME):
+    xml = io.StringIO()
+    parse_class(name, source).write_xml(xml)
+    return xml.getvalue()
+
+# the XML parse trees of the classes of the mapping sources, as a dictionary class name -> XML text
+def analyze_sources(sources):
+    return {classname: analyze_source(source, classname + ".jack") for classname, source in sources.items()}
@@ -0,0 +1,140 @@
+"""Checks of the library interface (jackapi.py):
+  compile_source and compile_sources give the committed .vm files of the programs in tests/ and add the
+  optimization counts to stats, whole programs are compiled like jackcompiler.py --whole-program does,
+  calls between the given classes are checked against their interfaces, analyze_source gives the syntax
+  analyzer's expected XML, and nothing is read from or written to the working directory.
+Usage: python3 jackapi_unittest.py"""
+from collections import Counter
+from compilationengine import compile_to_vm
+from compileoptions import CompileOptions
+from jackapi import compile_source, compile_sources, analyze_source, analyze_sources
+from unittestsupport import check, finish, read, jack_files, program_dirs, run_compiler, COMPILER_DIR
+import glob
+import os
+import shutil
+import tempfile
+
+ANALYZER_DIR = os.path.join(os.path.dirname(COMPILER_DIR), "SyntaxAnalyzer")
+
+# Main.main calls Point.new with one argument too few, which only the interface of Point shows
+WRONG_CALL_SOURCES = {"Main": """class Main {
+    function void main() {
+        var Point p;
+        let p = Point.new(1);
+        return;
+    }
+}""", "Point": """class Point {
+    field int x, y;
+    constructor Point new(int ax, int ay) {
+        let x = ax;
+        let y = ay;
+        return this;
+    }
+}"""}
+
+# Unused is never called from Main.main, and Main.helper calls its own function with a wrong argument count
+UNUSED_SOURCES = {"Main": """class Main {
+    function void main() {
+        return;
+    }
+    function void helper() {
+        do Main.main(1);
+        return;
+    }
+}""", "Unused": """class Unused {
+    function int f() {
+        return 1;
+    }
+}"""}
+
+
+# the sources of the classes in directory, as a mapping class name -> source
+def sources_of(directory):
+    return {os.path.basename(fpath)[:-5]: read(fpath) for fpath in jack_files(directory)}
+
+
+def check_compile():
+    for directory in program_dirs():
+        sources = sources_of(directory)
+        vms = compile_sources(sources)
+        check(list(vms) == list(sources), "compile_sources changes the order of the classes of " + directory)
+        for classname, source in sources.items():
+            expected = read(os.path.join(directory, classname + ".vm"))
+            check(vms[classname] == expected, "compile_sources gives another " + classname + ".vm in " + directory)
+            check(compile_source(source) == expected, "compile_source gives another " + classname + ".vm")
+            stats = Counter()
+            options = CompileOptions(fold=True, peephole=True)
+            vm = compile_source(source, classname + ".jack", options, stats)
+            expected_vm, expected_stats = compile_to_vm(classname + ".jack", source, options)
+            check(vm == expected_vm and stats == expected_stats,
+                  "compile_source with options differs from the engine for " + classname + " in " + directory)
+
+
+def check_whole_program(workdir):
+    for directory in program_dirs():
+        copy = os.path.join(workdir, os.path.basename(directory))
+        os.mkdir(copy)
+        for fpath in jack_files(directory):
+            shutil.copy(fpath, copy)
+        result = run_compiler(["--whole-program", copy])
+        check(result.returncode == 0, "--whole-program fails on " + directory + ": " + result.stdout)
+        stats = Counter()
+        vms = compile_sources(sources_of(directory), stats=stats, whole_program=True)
+        written = sorted(f[:-3] for f in os.listdir(copy) if f.endswith(".vm"))
+        check(sorted(vms) == written, "compile_sources keeps the classes " + ", ".join(sorted(vms)) +
+              " of " + directory + ", and --whole-program writes " + ", ".join(written))
+        for classname, vm in vms.items():
+            if classname in written:
+                check(vm == read(os.path.join(copy, classname + ".vm")),
+                      "the whole program " + directory + " has another " + classname + ".vm")
+        check("tree shaking: subroutines dropped" in stats, "tree shaking is not counted for " + directory)
+    vms = compile_sources(UNUSED_SOURCES, whole_program=True)
+    check(list(vms) == ["Main"] and vms["Main"] == "function Main.main 0\npush constant 0\nreturn\n",
+          "the unused class and subroutine are kept: " + str(vms))
+
+
+def check_interfaces():
+    options = CompileOptions(interfaces=True)
+    try:
+        compile_sources(WRONG_CALL_SOURCES, options)
+        check(False, "a call with a wrong number of arguments compiles with interfaces")
+    except ValueError as error:
+        check("Point.new takes 2 arguments, but is called with 1" in str(error), "wrong error: " + str(error))
+    vms = compile_sources(WRONG_CALL_SOURCES)
+    check("call Point.new 1" in vms["Main"], "the call is not compiled without interfaces")
+    # a class on its own is checked against its own interface only
+    check(compile_source(WRONG_CALL_SOURCES["Main"], "Main.jack", options) == vms["Main"],
+          "a single class is checked against interfaces of other classes")
+    try:
+        compile_source(UNUSED_SOURCES["Main"], "Main.jack", options)
+        check(False, "a call of a function of the same class with a wrong number of arguments compiles")
+    except ValueError as error:
+        check("Main.main takes 0 arguments, but is called with 1" in str(error), "wrong error: " + str(error))
+
+
+def check_analyze():
+    for fpath in sorted(glob.glob(os.path.join(ANALYZER_DIR, "*", "*.jack"))):
+        check(analyze_source(read(fpath)) == read(fpath[:-5] + "-correct.xml"),
+              "analyze_source gives another XML for " + fpath)
+    directory = os.path.join(ANALYZER_DIR, "Square")
+    xmls = analyze_sources(sources_of(directory))
+    check(sorted(xmls) == ["Main", "Square", "SquareGame"] and
+          all(xml == read(os.path.join(directory, classname + "-correct.xml")) for classname, xml in xmls.items()),
+          "analyze_sources gives other XML for " + directory)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as workdir:
+        # the in-memory checks run in an empty working directory, which must stay empty
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            check_compile()
+            check_interfaces()
+            check_analyze()
+        finally:
+            os.chdir(cwd)
+        check(os.listdir(workdir) == [], "the library writes " + ", ".join(os.listdir(workdir)))
+    with tempfile.TemporaryDirectory() as workdir:
+        check_whole_program(workdir)
+    finish()
@@ -0,0 +1,334 @@
+"""Parse tree of a Jack class, stored as an arena of integer-indexed nodes.
+
+Node i is described by the i-th entry of parallel arrays: its kind, the index of its token in the
+TokenStream (terminals only, -1 for the others), its first child and its next sibling (-1 if none).
+The tree has exactly the structure of the XML written by SyntaxAnalyzer/compilationengine.py:
+one node per XML element, nonterminals such as letStatement or expression, and a terminal node
+for every token. Building it allocates no Python object per node, and a pass over it only reads
+the arrays, so several passes over a large class cost no more memory than one."""
+from array import array
+from jacktoken import TEXT_CODE, NO_TEXT_CODE, TOKEN_TYPE_NAMES, KEYWORD_CONSTANT, IDENTIFIER, CONSTANT_KINDS
+from jacktokenizer import TOKENIZERS, DEFAULT_TOKENIZER
+
+# node kinds: the nonterminals of the XML parse tree, and TERMINAL for tokens
+NONTERMINALS = ("class", "classVarDec", "subroutineDec", "parameterList", "subroutineBody", "varDec",
+                "statements", "letStatement", "ifStatement", "whileStatement", "doStatement", "returnStatement",
+                "expression", "term", "expressionList")
+CLASS, CLASS_VAR_DEC, SUBROUTINE_DEC, PARAMETER_LIST, SUBROUTINE_BODY, VAR_DEC, \
+    STATEMENTS, LET_STATEMENT, IF_STATEMENT, WHILE_STATEMENT, DO_STATEMENT, RETURN_STATEMENT, \
+    EXPRESSION, TERM, EXPRESSION_LIST = range(len(NONTERMINALS))
+TERMINAL = len(NONTERMINALS)
+NO_NODE = -1
+
+STATEMENT_KINDS = {TEXT_CODE["let"]: LET_STATEMENT, TEXT_CODE["if"]: IF_STATEMENT,
+                   TEXT_CODE["while"]: WHILE_STATEMENT, TEXT_CODE["do"]: DO_STATEMENT,
+                   TEXT_CODE["return"]: RETURN_STATEMENT}
+SUBROUTINE_CODES = frozenset(TEXT_CODE[word] for word in ("constructor", "function", "method"))
+BINARY_OP_CODES = frozenset(TEXT_CODE[op] for op in "+-*/&|<>=")
+UNARY_OP_CODES = frozenset(TEXT_CODE[op] for op in "-~")
+
+XML_INDENT_SIZE = 2
+XML_ESCAPES = {"<": "&lt;", ">": "&gt;", "&": "&amp;"}
+
+
+class JackAST:
+    """Arena of the nodes of one class's parse tree, over the tokens of its TokenStream."""
+    __slots__ = ("tokens", "kinds", "token_index", "first_child", "next_sibling", "last_child")
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.kinds = array("B")
+        self.token_index = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.last_child = array("i")         # only used while building
+
+    def __len__(self):
+        return len(self.kinds)
+
+    # appends a node as the last child of parent (NO_NODE for the root) and returns its index
+    def add(self, kind, parent, token=NO_NODE):
+        node = len(self.kinds)
+        self.kinds.append(kind)
+        self.token_index.append(token)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.last_child.append(NO_NODE)
+        if parent != NO_NODE:
+            last = self.last_child[parent]
+            if last == NO_NODE:
+                self.first_child[parent] = node
+            else:
+                self.next_sibling[last] = node
+            self.last_child[parent] = node
+        return node
+
+    def children(self, node):
+        child = self.first_child[node]
+        result = []
+        while child != NO_NODE:
+            result.append(child)
+            child = self.next_sibling[child]
+        return result
+
+    def is_terminal(self, node):
+        return self.kinds[node] == TERMINAL
+
+    # text of the token of a terminal node
+    def content(self, node):
+        return self.tokens.content(self.token_index[node])
+
+    def token_kind(self, node):
+        return self.tokens.kinds[self.token_index[node]]
+
+    # code of the text of the token of a terminal node (TEXT_CODE), NO_TEXT_CODE for identifiers and constants
+    # and for NO_NODE, so that looking at the sibling after the last child needs no test
+    def code(self, node):
+        return self.tokens.codes[self.token_index[node]] if node != NO_NODE else NO_TEXT_CODE
+
+    '''write_xml writes the tree in the XML format of the syntax analyzer, where keyword constants
+    are keywords and the symbols < > & are escaped'''
+    def write_xml(self, file, root=0):
+        lines = []
+        stack = [(root, 0, False)]
+        while stack:
+            node, level, closing = stack.pop()
+            indent = " " * level * XML_INDENT_SIZE
+            kind = self.kinds[node]
+            if kind == TERMINAL:
+                token = self.token_index[node]
+                token_kind = self.tokens.kinds[token]
+                ttype = "keyword" if token_kind == KEYWORD_CONSTANT else TOKEN_TYPE_NAMES[token_kind]
+                content = self.tokens.content(token)
+                lines.append(indent + "<" + ttype + "> " + XML_ESCAPES.get(content, content) + " </" + ttype + ">\n")
+            elif closing:
+                lines.append(indent + "</" + NONTERMINALS[kind] + ">\n")
+            else:
+                lines.append(indent + "<" + NONTERMINALS[kind] + ">\n")
+                stack.append((node, level, True))
+                stack += [(child, level + 1, False) for child in reversed(self.children(node))]
+        file.write("".join(lines))
+
+
+class JackParser:
+    """Recursive-descent parser that builds the JackAST of one class from its TokenStream,
+    following the grammar of the syntax analyzer. Expressions are parsed without recursion."""
+
+    def __init__(self, tokens, filename=None):
+        self.tokens = tokens
+        self.filename = filename
+        self.classname = None
+        self.codes = tokens.codes
+        self.kinds = tokens.kinds
+        self.n_tokens = len(tokens)
+        self.pos = 0
+        self.ast = JackAST(tokens)
+
+    # parses the class and returns its tree, whose root is node 0.
+    # Like the compilation engines, it ignores whatever follows the end of the class.
+    def parse(self):
+        self.parse_class()
+        return self.ast
+
+    def next_content(self):
+        return self.tokens.content(self.pos) if self.pos < self.n_tokens else ""
+
+    def next_code(self):
+        return self.codes[self.pos] if self.pos < self.n_tokens else None
+
+    # error message when the next token is not the expected one, with the source line and a marker under the token
+    def error(self, expected):
+        line, column = self.tokens.position(self.pos)
+        text = self.tokens.line_index.line_text(line)
+        found = self.next_content() if self.pos < self.n_tokens else "end of file"
+        marker = "".join(c if c == "\t" else " " for c in text[:column - 1]) + "^"
+        return "while parsing class " + str(self.classname) + ", expected token " + expected + \
+            ", but found token " + found + " on line " + str(line) + ", column " + str(column) + ":\n" + \
+            text + "\n" + marker
+
+    # adds the next n tokens as terminals of parent
+    def terminals(self, parent, n=1):
+        for i in range(n):
+            if self.pos >= self.n_tokens:
+                raise ValueError(self.error("any token"))
+            self.ast.add(TERMINAL, parent, self.pos)
+            self.pos += 1
+
+    def eat(self, parent, text):
+        if self.next_code() != TEXT_CODE[text]:
+            raise ValueError(self.error(text))
+        self.terminals(parent)
+
+    def parse_class(self):
+        node = self.ast.add(CLASS, NO_NODE)
+        self.eat(node, "class")
+        self.classname = self.next_content()
+        self.terminals(node)                                # name
+        self.eat(node, "{")
+        while self.next_code() in (TEXT_CODE["static"], TEXT_CODE["field"]):
+            self.parse_class_var_dec(node)
+        while self.next_code() in SUBROUTINE_CODES:
+            self.parse_subroutine_dec(node)
+        self.eat(node, "}")
+
+    def parse_class_var_dec(self, parent):
+        node = self.ast.add(CLASS_VAR_DEC, parent)
+        self.terminals(node, 3)                             # static or field, type, name
+        while self.next_code() == TEXT_CODE[","]:
+            self.terminals(node, 2)
+        self.eat(node, ";")
+
+    def parse_subroutine_dec(self, parent):
+        node = self.ast.add(SUBROUTINE_DEC, parent)
+        self.terminals(node, 3)                             # kind, return type, name
+        self.eat(node, "(")
+        self.parse_parameter_list(node)
+        self.eat(node, ")")
+        body = self.ast.add(SUBROUTINE_BODY, node)
+        self.eat(body, "{")
+        while self.next_code() == TEXT_CODE["var"]:
+            self.parse_var_dec(body)
+        self.parse_statements(body)
+        self.eat(body, "}")
+
+    def parse_parameter_list(self, parent):
+        node = self.ast.add(PARAMETER_LIST, parent)
+        while self.next_code() != TEXT_CODE[")"]:
+            self.terminals(node, 2)                         # type and name
+            if self.next_code() != TEXT_CODE[")"]:
+                self.eat(node, ",")
+
+    def parse_var_dec(self, parent):
+        node = self.ast.add(VAR_DEC, parent)
+        self.terminals(node, 3)                             # var, type, name
+        while self.next_code() == TEXT_CODE[","]:
+            self.terminals(node, 2)
+        self.eat(node, ";")
+
+    def parse_statements(self, parent):
+        node = self.ast.add(STATEMENTS, parent)
+        while self.next_code() != TEXT_CODE["}"]:
+            kind = STATEMENT_KINDS.get(self.next_code())
+            if kind is None:
+                raise ValueError(self.error("let, if, while, do or return"))
+            statement = self.ast.add(kind, node)
+            if kind == LET_STATEMENT:
+                self.parse_let_statement(statement)
+            elif kind == IF_STATEMENT:
+                self.parse_if_statement(statement)
+            elif kind == WHILE_STATEMENT:
+                self.parse_while_statement(statement)
+            elif kind == DO_STATEMENT:
+                self.parse_do_statement(statement)
+            else:
+                self.parse_return_statement(statement)
+
+    def parse_let_statement(self, node):
+        self.terminals(node, 2)                             # let, name
+        if self.next_code() == TEXT_CODE["["]:
+            self.terminals(node)
+            self.parse_expression(node)
+            self.eat(node, "]")
+        self.eat(node, "=")
+        self.parse_expression(node)
+        self.eat(node, ";")
+
+    def parse_if_statement(self, node):
+        self.terminals(node)                                # if
+        self.eat(node, "(")
+        self.parse_expression(node)
+        self.eat(node, ")")
+        self.eat(node, "{")
+        self.parse_statements(node)
+        self.eat(node, "}")
+        if self.next_code() == TEXT_CODE["else"]:
+            self.terminals(node)
+            self.eat(node, "{")
+            self.parse_statements(node)
+            self.eat(node, "}")
+
+    def parse_while_statement(self, node):
+        self.terminals(node)                                # while
+        self.eat(node, "(")
+        self.parse_expression(node)
+        self.eat(node, ")")
+        self.eat(node, "{")
+        self.parse_statements(node)
+        self.eat(node, "}")
+
+    def parse_do_statement(self, node):
+        self.terminals(node, 2)                             # do, name
+        self.parse_rest_of_call(node)
+        self.eat(node, ";")
+
+    def parse_return_statement(self, node):
+        self.terminals(node)                                # return
+        if self.next_code() != TEXT_CODE[";"]:
+            self.parse_expression(node)
+        self.eat(node, ";")
+
+    # the part of a subroutine call after its first name: possibly .name, then (expressionList)
+    def parse_rest_of_call(self, node):
+        if self.next_code() == TEXT_CODE["."]:
+            self.terminals(node, 2)
+        self.eat(node, "(")
+        expressions = self.ast.add(EXPRESSION_LIST, node)
+        while self.next_code() != TEXT_CODE[")"]:
+            self.parse_expression(expressions)
+            if self.next_code() == TEXT_CODE[","]:
+                self.terminals(expressions)
+        self.eat(node, ")")
+
+    '''parse_expression adds the next expression to parent. Parenthesized subexpressions, unary operations
+    and array indexes nest without recursion, as in the compilation engine: the terms that wait for the
+    ) or ] that closes their expression are kept on an explicit stack. Only the arguments of calls recurse.'''
+    def parse_expression(self, parent):
+        stack = []                                          # (expression, term, closing symbol)
+        expression = self.ast.add(EXPRESSION, parent)
+        while True:
+            # opening part of a term: unary operators and the starts of (expression) and name[expression]
+            term = self.ast.add(TERM, expression)
+            while True:
+                if self.pos >= self.n_tokens:
+                    raise ValueError(self.error("a term"))
+                code = self.codes[self.pos]
+                kind = self.kinds[self.pos]
+                if kind in CONSTANT_KINDS:
+                    self.terminals(term)
+                    break
+                elif code in UNARY_OP_CODES:
+                    self.terminals(term)
+                    term = self.ast.add(TERM, term)
+                elif code == TEXT_CODE["("]:
+                    self.terminals(term)
+                    stack.append((expression, term, ")"))
+                    expression = self.ast.add(EXPRESSION, term)
+                    term = self.ast.add(TERM, expression)
+                elif kind == IDENTIFIER:
+                    self.terminals(term)
+                    code = self.next_code()
+                    if code == TEXT_CODE["["]:
+                        self.terminals(term)
+                        stack.append((expression, term, "]"))
+                        expression = self.ast.add(EXPRESSION, term)
+                        term = self.ast.add(TERM, expression)
+                    else:
+                        if code == TEXT_CODE["."] or code == TEXT_CODE["("]:
+                            self.parse_rest_of_call(term)
+                        break
+                else:
+                    raise ValueError(self.error("a term"))
+
+            # closing part: the expressions that end here are closed, up to one that goes on with an operator
+            while self.next_code() not in BINARY_OP_CODES:
+                if not stack:
+                    return
+                expression, term, closing = stack.pop()
+                self.eat(term, closing)
+            self.terminals(expression)                      # operator
+
+# tokenizes the class in the file filename, or in source if it is given, with the tokenizer engine of the given name
+# (jacktokenizer.TOKENIZERS) and parses it
+def parse_class(filename, source=None, tokenizer=DEFAULT_TOKENIZER):
+    tokens = TOKENIZERS[tokenizer](filename, source).stream
+    return JackParser(tokens, filename).parse()
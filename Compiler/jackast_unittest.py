@@ -0,0 +1,62 @@
+"""Checks of the parse tree (jackast.py):
+  the XML of the tree is the syntax analyzer's expected XML for its test programs,
+  both tokenizer engines give the same token stream,
+  a syntax error names the class, the line and the column and leaves an existing .vm file alone.
+Usage: python3 jackast_unittest.py"""
+from jackast import parse_class
+from jacktokenizer import TOKENIZERS
+from unittestsupport import check, finish, read, write, jack_files, program_dirs, run_compiler, COMPILER_DIR
+import glob
+import io
+import os
+import tempfile
+
+ANALYZER_DIR = os.path.join(os.path.dirname(COMPILER_DIR), "SyntaxAnalyzer")
+
+BROKEN_CLASS = """class Main {
+    function void main() {
+        var int x;
+        let x = ;
+        return;
+    }
+}"""
+
+
+def check_xml():
+    sources = sorted(glob.glob(os.path.join(ANALYZER_DIR, "*", "*.jack")))
+    check(sources, "no test programs in " + ANALYZER_DIR)
+    for fpath in sources:
+        xml = io.StringIO()
+        parse_class(fpath).write_xml(xml)
+        check(xml.getvalue() == read(fpath[:-5] + "-correct.xml"), "the XML of " + fpath + " differs")
+
+
+def check_tokenizers():
+    for directory in program_dirs():
+        for fpath in jack_files(directory):
+            streams = [TOKENIZERS[name](fpath).stream for name in sorted(TOKENIZERS)]
+            arrays = [(list(s.kinds), list(s.codes), list(s.starts), list(s.ends)) for s in streams]
+            check(all(a == arrays[0] for a in arrays), "the tokenizers give different tokens for " + fpath)
+
+
+def check_syntax_error(workdir):
+    write(os.path.join(workdir, "Main.jack"), BROKEN_CLASS)
+    write(os.path.join(workdir, "Main.vm"), "older output\n")
+    try:
+        parse_class("Main.jack", BROKEN_CLASS)
+        check(False, "a missing term is not a syntax error")
+    except ValueError as error:
+        check(str(error).startswith("while parsing class Main, expected token a term, but found token ; "
+                                    "on line 4, column 17:\n        let x = ;\n                ^"),
+              "wrong syntax error: " + str(error))
+    result = run_compiler([workdir])
+    check(result.returncode == 1, "a syntax error exits with " + str(result.returncode))
+    check(read(os.path.join(workdir, "Main.vm")) == "older output\n", "a syntax error overwrites the .vm file")
+
+
+if __name__ == "__main__":
+    check_xml()
+    check_tokenizers()
+    with tempfile.TemporaryDirectory() as workdir:
+        check_syntax_error(workdir)
+    finish()
@@ -1,17 +1,341 @@
-from compilationengine import CompilationEngine
-import sys
+from buildmanifest import BuildManifest, compiler_version
+from compileclient import CompileClient
+from compileoptions import CompileOptions
+from inlining import Inliner, DEFAULT_MAX_SIZE, DEFAULT_BUDGET
+from jackstream import read_units, write_unit, output_name
+from vmprogram import VMProgram
+from collections import Counter
+from functools import partial
+import argparse
 import os
+import sys
+import traceback
+
+# the compilation engine and the process pool are only imported when this process compiles by itself,
+# so that handing the files to a running compile server (compileserver.py) stays cheap
+
 
+STDIN_PATH = "-"                 # path argument that makes the compiler read classes from stdin
 
-def treatfile(fpath):
-    engine = CompilationEngine(fpath)
+# output format -> extension and description of the output files
+OUTPUT_EXTENSIONS = {"text": "vm", "binary": "vmb"}
+OUTPUT_NAMES = {"text": "VM file", "binary": "VM bytecode file"}
+
+
+def treatfile(fpath, options, output_format="text"):
+    from compilationengine import CompilationEngine
+    if output_format == "binary":
+        from vmbytecode import BytecodeSink
+        sink = BytecodeSink()
+        engine = CompilationEngine(fpath, options, outfile=sink)
+        engine.compile_class()
+        with open(outpath_of(fpath, output_format), 'wb') as file:
+            file.write(sink.getvalue())
+        return OUTPUT_NAMES[output_format] + " written for " + fpath, engine.statistics()
+    engine = CompilationEngine(fpath, options)
     engine.compile_class()
-    print("VM file written for " + fpath)
-
-thepath = sys.argv[1]
-if os.path.isfile(thepath):
-    treatfile(thepath)
-else:
-    for fpath in os.listdir(thepath + "/"):
-        if fpath[-5:] == ".jack":
-            treatfile("./" + thepath + "/" + fpath)
+    return "VM file written for " + fpath, engine.statistics()
+
+# treats one file with the shared front end (frontend.py), which parses it once for all the given outputs
+def treatfile_front_end(fpath, options, outputs):
+    from frontend import make_sinks, run_front_end
+    sinks = make_sinks(outputs, options)
+    stats = run_front_end(fpath, sinks, tokenizer=options.tokenizer)
+    written = [sink.output for sink in sinks if sink.output is not None]
+    if not written:
+        return "Checked " + fpath, stats
+    return " and ".join(written) + " files written for " + fpath, stats
+
+'''treatfile_safely treats one file and returns (message, error, statistics), so that an error in one file
+can be reported by the parent process without stopping the other files.
+Given outputs, the file goes through the shared front end instead of the compilation engine.'''
+def treatfile_safely(fpath, options, outputs=None, output_format="text"):
+    try:
+        if outputs is None:
+            message, stats = treatfile(fpath, options, output_format)
+        else:
+            message, stats = treatfile_front_end(fpath, options, outputs)
+        return message, None, stats
+    except Exception as e:
+        return None, error_message(fpath, e), None
+
+def error_message(fpath, e):
+    return "Error in " + fpath + ": " + "".join(traceback.format_exception_only(type(e), e)).strip()
+
+# same as treatfile_safely, but the compile server compiles and this process writes the output
+def treatfile_on_server(client, fpath, options, output_format="text"):
+    vm, error, stats = client.compile_file(fpath, options.as_dict())
+    if error is not None:
+        return None, "Error in " + fpath + ": " + error, None
+    write_output(fpath, vm, output_format)
+    return OUTPUT_NAMES[output_format] + " written for " + fpath + " by compile server", None, stats
+
+def treatfiles(fpaths, options, jobs, client, stats, output_format="text"):
+    if client is not None:
+        return report((treatfile_on_server(client, fpath, options, output_format) for fpath in fpaths), stats)
+    return report(map_files(partial(treatfile_safely, output_format=output_format), fpaths, options, jobs), stats)
+
+# writes the VM code vm of fpath to its output file, encoded in the given format
+def write_output(fpath, vm, output_format="text"):
+    if output_format == "binary":
+        from vmbytecode import encode
+        with open(outpath_of(fpath, output_format), 'wb') as file:
+            file.write(encode(vm))
+    else:
+        with open(outpath_of(fpath), 'w') as file:
+            file.write(vm)
+
+# runs treat(fpath, options) for all files, in parallel worker processes if jobs > 1
+def map_files(treat, fpaths, options, jobs):
+    if jobs > 1 and len(fpaths) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(jobs, len(fpaths))) as executor:
+            chunksize = max(1, len(fpaths) // (jobs * 4))
+            return list(executor.map(treat, fpaths, [options] * len(fpaths), chunksize=chunksize))
+    return [treat(fpath, options) for fpath in fpaths]
+
+# prints the per-file results in input order, adds their statistics to stats
+# and returns for each file whether it succeeded
+def report(results, stats):
+    succeeded = []
+    for message, error, file_stats in results:
+        if error is None:
+            print(message)
+            stats.update(file_stats)
+        else:
+            print(error, file=sys.stderr)
+        succeeded.append(error is None)
+    return succeeded
+
+def outpath_of(fpath, output_format="text"):
+    return fpath[:-4] + OUTPUT_EXTENSIONS[output_format]
+
+'''update_interfaces writes the interface file (jackinterface.py) of each of the given classes that has none,
+or whose source changed since it was written, so that compiling a class only reads the interface files of the
+classes it calls. A class that cannot be scanned loses its interface file; compiling it reports the error'''
+def update_interfaces(fpaths):
+    from jackinterface import interface_path, write_interface_file
+    for fpath in fpaths:
+        ipath = interface_path(fpath)
+        if os.path.exists(ipath) and os.stat(ipath).st_mtime_ns > os.stat(fpath).st_mtime_ns:
+            continue
+        try:
+            write_interface_file(fpath)
+        except ValueError:
+            if os.path.exists(ipath):
+                os.remove(ipath)
+
+'''build compiles the given files, skipping those whose output recorded in the build manifest
+of their directory is still current, and returns the number of failed files.
+With the interfaces option, an output is also out of date when an interface file that it was checked
+against has changed, so that the callers of a subroutine are checked again when its signature changes'''
+def build(fpaths, options, jobs, force, client, stats, output_format="text"):
+    from jackinterface import interface_dependencies
+    manifests = {}
+    for fpath in fpaths:
+        directory = os.path.dirname(fpath)
+        if directory not in manifests:
+            manifests[directory] = BuildManifest(directory, options.code_key())
+
+    todo = [fpath for fpath in fpaths
+            if force or not manifests[os.path.dirname(fpath)].is_current(fpath, outpath_of(fpath, output_format))]
+    n_skipped = len(fpaths) - len(todo)
+
+    succeeded = treatfiles(todo, options, jobs, client, stats, output_format)
+    for fpath, ok in zip(todo, succeeded):
+        manifest = manifests[os.path.dirname(fpath)]
+        if ok:
+            manifest.record(fpath, outpath_of(fpath, output_format),
+                            interface_dependencies(fpath) if options.interfaces else ())
+        else:
+            manifest.forget(fpath)
+    for manifest in manifests.values():
+        manifest.save()
+
+    if n_skipped > 0:
+        print(str(n_skipped) + " of " + str(len(fpaths)) + " files up to date, skipped")
+    return succeeded.count(False)
+
+# like treatfile_safely, but returns (VM text, error, statistics) instead of writing the VM file
+def compile_file_safely(fpath, options):
+    try:
+        from compilationengine import compile_to_vm
+        with open(fpath, 'r') as file:
+            source = file.read()
+        vm, stats = compile_to_vm(fpath, source, options)
+        return vm, None, stats
+    except Exception as e:
+        return None, error_message(fpath, e), None
+
+'''build_program compiles the files as one program: all classes are compiled first, then small subroutines
+are inlined if an inliner is given, and the subroutines that cannot be reached from Main.main are dropped
+before the VM files are written. A class that has no subroutines left gets no VM file.
+Since every output depends on all sources, the build manifest is not used. Returns the number of errors.'''
+def build_program(fpaths, options, jobs, client, stats, inliner=None, output_format="text"):
+    if client is not None:
+        results = [client.compile_file(fpath, options.as_dict()) for fpath in fpaths]
+        results = [(vm, None if error is None else "Error in " + fpath + ": " + error, file_stats)
+                   for fpath, (vm, error, file_stats) in zip(fpaths, results)]
+    else:
+        results = map_files(compile_file_safely, fpaths, options, jobs)
+    errors = [error for vm, error, file_stats in results if error is not None]
+    for error in errors:
+        print(error, file=sys.stderr)
+    if errors:
+        return len(errors)
+
+    program = VMProgram()
+    try:
+        for fpath, (vm, error, file_stats) in zip(fpaths, results):
+            program.add_class(os.path.basename(fpath)[:-5], vm)
+            stats.update(file_stats)
+        if inliner is not None:
+            stats.update(inliner.inline(program))
+        dropped = program.shake()
+    except ValueError as e:
+        print("Error in program " + os.path.dirname(fpaths[0]) + ": " + str(e), file=sys.stderr)
+        return 1
+
+    empty = program.empty_classes()
+    for fpath in fpaths:
+        classname = os.path.basename(fpath)[:-5]
+        if classname in empty:
+            # an output left from an earlier build would still be loaded with the program
+            if os.path.exists(outpath_of(fpath, output_format)):
+                os.remove(outpath_of(fpath, output_format))
+            continue
+        write_output(fpath, program.vm_text(classname), output_format)
+        print(OUTPUT_NAMES[output_format] + " written for " + fpath)
+    if dropped:
+        print("Dropped " + str(len(dropped)) + " subroutines that are never called: " + ", ".join(dropped))
+    if empty:
+        print("No " + OUTPUT_NAMES[output_format] + " written for the classes without called subroutines: " +
+              ", ".join(empty))
+    stats["tree shaking: subroutines dropped"] += len(dropped)
+    return 0
+
+'''compile_stream compiles the classes framed in the text stream instream (jackstream.py) one at a time,
+and writes the VM code of each to outstream as soon as it is compiled. Returns the number of failed classes.
+With the interfaces option, calls are checked against the classes read so far.'''
+def compile_stream(instream, outstream, options, stats):
+    from compilationengine import compile_to_vm
+    from jackinterface import interface_of
+    n_errors = 0
+    interfaces = {}
+    for name, source in read_units(instream):
+        try:
+            if options.interfaces:
+                interface = interface_of(name, source)
+                interfaces[interface.name] = interface
+            vm, file_stats = compile_to_vm(name, source, options, interfaces if options.interfaces else None)
+        except Exception as e:
+            print(error_message(name, e), file=sys.stderr)
+            n_errors += 1
+            continue
+        write_unit(outstream, output_name(name, "vm"), vm)
+        stats.update(file_stats)
+    return n_errors
+
+'''connect_to_server returns a client for a running compile server, or None if there is none.
+A server started before the compiler sources changed is not used, since its output would be stale.'''
+def connect_to_server():
+    client = CompileClient.connect()
+    if client is None:
+        return None
+    try:
+        version = client.version()
+    except (OSError, ValueError):         # the server went away, for example while stopping
+        client.close()
+        return None
+    if version != compiler_version():
+        print("Compile server runs an outdated compiler version, compiling locally", file=sys.stderr)
+        client.close()
+        return None
+    return client
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a .jack file, or all .jack files in a directory, to VM code.")
+    parser.add_argument("path", help=".jack file or directory containing .jack files, or " + STDIN_PATH +
+                                     " to read classes from stdin and write their VM code to stdout, " +
+                                     "framed as described in jackstream.py")
+    CompileOptions.add_arguments(parser)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of files to compile in parallel worker processes (default: number of cores)")
+    parser.add_argument("--force", action="store_true",
+                        help="recompile all files, even those that are up to date according to the build manifest")
+    parser.add_argument("--no-server", action="store_true",
+                        help="compile in this process even if a compile server (compileserver.py) is running")
+    parser.add_argument("--whole-program", action="store_true",
+                        help="compile the files as one program and drop the subroutines that are never called " +
+                             "from Main.main")
+    parser.add_argument("--inline", action="store_true",
+                        help="inline calls of small subroutines without loops, such as accessors " +
+                             "(implies --whole-program)")
+    parser.add_argument("--inline-size", type=int, default=DEFAULT_MAX_SIZE,
+                        help="largest subroutine to inline, in VM commands (default: " + str(DEFAULT_MAX_SIZE) + ")")
+    parser.add_argument("--inline-budget", type=int, default=DEFAULT_BUDGET,
+                        help="maximal number of VM commands that inlining may add to the program (default: " +
+                             str(DEFAULT_BUDGET) + ")")
+    parser.add_argument("--emit",
+                        help="comma-separated outputs of a single parse of each file: vm, xml (the syntax " +
+                             "analyzer's parse tree) or none (only check the syntax); " +
+                             "files are then always rebuilt (default: vm, through the compilation engine)")
+    parser.add_argument("--format", choices=sorted(OUTPUT_EXTENSIONS), default="text",
+                        help="write text .vm files, or binary .vmb files (vmbytecode.py) (default: text)")
+    parser.add_argument("--stats", action="store_true",
+                        help="report how often each optimization was applied")
+    args = parser.parse_args()
+    options = CompileOptions.from_args(args)
+    outputs = None
+    if args.emit is not None:
+        from frontend import SINKS
+        outputs = args.emit.split(",")
+        if not all(output in SINKS for output in outputs):
+            parser.error("--emit takes a comma-separated list of " + ", ".join(SINKS))
+        if args.whole_program or args.inline:
+            parser.error("--emit cannot be combined with --whole-program or --inline")
+        if args.format != "text":
+            parser.error("--emit only writes text .vm files")
+
+    if args.path == STDIN_PATH:
+        if outputs is not None or args.whole_program or args.inline or args.format != "text":
+            parser.error("reading from stdin only writes VM text, one class at a time")
+        stats = Counter()
+        n_errors = compile_stream(sys.stdin, sys.stdout, options, stats)
+        if args.stats:
+            for name, count in sorted(stats.items()):
+                print(f"{count:8} {name}", file=sys.stderr)
+        sys.exit(1 if n_errors > 0 else 0)
+
+    thepath = args.path
+    if os.path.isfile(thepath):
+        fpaths = [thepath]
+    else:
+        fpaths = [os.path.join(thepath, fpath) for fpath in os.listdir(thepath) if fpath[-5:] == ".jack"]
+
+    if options.interfaces:
+        update_interfaces(fpaths)
+    # only the builds compile on the server; --emit runs the front end in this process
+    client = None if args.no_server or outputs is not None else connect_to_server()
+    stats = Counter()
+    if outputs is not None:
+        n_errors = report(map_files(partial(treatfile_safely, outputs=outputs), fpaths, options, args.jobs),
+                          stats).count(False)
+    elif args.whole_program or args.inline:
+        inliner = None
+        if args.inline:
+            from peephole import PeepholeOptimizer
+            inliner = Inliner(args.inline_size, args.inline_budget, PeepholeOptimizer() if options.peephole else None)
+        n_errors = build_program(fpaths, options, args.jobs, client, stats, inliner, args.format)
+    else:
+        n_errors = build(fpaths, options, args.jobs, args.force, client, stats, args.format)
+    if client is not None:
+        client.close()
+    if args.stats:
+        for name, count in sorted(stats.items()):
+            print(f"{count:8} {name}")
+    if n_errors > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
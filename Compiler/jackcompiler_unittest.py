@@ -0,0 +1,126 @@
+"""Regression checks of the compiler over the programs in tests/, for the default options and each optimization:
+  the default output is the committed .vm file of every class,
+  compiling from stdin (-) gives the same VM code as compiling the files, one unit per class in their order,
+  calls are resolved from stdin as from files, and an error in one class from stdin goes to stderr while the
+  others are still compiled.
+Usage: python3 jackcompiler_unittest.py  prints the failed checks, and exits with 1 if there are any."""
+from compilationengine import compile_to_vm
+from compileoptions import CompileOptions
+from jackstream import HEADER_PREFIX, read_units
+from unittestsupport import check, finish, read, jack_files, program_dirs, option_sets, flag_arguments, run_compiler
+import io
+import os
+import shutil
+import tempfile
+
+# a class whose calls depend on how a.b() is resolved, compiled from stdin and as a file like the tests
+CALLS_CLASS = """class Main {
+    field Array Cells;
+    function void main() {
+        var Array A, b;
+        let A = Array.new(2);
+        let b = Array.new(2);
+        do A.dispose();
+        do b.dispose();
+        return;
+    }
+    method void clear() {
+        do Cells.dispose();
+        return;
+    }
+}"""
+
+
+def check_default_output():
+    for directory in program_dirs():
+        for fpath in jack_files(directory):
+            vm, stats = compile_to_vm(fpath, read(fpath))
+            check(vm == read(fpath[:-4] + "vm"), "default output differs from " + fpath[:-4] + "vm")
+
+
+# the framed stream of the given units (name, source), as jackcompiler.py - reads it
+def stream_of(units):
+    return "".join(HEADER_PREFIX + name + "\n" + source + "\n" for name, source in units)
+
+
+# compiles a copy of directory as files and from stdin: the outputs come in the order of the classes and
+# equal the file output, and the committed .vm files for the default options
+def check_stdin(name, options, directory, workdir):
+    copy = os.path.join(workdir, "copy-" + os.path.basename(directory))
+    shutil.rmtree(copy, ignore_errors=True)
+    os.mkdir(copy)
+    for fpath in jack_files(directory):
+        shutil.copy(fpath, copy)
+    result = run_compiler(flag_arguments(options) + [copy])
+    check(result.returncode == 0, name + ": compiling " + directory + " fails: " + result.stdout)
+    stream = stream_of((os.path.basename(fpath), read(fpath)) for fpath in jack_files(directory))
+    result = run_compiler(flag_arguments(options) + ["-"], stream)
+    check(result.returncode == 0 and result.stderr == "", name + ": compiling " + directory + " from stdin fails: " +
+          result.stderr)
+    units = list(read_units(io.StringIO(result.stdout)))
+    vmnames = [os.path.basename(fpath)[:-4] + "vm" for fpath in jack_files(directory)]
+    check([vmname for vmname, vm in units] == vmnames,
+          name + ": stdin output of " + directory + " has the units " + ", ".join(vmname for vmname, vm in units))
+    outputs = dict(units)
+    for fpath in jack_files(copy):
+        vmname = os.path.basename(fpath)[:-4] + "vm"
+        check(outputs.get(vmname) == read(fpath[:-4] + "vm"),
+              name + ": stdin output of " + vmname + " in " + directory + " differs from the file output")
+        committed = os.path.join(directory, vmname)
+        if name == "default" and os.path.exists(committed):
+            check(outputs.get(vmname) == read(committed), "stdin output of " + vmname + " in " + directory +
+                  " differs from the committed file")
+
+
+# A.dispose() calls a function of class A unless interfaces show that A is a variable, from stdin as from files
+def check_calls():
+    for options, expected in ((CompileOptions(), ["call A.dispose 0", "push local 1; call Array.dispose 1",
+                                                  "call Cells.dispose 0"]),
+                              (CompileOptions(interfaces=True), ["push local 0; call Array.dispose 1",
+                                                                 "push local 1; call Array.dispose 1",
+                                                                 "push this 0; call Array.dispose 1"])):
+        result = run_compiler(flag_arguments(options) + ["-"], stream_of([("Main.jack", CALLS_CLASS)]))
+        lines = dict(read_units(io.StringIO(result.stdout))).get("Main.vm", "").splitlines()
+        # each dispose call, with the push of its object if it has one
+        calls = [(lines[i - 1] + "; " if lines[i].endswith(" 1") else "") + lines[i]
+                 for i in range(len(lines)) if ".dispose" in lines[i]]
+        check(calls == expected, " ".join(["-"] + flag_arguments(options)) + ": the calls class calls " +
+              ", ".join(calls))
+
+
+# an error in one class is reported on stderr, the other classes are still compiled, and the exit status is 1
+def check_stdin_errors():
+    good = "class Good { function int f() { return 1; } }"
+    units = [("First.jack", good.replace("Good", "First")), ("Broken.jack", "class Broken { function }"),
+             ("Last.jack", good.replace("Good", "Last"))]
+    result = run_compiler(["-"], stream_of(units))
+    check(result.returncode == 1, "a broken class from stdin exits with " + str(result.returncode))
+    errors = result.stderr.splitlines()
+    check(len(errors) >= 1 and errors[0].startswith("Error in Broken.jack: ValueError: while parsing class Broken"),
+          "wrong error for a broken class from stdin: " + result.stderr)
+    outputs = list(read_units(io.StringIO(result.stdout)))
+    expected = [(name[:-4] + "vm", compile_to_vm(name, source)[0]) for name, source in units if name != "Broken.jack"]
+    check(outputs == expected, "the classes around a broken one from stdin give " + str(outputs))
+    # a source without a header is Main.jack, a unit may end without a newline, and no input gives no output
+    result = run_compiler(["-"], "class Main { function void main() { return; } }\n" + HEADER_PREFIX + "Last.jack\n" +
+                          good.replace("Good", "Last"))
+    check(result.returncode == 0 and [name for name, vm in read_units(io.StringIO(result.stdout))] ==
+          ["Main.vm", "Last.vm"], "wrong units for a stream without a first header: " + result.stdout)
+    result = run_compiler(["-"], "")
+    check(result.returncode == 0 and result.stdout == "" and result.stderr == "",
+          "empty input from stdin gives " + result.stdout + result.stderr)
+
+
+if __name__ == "__main__":
+    check_default_output()
+    with tempfile.TemporaryDirectory() as workdir:
+        calls_dir = os.path.join(workdir, "Calls")
+        os.mkdir(calls_dir)
+        with open(os.path.join(calls_dir, "Main.jack"), 'w') as file:
+            file.write(CALLS_CLASS)
+        for name, options in option_sets():
+            for directory in program_dirs() + [calls_dir]:
+                check_stdin(name, options, directory, workdir)
+    check_calls()
+    check_stdin_errors()
+    finish()
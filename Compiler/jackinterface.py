@@ -0,0 +1,175 @@
+"""Class interface files (.jif): the fields, statics and subroutine signatures of a class, without its code.
+
+With the interfaces option, jackcompiler.py writes the interface file of every class next to its source
+before compiling, and the compilation engine checks the calls of subroutines of other classes against
+their interfaces. Only the interface files of the called classes are read, never their sources.
+An interface is found from its declarations alone: the bodies of the subroutines are skipped by
+matching braces, without parsing them. The file has one line per declaration:
+    class Ship
+    field int x
+    static Array sprites
+    constructor Ship new int int
+    method void moveTo int int
+with the kind, type and name of each variable, and the kind, return type, name and parameter types
+of each subroutine."""
+from jacktoken import TEXT_CODE, NO_TEXT_CODE, IDENTIFIER
+from jacktokenizer import RegexJackTokenizer
+import os
+
+INTERFACE_EXTENSION = "jif"
+VARIABLE_KINDS = ("static", "field")
+SUBROUTINE_KINDS = ("constructor", "function", "method")
+
+
+class ClassInterface:
+    """The declarations of a class: variables is a list of (kind, type, name), and subroutines maps
+    each subroutine name to (kind, return type, list of parameter types)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.variables = []
+        self.subroutines = {}
+
+    def write(self, file):
+        lines = ["class " + self.name]
+        lines += [" ".join(variable) for variable in self.variables]
+        lines += [" ".join([kind, rettype, sname] + params)
+                  for sname, (kind, rettype, params) in self.subroutines.items()]
+        file.write("".join(line + "\n" for line in lines))
+
+    @classmethod
+    def read(cls, file):
+        lines = [line.split() for line in file.read().splitlines() if line.strip() != ""]
+        if not lines or len(lines[0]) != 2 or lines[0][0] != "class":
+            raise ValueError("Not a class interface file")
+        interface = cls(lines[0][1])
+        for words in lines[1:]:
+            if words[0] in VARIABLE_KINDS and len(words) == 3:
+                interface.variables.append(tuple(words))
+            elif words[0] in SUBROUTINE_KINDS and len(words) >= 3:
+                interface.subroutines[words[2]] = (words[0], words[1], words[3:])
+            else:
+                raise ValueError("Unknown declaration in class interface file: " + " ".join(words))
+        return interface
+
+
+class InterfaceScanner:
+    """Finds the interface of a class in its TokenStream, skipping the subroutine bodies."""
+
+    def __init__(self, tokens, filename=None):
+        self.tokens = tokens
+        self.filename = filename
+        self.pos = 0
+
+    def next_code(self):
+        return self.tokens.codes[self.pos] if self.pos < len(self.tokens) else NO_TEXT_CODE
+
+    def error(self, expected):
+        line, column = self.tokens.position(self.pos)
+        found = self.tokens.content(self.pos) if self.pos < len(self.tokens) else "end of file"
+        where = "" if self.filename is None else " in " + self.filename
+        return "expected token " + expected + ", but found token " + found + \
+            " on line " + str(line) + ", column " + str(column) + where
+
+    def eat(self, text):
+        if self.next_code() != TEXT_CODE[text]:
+            raise ValueError(self.error(text))
+        self.pos += 1
+
+    # the text of the next token, which can be any token
+    def word(self):
+        if self.pos >= len(self.tokens):
+            raise ValueError(self.error("any token"))
+        self.pos += 1
+        return self.tokens.content(self.pos - 1)
+
+    def scan(self):
+        self.eat("class")
+        interface = ClassInterface(self.word())
+        self.eat("{")
+        while self.next_code() in (TEXT_CODE["static"], TEXT_CODE["field"]):
+            skind, stype = self.word(), self.word()
+            interface.variables.append((skind, stype, self.word()))
+            while self.next_code() == TEXT_CODE[","]:
+                self.eat(",")
+                interface.variables.append((skind, stype, self.word()))
+            self.eat(";")
+        while self.next_code() in (TEXT_CODE[kind] for kind in SUBROUTINE_KINDS):
+            skind, rettype, sname = self.word(), self.word(), self.word()
+            self.eat("(")
+            params = []
+            while self.next_code() != TEXT_CODE[")"]:
+                params.append(self.word())          # type
+                self.word()                         # name
+                if self.next_code() != TEXT_CODE[")"]:
+                    self.eat(",")
+            self.eat(")")
+            interface.subroutines[sname] = (skind, rettype, params)
+            self.skip_body()
+        self.eat("}")
+        return interface
+
+    def skip_body(self):
+        self.eat("{")
+        depth = 1
+        while depth > 0:
+            code = self.next_code()
+            if self.pos >= len(self.tokens):
+                raise ValueError(self.error("}"))
+            if code == TEXT_CODE["{"]:
+                depth += 1
+            elif code == TEXT_CODE["}"]:
+                depth -= 1
+            self.pos += 1
+
+
+# the interface of the class in the file filename, or in source if it is given
+def interface_of(filename, source=None):
+    return InterfaceScanner(RegexJackTokenizer(filename, source).stream, filename).scan()
+
+def interface_path(fpath):
+    return fpath[:-4] + INTERFACE_EXTENSION
+
+'''referenced_classes returns the names of the classes whose interfaces compiling the class in the TokenStream
+tokens may read: its own, those named before a dot (Name.f or object.f) and the types of its variables and
+parameters, the only places where an identifier is followed by another one'''
+def referenced_classes(tokens):
+    names = set()
+    if len(tokens) > 1 and tokens.kinds[1] == IDENTIFIER:
+        names.add(tokens.content(1))
+    for i in range(len(tokens) - 1):
+        if tokens.kinds[i] == IDENTIFIER and \
+                (tokens.codes[i + 1] == TEXT_CODE["."] or tokens.kinds[i + 1] == IDENTIFIER):
+            names.add(tokens.content(i))
+    return sorted(names)
+
+# the paths of the interface files, present or not, that compiling the class in the file fpath may read
+def interface_dependencies(fpath):
+    directory = os.path.dirname(fpath)
+    return [os.path.join(directory, name + "." + INTERFACE_EXTENSION)
+            for name in referenced_classes(RegexJackTokenizer(fpath).stream)]
+
+# writes the interface file of the class in the file fpath next to it
+def write_interface_file(fpath):
+    interface = interface_of(fpath)
+    with open(interface_path(fpath), 'w') as file:
+        interface.write(file)
+
+
+class InterfaceLoader:
+    """The interfaces of the classes in a directory, read from their interface files when first asked for.
+    get returns None for classes without an interface file, such as those of the operating system."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.interfaces = {}
+
+    def get(self, classname):
+        if classname not in self.interfaces:
+            ipath = os.path.join(self.directory, classname + "." + INTERFACE_EXTENSION)
+            interface = None
+            if os.path.exists(ipath):
+                with open(ipath, 'r') as file:
+                    interface = ClassInterface.read(file)
+            self.interfaces[classname] = interface
+        return self.interfaces[classname]
@@ -0,0 +1,125 @@
+"""Checks of the class interface files (jackinterface.py) and of the calls checked against them (--interfaces):
+  the interface of a class lists its declarations and survives a round trip through a .jif file,
+  malformed .jif files are errors, and so are calls of subroutines that do not exist, with the wrong number of
+  arguments, of methods without an object and of functions on an object,
+  and the classes that compiling a class may read the interfaces of are found from its tokens.
+Usage: python3 jackinterface_unittest.py"""
+from compilationengine import compile_to_vm
+from compileoptions import CompileOptions
+from jackinterface import ClassInterface, interface_of, referenced_classes
+from jacktokenizer import RegexJackTokenizer
+from unittestsupport import check, finish, read, write, jack_files, program_dirs, run_compiler
+import io
+import os
+import tempfile
+
+POINT_CLASS = """class Point {
+    field int x, y;
+    static Array cache;
+    constructor Point new(int ax, int ay) {
+        let x = ax;
+        if (ax > 0) { let y = ay; }
+        return this;
+    }
+    method int getX() { return x; }
+    function int origins(Point p, boolean all) { return 0; }
+}"""
+POINT_INTERFACE = """class Point
+field int x
+field int y
+static Array cache
+constructor Point new int int
+method int getX
+function int origins Point boolean
+"""
+MALFORMED_INTERFACES = {"empty": "", "no class line": "method int getX\n", "two class names": "class Point Line\n",
+                        "unknown declaration": "class Point\nvar int x\n", "short field": "class Point\nfield int\n"}
+# calls in the subroutine Main.main of a class, and the error each gives with the interface of Point
+WRONG_CALLS = {"let a = Point.getY(p);": "class Point has no subroutine getY",
+               "let p = Point.new(1);": "Point.new takes 2 arguments, but is called with 1",
+               "let a = Point.getX();": "Point.getX is a method, but is called without an object",
+               "let a = p.origins(p, true);": "Point.origins is a function, but is called as a method",
+               "do Main.helper(1);": "Main.helper takes 0 arguments, but is called with 1"}
+RIGHT_CALLS = "let p = Point.new(1, 2); let a = p.getX(); let a = Point.origins(p, false); do helper();"
+
+
+# a class Main whose function main makes the given calls
+def main_class(calls):
+    return """class Main {
+    function void main() {
+        var Point p;
+        var int a;
+        %s
+        return;
+    }
+    function void helper() {
+        return;
+    }
+}""" % calls
+
+
+def check_interface():
+    interface = interface_of("Point.jack", POINT_CLASS)
+    text = io.StringIO()
+    interface.write(text)
+    check(text.getvalue() == POINT_INTERFACE, "the interface of Point is\n" + text.getvalue())
+    for directory in program_dirs():
+        for fpath in jack_files(directory):
+            interface = interface_of(fpath)
+            text = io.StringIO()
+            interface.write(text)
+            copy = ClassInterface.read(io.StringIO(text.getvalue()))
+            check((copy.name, copy.variables, copy.subroutines) ==
+                  (interface.name, interface.variables, interface.subroutines),
+                  "the interface of " + fpath + " changes in a round trip")
+    for name, text in MALFORMED_INTERFACES.items():
+        try:
+            ClassInterface.read(io.StringIO(text))
+            check(False, "a .jif file with " + name + " is read")
+        except ValueError:
+            pass
+
+
+def check_calls():
+    interfaces = {"Point": interface_of("Point.jack", POINT_CLASS)}
+    interfaces["Main"] = interface_of("Main.jack", main_class(""))
+    options = CompileOptions(interfaces=True)
+    vm, stats = compile_to_vm("Main.jack", main_class(RIGHT_CALLS), options, interfaces)
+    check(stats["interfaces: calls checked"] == 4, "the right calls are checked " +
+          str(stats["interfaces: calls checked"]) + " times")
+    # an unqualified call of a function of the same class passes no this
+    check("call Main.helper 0" in vm and "call Point.getX 1" in vm, "the right calls compile to\n" + vm)
+    for call, message in WRONG_CALLS.items():
+        try:
+            compile_to_vm("Main.jack", main_class(call), options, interfaces)
+            check(False, call + " compiles")
+        except ValueError as error:
+            check(str(error) == "while writing class Main, on line 5: " + message, call + " gives " + str(error))
+
+
+# a broken .jif file of a called class is an error of the calling class, and the other classes still compile
+def check_malformed_file(workdir):
+    write(os.path.join(workdir, "Main.jack"), main_class("let p = Point.new(1, 2);"))
+    write(os.path.join(workdir, "Other.jack"), "class Other { function void f() { return; } }")
+    write(os.path.join(workdir, "Point.jif"), "class Point\nvar int x\n")
+    result = run_compiler(["--interfaces", workdir])
+    check(result.returncode == 1 and "Error in " + os.path.join(workdir, "Main.jack") + ": ValueError: Unknown "
+          "declaration in class interface file: var int x" in result.stdout + result.stderr and
+          os.path.exists(os.path.join(workdir, "Other.vm")), "a malformed Point.jif gives\n" + result.stdout)
+    check(read(os.path.join(workdir, "Other.jif")) == "class Other\nfunction void f\n",
+          "--interfaces writes another Other.jif")
+
+
+def check_referenced_classes():
+    source = main_class("let p = Point.new(1, 2); do Output.printInt(p.getX()); do helper();")
+    check(referenced_classes(RegexJackTokenizer("Main.jack", source).stream) == ["Main", "Output", "Point", "p"],
+          "wrong referenced classes")
+
+
+if __name__ == "__main__":
+    check_interface()
+    check_calls()
+    with tempfile.TemporaryDirectory() as workdir:
+        check_malformed_file(workdir)
+    check_referenced_classes()
+    finish()
@@ -0,0 +1,43 @@
+"""Framing of several compilation units in one text stream, so that the compiler can work in a pipeline,
+reading Jack classes from stdin and writing their outputs to stdout.
+
+Every unit starts with a header line  //@ NAME  and consists of the lines up to the next header,
+so a header must start a line of its own even if the unit before it does not end with a newline.
+In a Jack source and in VM code, the header is a comment. For example, the shell loop
+    for f in *.jack; do echo "//@ $f"; cat "$f"; echo; done | python3 jackcompiler.py -
+compiles all classes of a directory, and writes each class's VM code as a unit named Class.vm.
+Text before the first header that is not just whitespace is a unit named DEFAULT_NAME.
+
+The units are read one at a time, so a pipeline only holds one class in memory."""
+
+HEADER_PREFIX = "//@ "
+DEFAULT_NAME = "Main.jack"
+
+
+# yields (name, text) for each unit of the stream, reading the stream up to the end of the unit
+def read_units(stream):
+    name = None
+    lines = []
+    for line in stream:
+        if line.startswith(HEADER_PREFIX):
+            if name is not None or "".join(lines).strip() != "":
+                yield (name if name is not None else DEFAULT_NAME), "".join(lines)
+            name = line[len(HEADER_PREFIX):].strip()
+            lines = []
+        else:
+            lines.append(line)
+    if name is not None or "".join(lines).strip() != "":
+        yield (name if name is not None else DEFAULT_NAME), "".join(lines)
+
+# writes one unit to the stream and flushes it, so that the next stage of a pipeline gets it at once
+def write_unit(stream, name, text):
+    stream.write(HEADER_PREFIX + name + "\n")
+    stream.write(text)
+    if text != "" and not text.endswith("\n"):
+        stream.write("\n")
+    stream.flush()
+
+# name of the output unit with the given extension for the input unit name, such as Main.vm for Main.jack
+def output_name(name, extension):
+    base = name[:-len(".jack")] if name.endswith(".jack") else name
+    return base + "." + extension
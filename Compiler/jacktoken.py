@@ -1,3 +1,6 @@
+from array import array
+from bisect import bisect_right
+
 JACK_KEYWORDS = ["class", "method", "function", "constructor", 
                  "int", "boolean", "char", "void", "var", "static",
                  "field", "let", "do", "if", "else", "while",
@@ -5,9 +8,22 @@ JACK_KEYWORDS = ["class", "method", "function", "constructor",
 
 JACK_KEYWORD_CONSTANTS = ["true", "false", "null", "this"]
 
+# small integer codes for the token kinds stored in a TokenStream
+KEYWORD, SYMBOL, INTEGER_CONSTANT, STRING_CONSTANT, KEYWORD_CONSTANT, IDENTIFIER = range(6)
+TOKEN_TYPE_NAMES = ("keyword", "symbol", "integerConstant", "stringConstant", "keywordConstant", "identifier")
+CONSTANT_KINDS = (INTEGER_CONSTANT, STRING_CONSTANT, KEYWORD_CONSTANT)
+
+# keyword and symbol texts are interned: a token stores the index of its text in INTERNED_TEXTS
+INTERNED_TEXTS = tuple(JACK_KEYWORDS) + tuple("{}()[].,;+-*/&|<>=~")
+TEXT_CODE = {text: code for code, text in enumerate(INTERNED_TEXTS)}
+NO_TEXT_CODE = 255                # identifiers and constants, whose text is sliced from the source
+
+# keyword classification by dictionary lookup instead of scanning JACK_KEYWORDS
+KEYWORD_KIND = {word: KEYWORD_CONSTANT if word in JACK_KEYWORD_CONSTANTS else KEYWORD
+                for word in JACK_KEYWORDS}
+
 class Token:
-    token_type = None
-    content = None
+    __slots__ = ("token_type", "content")
 
     def __init__(self, token_type, content):
         self.token_type = token_type
@@ -15,11 +31,8 @@ class Token:
     
     @classmethod
     def from_content(cls, content):
-        if content in JACK_KEYWORDS:
-            if content in JACK_KEYWORD_CONSTANTS:
-                token_type = "keywordConstant"
-            else:
-                token_type = "keyword"
+        if content in KEYWORD_KIND:
+            token_type = TOKEN_TYPE_NAMES[KEYWORD_KIND[content]]
         elif content[0].isdigit():
             token_type = "integerConstant"
         else:
@@ -28,3 +41,72 @@ class Token:
     
     def is_constant(self):
         return self.token_type in ["integerConstant", "stringConstant", "keywordConstant"]
+
+
+class LineIndex:
+    """Offsets of the line starts in a source buffer, used to turn any source offset
+    into a (line, column) pair by binary search, without keeping copies of the input."""
+    __slots__ = ("source", "line_starts")
+
+    def __init__(self, source):
+        self.source = source
+        self.line_starts = array("I", [0])
+        newline = source.find("\n")
+        while newline != -1:
+            self.line_starts.append(newline + 1)
+            newline = source.find("\n", newline + 1)
+
+    # 1-based line and column of the character at the given offset
+    def position(self, offset):
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    # text of the given 1-based line, without its line ending
+    def line_text(self, line):
+        start = self.line_starts[line - 1]
+        end = self.line_starts[line] - 1 if line < len(self.line_starts) else len(self.source)
+        return self.source[start:end].rstrip("\r")
+
+
+class TokenStream:
+    """Columnar store for all tokens of one source buffer.
+    Token i is described by the i-th entry of parallel arrays: its kind code, the code of its
+    interned text (keywords and symbols only) and its start and end offset in the source.
+    The text of identifiers and constants is only sliced from the source when content(i) is called,
+    and line and column numbers are only computed from the line index when position(i) is called."""
+    __slots__ = ("source", "kinds", "codes", "starts", "ends", "line_index")
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array("B")
+        self.codes = array("B")
+        self.starts = array("I")          # 32-bit offsets: "L" would take 8 bytes per token on 64-bit Linux
+        self.ends = array("I")
+        self.line_index = LineIndex(source)
+
+    def append(self, kind, code, start, end):
+        self.kinds.append(kind)
+        self.codes.append(code)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def content(self, i):
+        code = self.codes[i]
+        if code != NO_TEXT_CODE:
+            return INTERNED_TEXTS[code]
+        return self.source[self.starts[i]:self.ends[i]]
+
+    def token_type(self, i):
+        return TOKEN_TYPE_NAMES[self.kinds[i]]
+
+    # line and column of token i, or of the end of the source if i is past the last token
+    def position(self, i):
+        offset = self.starts[i] if i < len(self.kinds) else len(self.source)
+        return self.line_index.position(offset)
+
+    # materializes token i as a Token object
+    def token(self, i):
+        return Token(self.token_type(i), self.content(i))
@@ -1,9 +1,23 @@
+import io
 import os
-from jacktoken import Token
+import re
+from jacktoken import Token, TokenStream, KEYWORD_KIND, TEXT_CODE, NO_TEXT_CODE, TOKEN_TYPE_NAMES, \
+    SYMBOL, INTEGER_CONSTANT, STRING_CONSTANT, IDENTIFIER
 
 JACK_SYMBOLS = "\{\}()\[\].,;+-*/&|<>=~"
 JACK_WHITE = " \n\t"
 
+# master regular expression used by RegexJackTokenizer:
+# at every position we either skip a run of whitespace and comments, or match exactly one token.
+# an opening /* or " that is never closed is caught by the "unclosed" alternative.
+JACK_TOKEN_RE = re.compile(r"""
+      (?P<skip>(?:\s+|//[^\n]*|/\*.*?\*/)+)
+    | "(?P<stringConstant>[^"]*)"
+    | (?P<unclosed>/\*|")
+    | (?P<symbol>[{}()\[\].,;+\-*/&|<>=~])
+    | (?P<word>[^\s{}()\[\].,;+\-*/&|<>=~"]+)
+    """, re.VERBOSE | re.DOTALL)
+
 class JackTokenizer:
 
 
@@ -14,7 +28,7 @@ class JackTokenizer:
         while True:
             char = self.file.read(1)
             if char == '':  # reached EOF while seeking end
-                print(f"Parsing error: end of file reached while parsing multiline comment started on line {current_comment_start_line}")
+                raise ValueError(self.end_of_file_error("multiline comment", self.current_comment_start_line))
             if char == '\n': 
                 self.current_line += 1
                 continue
@@ -33,7 +47,6 @@ class JackTokenizer:
             if c == '':
                 return None
             if c == ' ' or c == '\t':
-                self.linebuffer += c
                 continue
             elif c == '\n':
                 self.current_line += 1
@@ -50,15 +63,8 @@ class JackTokenizer:
                     self.file.seek(lastpos)
                     return '/'
             else:
-                self.linebuffer += c
                 return c
 
-
-    def getline(self):
-        buf = self.linebuffer
-        self.linebuffer = ""
-        return buf
-
     # main auxiliary method find_next_token:
     # sets the self.next_token field to a new Token read from self.file
     def find_next_token(self):
@@ -73,13 +79,17 @@ class JackTokenizer:
         if firstchar == None:           # reached EOF
             return
         
+        # offsets of the token in the source: the text of a string constant starts after its quote
+        self.next_start = self.file.tell() - (firstchar != "\"")
         if firstchar in JACK_SYMBOLS:   # return immediately if found a symbol
             self.next_token = Token("symbol", firstchar)
+            self.next_end = self.next_start + 1
             return
         
         new_token_content = ""
 
         is_string = firstchar == "\""    # if we start with quote, we enter string constant
+        string_start_line = self.current_line
 
         if not is_string:                # if we're not in a string, then the first char is part of token
             new_token_content += firstchar
@@ -94,48 +104,53 @@ class JackTokenizer:
                 self.current_line += 1
             
             if is_string: # if we are in a string, continue reading unless we see the closing "
-                self.linebuffer += char
+                if char == '':
+                    raise ValueError(self.end_of_file_error("string constant", string_start_line))
                 if char == "\"":
                     self.next_token = Token("stringConstant", new_token_content)
+                    self.next_end = lastpos
                     break
                 else:
                     new_token_content += char
                 
             else: # if we are not in a string
-                if char in JACK_SYMBOLS or char in JACK_WHITE or char == "\"": # any symbol, whitespace, or " means the new token has ended
+                if char == '' or char in JACK_SYMBOLS or char in JACK_WHITE or char == "\"": # any symbol, whitespace, ", or the end of the file means the new token has ended
                     self.file.seek(lastpos)
                     self.next_token = Token.from_content(new_token_content)
+                    self.next_end = lastpos
                     break
                 else: # any other character should simply be added
-                    self.linebuffer += char
                     new_token_content += char
 
-        if self.next_token == None:    
-            print("Parsing error: reached end of file while parsing token " + new_token_content)
-            exit(0)
-
         return
 
+    # error message for a comment or string constant that starts on the given line and is not closed
+    def end_of_file_error(self, what, line):
+        return "Parsing error: end of file reached while parsing " + what + " started on line " + str(line) + \
+            " of " + self.filename
+
 
 
     # API methods
 
     # constructor
-    def __init__(self, filename):
+    # the source text can also be passed directly, in which case filename only names it in messages
+    def __init__(self, filename, source=None):
         self.current_token = None
         self.next_token = None
 
         
-        self.current_line = 0
-        self.linebuffer = ""
+        self.current_line = 1
         self.current_comment_start_line = None
 
         self.filename = filename
 
-        try:
-            self.file = open(filename, 'r')
-        except FileNotFoundError:
-            print(f"File {filename} not found")
+        if source is None:
+            with open(filename, 'r') as file:
+                source = file.read()
+        # reading from memory, tell() is the offset in self.source, which has its line endings translated to \n
+        self.file = io.StringIO(source, newline=None)
+        self.source = self.file.getvalue()
         self.find_next_token()
 
     def has_more_tokens(self):
@@ -162,5 +177,104 @@ class JackTokenizer:
     def next_content(self):
         return self.next_token.content
 
+    # all tokens of the source in a TokenStream, scanned one character at a time from the start of the source
+    @property
+    def stream(self):
+        scanner = JackTokenizer(self.filename, self.source)
+        stream = TokenStream(self.source)
+        while scanner.has_more_tokens():
+            token = scanner.next_token
+            kind = TOKEN_TYPE_NAMES.index(token.token_type)
+            code = NO_TEXT_CODE if kind in (INTEGER_CONSTANT, STRING_CONSTANT, IDENTIFIER) else TEXT_CODE[token.content]
+            stream.append(kind, code, scanner.next_start, scanner.next_end)
+            scanner.advance()
+        return stream
+
+
+class RegexJackTokenizer(JackTokenizer):
+    """Tokenizer with the same API as JackTokenizer, which reads the whole source once
+    and scans it with the master regular expression JACK_TOKEN_RE, instead of reading
+    the file one character at a time. The tokens are kept in a columnar TokenStream,
+    and current_token / next_token are only materialized as Token objects on request."""
+
+    stream = None                     # set by the constructor, instead of scanning again like JackTokenizer.stream
+
+    # main auxiliary method scan:
+    # appends all tokens of self.source to self.stream
+    def scan(self):
+        stream = self.stream
+        for match in JACK_TOKEN_RE.finditer(self.source):
+            kind = match.lastgroup
+            if kind == "skip":
+                continue
+            elif kind == "word":
+                word = match.group()
+                if word in KEYWORD_KIND:
+                    stream.append(KEYWORD_KIND[word], TEXT_CODE[word], match.start(), match.end())
+                elif word[0].isdigit():
+                    stream.append(INTEGER_CONSTANT, NO_TEXT_CODE, match.start(), match.end())
+                else:
+                    stream.append(IDENTIFIER, NO_TEXT_CODE, match.start(), match.end())
+            elif kind == "symbol":
+                stream.append(SYMBOL, TEXT_CODE[match.group()], match.start(), match.end())
+            elif kind == "stringConstant":
+                stream.append(STRING_CONSTANT, NO_TEXT_CODE, match.start(kind), match.end(kind))
+            else:
+                line, column = stream.line_index.position(match.start())
+                raise ValueError("Parsing error: end of file reached while parsing " +
+                                 ("multiline comment" if match.group() == "/*" else "string constant") +
+                                 " started on line " + str(line) + ", column " + str(column) +
+                                 " of " + self.filename)
+
+    # constructor
+    def __init__(self, filename, source=None):
+        self.filename = filename
+
+        if source is None:
+            with open(filename, 'r') as file:
+                source = file.read()
+        self.source = source
+        self.stream = TokenStream(self.source)
+        self.scan()
+
+        self.current = -1                 # index of the current token in self.stream
+        self.next = 0                     # index of the next token in self.stream
+
+    # line of the next token
+    @property
+    def current_line(self):
+        return self.stream.position(self.next)[0]
+
+    @property
+    def current_token(self):
+        return self.stream.token(self.current) if self.current >= 0 else None
+
+    @property
+    def next_token(self):
+        return self.stream.token(self.next) if self.has_more_tokens() else None
+
+    def has_more_tokens(self):
+        return self.next < len(self.stream)
+
+    def advance(self):
+        assert self.has_more_tokens()
+        self.current = self.next
+        self.next += 1
+
+    def ttype(self):
+        assert self.current >= 0
+        return self.stream.token_type(self.current)
+
+    def content(self):
+        assert self.current >= 0
+        return self.stream.content(self.current)
+
+    def next_ttype(self):
+        return self.stream.token_type(self.next)
+
+    def next_content(self):
+        return self.stream.content(self.next)
 
-    
\ No newline at end of file
+# tokenizer engines that can be selected with the --tokenizer flag
+TOKENIZERS = {"char": JackTokenizer, "regex": RegexJackTokenizer}
+DEFAULT_TOKENIZER = "regex"
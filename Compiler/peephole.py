@@ -0,0 +1,96 @@
+"""Peephole optimizer for the VM code of one subroutine.
+
+The code is a list of commands, each command a list of words such as ["push", "local", "0"].
+A rule looks at a window of consecutive commands starting at some position, and either returns
+None (no match) or a pair (n, replacement): the first n commands of the window are replaced by
+the commands in replacement. The optimizer slides over the code, applies every rule at every
+position and repeats until no rule matches anymore, counting the hits per rule."""
+from collections import Counter
+
+
+# push X i; pop X i  -->  (nothing)
+def push_pop_same(window):
+    if len(window) >= 2 and window[0][0] == "push" and window[1][0] == "pop" and window[0][1:] == window[1][1:]:
+        return 2, []
+
+# not; not  -->  (nothing)        neg; neg  -->  (nothing)
+def double_negation(window):
+    if len(window) >= 2 and window[0] == window[1] and window[0][0] in ("not", "neg"):
+        return 2, []
+
+# push constant 0; not; if-goto L  -->  goto L        (for example: while (true))
+def constant_true_jump(window):
+    if len(window) >= 3 and window[0] == ["push", "constant", "0"] and window[1] == ["not"] \
+            and window[2][0] == "if-goto":
+        return 3, [["goto", window[2][1]]]
+
+# push constant k; if-goto L  -->  goto L if k is not 0, and nothing if k is 0
+def constant_jump(window):
+    if len(window) >= 2 and window[0][:2] == ["push", "constant"] and window[1][0] == "if-goto":
+        return 2, [["goto", window[1][1]]] if window[0][2] != "0" else []
+
+# eq; not; if-goto L  -->  sub; if-goto L        (x - y is not 0 exactly when x and y differ)
+# not; if-goto in general must stay: it jumps unless the condition is -1, which is only the same as
+# jumping when the condition is 0 if the condition is known to be true (-1) or false (0)
+def negated_equality_jump(window):
+    if len(window) >= 3 and window[0] == ["eq"] and window[1] == ["not"] and window[2][0] == "if-goto":
+        return 3, [["sub"], window[2]]
+
+# goto L; label A; ...; label L  -->  label A; ...; label L
+# for example the goto afterif emitted at the end of an if statement without else
+def jump_to_next(window):
+    if window[0][0] != "goto":
+        return None
+    for command in window[1:]:
+        if command[0] != "label":
+            return None
+        if command[1] == window[0][1]:
+            return 1, []
+
+# goto L or return, followed by commands other than a label  -->  the commands are never executed
+def unreachable_code(window):
+    if len(window) >= 2 and window[0][0] in ("goto", "return") and window[1][0] not in ("label", "function"):
+        return 2, [window[0]]
+
+
+PEEPHOLE_RULES = [("push-pop-same", 2, push_pop_same),
+                  ("double-negation", 2, double_negation),
+                  ("constant-true-jump", 3, constant_true_jump),
+                  ("constant-jump", 2, constant_jump),
+                  ("negated-equality-jump", 3, negated_equality_jump),
+                  ("jump-to-next", 4, jump_to_next),
+                  ("unreachable-code", 2, unreachable_code)]
+
+
+class PeepholeOptimizer:
+    """Applies a list of (name, window size, rule) triples, by default PEEPHOLE_RULES,
+    and counts in self.hits how often each rule was applied."""
+
+    STATS_PREFIX = "peephole "
+
+    def __init__(self, rules=None):
+        self.rules = PEEPHOLE_RULES if rules is None else rules
+        self.hits = Counter()
+
+    def optimize_commands(self, commands):
+        changed = True
+        while changed:
+            changed = False
+            i = 0
+            while i < len(commands):
+                for name, size, rule in self.rules:
+                    rewrite = rule(commands[i:i + size])
+                    if rewrite is not None:
+                        n, replacement = rewrite
+                        commands[i:i + n] = replacement
+                        self.hits[name] += 1
+                        changed = True
+                        break
+                else:
+                    i += 1
+        return commands
+
+    # optimizes VM code given as text with one command per line
+    def optimize(self, code):
+        commands = [line.split() for line in code.splitlines() if line != ""]
+        return "".join(" ".join(command) + "\n" for command in self.optimize_commands(commands))
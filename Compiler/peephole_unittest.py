@@ -0,0 +1,66 @@
+"""Checks of the peephole optimizer (peephole.py):
+  every rule rewrites the code it matches, and only that code, and is counted in hits,
+  other rules can replace the default ones,
+  --peephole code runs like the plain code, also on conditions that are not booleans.
+Usage: python3 peephole_unittest.py"""
+from compilationengine import compile_to_vm
+from compileoptions import CompileOptions
+from peephole import PeepholeOptimizer, push_pop_same
+from unittestsupport import check, finish, VMRunner, CONDITIONS, X_VALUES, condition_class
+
+# rule -> list of (code, optimized code), with ; separating the commands
+REWRITES = {"push-pop-same": [("push local 0; pop local 0; push local 1", "push local 1"),
+                              ("push local 0; pop local 1", "push local 0; pop local 1")],
+            "double-negation": [("push local 0; not; not; neg; neg", "push local 0"),
+                                ("push local 0; not; neg", "push local 0; not; neg")],
+            "constant-true-jump": [("push constant 0; not; if-goto L1; label L1", "label L1")],
+            "constant-jump": [("push constant 3; if-goto L1; push local 0; label L1", "label L1"),
+                              ("push constant 0; if-goto L1; push local 0; label L1", "push local 0; label L1")],
+            "negated-equality-jump": [("push local 0; push local 1; eq; not; if-goto L1; push local 0; label L1",
+                                       "push local 0; push local 1; sub; if-goto L1; push local 0; label L1")],
+            "jump-to-next": [("goto L1; label L2; label L1; push local 0", "label L2; label L1; push local 0"),
+                             ("goto L1; label L2; push local 0; label L1", "goto L1; label L2; push local 0; label L1")],
+            "unreachable-code": [("return; push local 0; pop local 1; label L1", "return; label L1")]}
+# not; if-goto jumps unless the condition is -1, which is only a jump on 0 for the booleans: it has to stay
+KEPT = ["push local 0; not; if-goto L1; push local 0; label L1",
+        "push local 0; push local 1; lt; not; if-goto L1; push local 0; label L1"]
+
+
+def commands(code):
+    return "".join(command.strip() + "\n" for command in code.split(";"))
+
+
+def check_rules():
+    for name, rewrites in REWRITES.items():
+        for code, expected in rewrites:
+            optimizer = PeepholeOptimizer()
+            optimized = optimizer.optimize(commands(code))
+            check(optimized == commands(expected), name + ": " + code + " becomes " + optimized.replace("\n", "; "))
+            check((optimizer.hits[name] > 0) == (code != expected), name + ": hits are not counted for " + code)
+    for code in KEPT:
+        check(PeepholeOptimizer().optimize(commands(code)) == commands(code), "the peephole optimizer changes " + code)
+
+
+def check_custom_rules():
+    optimizer = PeepholeOptimizer([("push-pop-same", 2, push_pop_same)])
+    code = commands("push local 0; pop local 0; push local 1; not; not")
+    check(optimizer.optimize(code) == commands("push local 1; not; not"), "other rules do not replace the default ones")
+    check(dict(optimizer.hits) == {"push-pop-same": 1}, "hits of other rules are not counted")
+
+
+def check_runs_like_plain():
+    for condition in CONDITIONS:
+        source = condition_class(condition)
+        plain, stats = compile_to_vm("Main.jack", source)
+        vm, stats = compile_to_vm("Main.jack", source, CompileOptions(peephole=True))
+        check(sum(stats.values()) > 0, "--peephole changes nothing for condition " + condition)
+        for x in X_VALUES:
+            check(VMRunner({"Main": vm}).run("Main.run", [x]) == VMRunner({"Main": plain}).run("Main.run", [x]),
+                  "--peephole: condition " + condition + " with x = " + str(x) + " runs differently")
+
+
+if __name__ == "__main__":
+    check_rules()
+    check_custom_rules()
+    check_runs_like_plain()
+    finish()
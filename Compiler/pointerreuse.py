@@ -0,0 +1,63 @@
+"""Removal of array address computations whose result pointer 1 already holds.
+
+Array accesses set pointer 1 with  push base; pop pointer 1  or  push x; push y; add; pop pointer 1.
+Going through the code of a subroutine in order, the pass remembers which of these computations
+pointer 1 holds, and drops a computation that is repeated while the values it reads are unchanged.
+What pointer 1 holds is forgotten at labels, where other paths join, and at calls, since inlining
+may later put code that sets pointer 1 in their place. It is also forgotten when one of the
+variables read is assigned, or, for fields and statics, which live in memory, at every store
+through that."""
+from collections import Counter
+
+MEMORY_SEGMENTS = ("this", "static")
+ADDRESS_SEGMENTS = ("local", "argument", "static", "this", "temp", "constant")
+
+
+# the address computation that ends with the pop pointer 1 at position i, as a tuple of commands, or None
+def address_computation(commands, i):
+    for n in (4, 2):
+        computation = commands[i - n + 1:i + 1] if i - n + 1 >= 0 else []
+        pushes = computation[:2] if n == 4 else computation[:1]
+        if len(computation) == n and all(c[0] == "push" and c[1] in ADDRESS_SEGMENTS for c in pushes) and \
+                (n == 2 or computation[2] == ["add"]):
+            return tuple(tuple(c) for c in computation)
+    return None
+
+
+class PointerReuse:
+    """Optimizer for VMWriter: optimize rewrites the VM code of one subroutine.
+    hits counts the address computations that were dropped."""
+
+    STATS_PREFIX = "array access: "
+
+    def __init__(self):
+        self.hits = Counter()
+
+    def optimize_commands(self, commands):
+        result = []
+        held = None                   # address computation that pointer 1 holds
+        for command in commands:
+            if command == ["pop", "pointer", "1"]:
+                result.append(command)
+                computation = address_computation(result, len(result) - 1)
+                if computation is not None and computation == held:
+                    del result[-len(computation):]
+                    self.hits["pointer 1 reused"] += 1
+                held = computation
+                continue
+            result.append(command)
+            if held is None:
+                continue
+            if command[0] in ("label", "function", "call", "return"):
+                held = None
+            elif command[0] == "pop":
+                read = [c[1:] for c in held if c[0] == "push"]
+                if tuple(command[1:]) in read or \
+                        (command[1] in ("that", "pointer") and any(r[0] in MEMORY_SEGMENTS for r in read)):
+                    held = None
+        return result
+
+    # optimizes VM code given as text with one command per line
+    def optimize(self, code):
+        commands = [line.split() for line in code.splitlines() if line != ""]
+        return "".join(" ".join(command) + "\n" for command in self.optimize_commands(commands))
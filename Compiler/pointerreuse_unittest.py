@@ -0,0 +1,52 @@
+"""Checks of the removal of repeated array address computations (pointerreuse.py):
+  a computation that pointer 1 already holds is dropped and counted in hits,
+  and one is kept after a label, a call, an assignment to a value it reads, a store through that when it
+  reads memory, or another computation.
+Usage: python3 pointerreuse_unittest.py"""
+from pointerreuse import PointerReuse
+from unittestsupport import check, finish
+
+# (code, optimized code), with ; separating the commands
+REWRITES = [("push local 0; push argument 0; add; pop pointer 1; push that 0; "
+             "push local 0; push argument 0; add; pop pointer 1; push that 0; add",
+             "push local 0; push argument 0; add; pop pointer 1; push that 0; push that 0; add"),
+            ("push local 0; pop pointer 1; push that 1; push local 0; pop pointer 1; push that 2; add",
+             "push local 0; pop pointer 1; push that 1; push that 2; add"),
+            # a store through that changes no local
+            ("push local 0; pop pointer 1; push constant 1; pop that 0; push local 0; pop pointer 1; push that 1",
+             "push local 0; pop pointer 1; push constant 1; pop that 0; push that 1"),
+            ("push static 0; push constant 3; add; pop pointer 1; push that 0; pop local 1; "
+             "push static 0; push constant 3; add; pop pointer 1; push that 0",
+             "push static 0; push constant 3; add; pop pointer 1; push that 0; pop local 1; push that 0")]
+KEPT = ["push local 0; pop pointer 1; push that 0; label L1; push local 0; pop pointer 1; push that 0",
+        "push local 0; pop pointer 1; push that 0; call Main.f 1; push local 0; pop pointer 1; push that 0",
+        "push local 0; pop pointer 1; push that 0; pop local 0; push local 0; pop pointer 1; push that 0",
+        "push local 0; push argument 0; add; pop pointer 1; push that 0; pop argument 0; "
+        "push local 0; push argument 0; add; pop pointer 1; push that 0",
+        # a field or static may be the element just written
+        "push this 0; pop pointer 1; push constant 1; pop that 0; push this 0; pop pointer 1; push that 0",
+        "push static 0; pop pointer 1; push constant 1; pop that 0; push static 0; pop pointer 1; push that 0",
+        "push this 0; pop pointer 1; push that 0; pop pointer 0; push this 0; pop pointer 1; push that 0",
+        "push local 0; pop pointer 1; push that 0; push local 1; pop pointer 1; push that 0; "
+        "push local 0; pop pointer 1; push that 0"]
+
+
+def commands(code):
+    return "".join(command.strip() + "\n" for command in code.split(";"))
+
+
+def check_rewrites():
+    for code, expected in REWRITES:
+        optimizer = PointerReuse()
+        optimized = optimizer.optimize(commands(code))
+        check(optimized == commands(expected), code + " becomes " + optimized.replace("\n", "; "))
+        check(optimizer.hits["pointer 1 reused"] == 1, "hits are not counted for " + code)
+    for code in KEPT:
+        optimizer = PointerReuse()
+        check(optimizer.optimize(commands(code)) == commands(code) and not optimizer.hits,
+              "pointer reuse changes " + code)
+
+
+if __name__ == "__main__":
+    check_rewrites()
+    finish()
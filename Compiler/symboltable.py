@@ -1,51 +1,105 @@
+SYMBOL_KINDS = ("static", "field", "arg", "var")
+# VM segment of the identifiers of each kind
+VM_SEGMENT_NAME = {"arg": "argument", "var": "local",
+                   "static": "static", "field": "this"}
+
+
+class Symbol:
+    """Record of one identifier: its type and kind, and the VM segment and index where its value lives."""
+    __slots__ = ("name", "type", "kind", "segment", "idx")
+
+    def __init__(self, name, stype, skind, idx):
+        self.name = name
+        self.type = stype
+        self.kind = skind
+        self.segment = VM_SEGMENT_NAME[skind]
+        self.idx = idx
+
+    def __repr__(self):
+        return "Symbol(" + self.name + ": " + self.type + ", " + self.kind + " " + str(self.idx) + ")"
+
+
+class Scope:
+    """The identifiers defined in one scope, and the enclosing scope in which the others are looked up."""
+    __slots__ = ("symbols", "parent")
+
+    def __init__(self, parent=None):
+        self.symbols = {}
+        self.parent = parent
+
+    # the symbol of sname in this scope or an enclosing one, or None
+    def lookup(self, sname):
+        scope = self
+        while scope is not None:
+            symbol = scope.symbols.get(sname)
+            if symbol is not None:
+                return symbol
+            scope = scope.parent
+        return None
+
+
 class SymbolTable:
+    """Scope chain of a class: the scope of the subroutine being compiled, enclosed by the class scope.
+    Names that were resolved in the current subroutine are cached, so that looking them up again
+    takes a single dictionary probe."""
+
     def __init__(self):
-        self.class_table = {}
-        self.subroutine_table = {}
+        self.class_scope = Scope()
+        self.subroutine_scope = Scope(self.class_scope)
+        self.resolved = {}                # cache of the names resolved in the current subroutine
         self.assign_next = {"static" : 0, "field" : 0, "arg" : 0, "var" : 0}
 
     def start_subroutine(self):
-        self.subroutine_table = {}
+        self.subroutine_scope = Scope(self.class_scope)
+        self.resolved = {}
         self.assign_next["arg"] = 0
         self.assign_next["var"] = 0
-    
+
     '''Define a new identifier of given sname, stype and skind (static, field, arg or var)
     and assign a running idx to it'''
     def define(self, sname, stype, skind):
-        if skind not in {"static", "field", "arg", "var"}:
+        if skind not in SYMBOL_KINDS:
             raise ValueError("Unrecognized identifier kind: " + skind + ". Must be static, field, arg or var.")
-        new_record = {"type" : stype, "kind" : skind, "idx" : self.assign_next[skind]}
+        symbol = Symbol(sname, stype, skind, self.assign_next[skind])
         self.assign_next[skind] += 1
         if skind == "static" or skind == "field":
-            self.class_table[sname] = new_record
-        elif skind == "arg" or skind == "var": 
-            self.subroutine_table[sname] = new_record
+            self.class_scope.symbols[sname] = symbol
+        else:
+            self.subroutine_scope.symbols[sname] = symbol
+        self.resolved.pop(sname, None)    # the new symbol may hide one that was resolved before
 
     def var_count(self, skind):
         return self.assign_next[skind]
-    
+
+    # the symbol of sname, or None if it is not defined
+    def find(self, sname):
+        symbol = self.resolved.get(sname)
+        if symbol is None:
+            symbol = self.subroutine_scope.lookup(sname)
+            if symbol is not None:
+                self.resolved[sname] = symbol
+        return symbol
+
     def get_record(self, sname):
-        assert sname in self.subroutine_table.keys() or sname in self.class_table.keys(), \
-            "Unrecognized symbol name: " + sname
-        if sname in self.subroutine_table.keys():
-            return self.subroutine_table[sname]
-        else:
-            return self.class_table[sname]
+        symbol = self.find(sname)
+        if symbol is None:
+            raise ValueError("Unrecognized symbol name: " + sname)
+        return symbol
 
     def is_local(self, sname):
-        return sname in self.subroutine.table.keys()
+        return sname in self.subroutine_scope.symbols
 
     def kind_of(self, sname):
-        return self.get_record(sname)["kind"]
+        return self.get_record(sname).kind
 
     def type_of(self, sname):
-        return self.get_record(sname)["type"]
+        return self.get_record(sname).type
 
     def idx_of(self, sname):
-        return self.get_record(sname)["idx"]
+        return self.get_record(sname).idx
 
     def diagnostics(self):
-        print("symboltable class: ") 
-        print(self.class_table)
-        print("symboltable subroutine: ") 
-        print(self.subroutine_table)
\ No newline at end of file
+        print("symboltable class: ")
+        print(self.class_scope.symbols)
+        print("symboltable subroutine: ")
+        print(self.subroutine_scope.symbols)
@@ -3,4 +3,17 @@ python3 jackcompiler.py tests/Average
 python3 jackcompiler.py tests/ComplexArrays
 python3 jackcompiler.py tests/ConvertToBin
 python3 jackcompiler.py tests/Square
-python3 jackcompiler.py tests/Pong
\ No newline at end of file
+python3 jackcompiler.py tests/Pong
+python3 jackcompiler_unittest.py
+python3 buildmanifest_unittest.py
+python3 compileserver_unittest.py
+python3 peephole_unittest.py
+python3 compilationengine_unittest.py
+python3 jackast_unittest.py
+python3 jackinterface_unittest.py
+python3 frontend_unittest.py
+python3 vmbytecode_unittest.py
+python3 jackapi_unittest.py
+python3 vmprogram_unittest.py
+python3 inlining_unittest.py
+python3 pointerreuse_unittest.py
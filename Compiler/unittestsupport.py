@@ -0,0 +1,228 @@
+"""Helpers shared by the *_unittest.py scripts.
+
+A script runs its checks, each of which records a message for every failure with check, and then calls
+finish, which prints the failed checks and exits with 1 if there are any."""
+from compileoptions import CompileOptions
+import os
+import subprocess
+import sys
+
+COMPILER_DIR = os.path.dirname(os.path.abspath(__file__))
+TESTS_DIR = os.path.join(COMPILER_DIR, "tests")
+COMPILER = os.path.join(COMPILER_DIR, "jackcompiler.py")
+
+failures = []
+
+
+def check(ok, message):
+    if not ok:
+        failures.append(message)
+
+
+def finish():
+    for message in failures:
+        print(message)
+    print(str(len(failures)) + " checks failed" if failures else "all checks passed")
+    sys.exit(1 if failures else 0)
+
+
+def read(fpath):
+    with open(fpath, 'r') as file:
+        return file.read()
+
+
+def write(fpath, text):
+    with open(fpath, 'w') as file:
+        file.write(text)
+
+# the directories of the test programs in tests/
+def program_dirs():
+    return [os.path.join(TESTS_DIR, name) for name in sorted(os.listdir(TESTS_DIR))]
+
+
+def jack_files(directory):
+    return [os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f[-5:] == ".jack"]
+
+# the options of the optimizations, as attributes of CompileOptions
+FLAGS = ["peephole", "fold", "strength", "string_pool", "branch_layout", "intrinsics", "array_access", "interfaces"]
+
+
+# (name, options) for the default options, each optimization on its own and all of them together
+def option_sets():
+    yield "default", CompileOptions()
+    for flag in FLAGS:
+        yield "--" + flag.replace("_", "-"), CompileOptions(**{flag: True})
+    yield "all", CompileOptions(**{flag: True for flag in FLAGS})
+
+# the command line flags of the options that are on
+def flag_arguments(options):
+    return ["--" + flag.replace("_", "-") for flag in FLAGS if getattr(options, flag)]
+
+# runs jackcompiler.py in this process's interpreter, without a compile server, and returns its CompletedProcess
+def run_compiler(args, stdin=None):
+    return subprocess.run([sys.executable, COMPILER, "--no-server", "--jobs", "1"] + args,
+                          input=stdin, capture_output=True, text=True)
+
+
+def s16(value):
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class StepLimit(Exception):
+    pass
+
+
+class VMRunner:
+    """Runs the VM code of a program (a mapping class name -> VM text) on a model of the Hack VM, so that checks
+    can compare what optimized and plain code do. The functions of the operating system that the sample
+    programs use are Python functions (OS_FUNCTIONS); Output.printInt and Output.printString append to output.
+    run returns None instead of a value if the program takes more than max_steps commands."""
+
+    def __init__(self, vms, max_steps=100000):
+        self.functions = {}               # name -> (class name, number of locals, commands, label positions)
+        for classname, vm in vms.items():
+            for line in vm.splitlines():
+                words = line.split()
+                if not words or words[0] == "//":
+                    continue
+                if words[0] == "function":
+                    commands, labels = [], {}
+                    self.functions[words[1]] = (classname, int(words[2]), commands, labels)
+                elif words[0] == "label":
+                    labels[words[1]] = len(commands)
+                else:
+                    commands.append(words)
+        self.max_steps = max_steps
+        self.steps = 0
+        self.ram = {}
+        self.heap = 2048
+        self.statics = {classname: {} for classname in vms}
+        self.temp = [0] * 8
+        self.strings = {}                 # address of a String -> its characters
+        self.output = []
+
+    def run(self, name, args=()):
+        self.steps = 0
+        try:
+            return self.call(name, list(args), [0, 0])
+        except StepLimit:
+            return None
+
+    def call(self, name, args, pointer):
+        if name not in self.functions:
+            return OS_FUNCTIONS[name](self, *args)
+        classname, n_locals, commands, labels = self.functions[name]
+        local = [0] * n_locals
+        statics = self.statics[classname]
+        pointer = list(pointer)           # the callee starts with the caller's this and that, which return restores
+        stack = []
+        pc = 0
+        while True:
+            self.steps += 1
+            if self.steps > self.max_steps:
+                raise StepLimit()
+            command = commands[pc]
+            pc += 1
+            op = command[0]
+            if op == "push" or op == "pop":
+                segment, idx = command[1], int(command[2])
+                if segment == "constant":
+                    stack.append(idx)
+                    continue
+                if segment in ("this", "that"):
+                    memory, idx = self.ram, pointer[segment == "that"] + idx
+                else:
+                    memory = {"argument": args, "local": local, "static": statics, "temp": self.temp,
+                              "pointer": pointer}[segment]
+                if op == "push":
+                    stack.append(memory.get(idx, 0) if isinstance(memory, dict) else memory[idx])
+                else:
+                    memory[idx] = stack.pop()
+            elif op in BINARY_COMMANDS:
+                b = stack.pop()
+                stack.append(s16(BINARY_COMMANDS[op](stack.pop(), b)))
+            elif op == "neg":
+                stack.append(s16(-stack.pop()))
+            elif op == "not":
+                stack.append(s16(~stack.pop()))
+            elif op == "goto":
+                pc = labels[command[1]]
+            elif op == "if-goto":
+                if stack.pop() != 0:
+                    pc = labels[command[1]]
+            elif op == "call":
+                n_args = int(command[2])
+                call_args = stack[len(stack) - n_args:]
+                del stack[len(stack) - n_args:]
+                stack.append(self.call(command[1], call_args, pointer))
+            elif op == "return":
+                return stack.pop()
+            else:
+                raise ValueError("VMRunner cannot run " + " ".join(command))
+
+    def alloc(self, size):
+        address = self.heap
+        self.heap += max(size, 1)
+        return address
+
+
+def new_string(runner, capacity):
+    address = runner.alloc(capacity)
+    runner.strings[address] = []
+    return address
+
+def append_char(runner, address, c):
+    runner.strings[address].append(chr(c))
+    return address
+
+def divide(runner, a, b):
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+def print_value(runner, text):
+    runner.output.append(text)
+    return 0
+
+
+BINARY_COMMANDS = {"add": lambda a, b: a + b, "sub": lambda a, b: a - b, "and": lambda a, b: a & b,
+                   "or": lambda a, b: a | b, "eq": lambda a, b: -(a == b), "gt": lambda a, b: -(a > b),
+                   "lt": lambda a, b: -(a < b)}
+OS_FUNCTIONS = {"Memory.alloc": VMRunner.alloc,
+                "Memory.deAlloc": lambda runner, address: 0,
+                "Memory.peek": lambda runner, address: runner.ram.get(address, 0),
+                "Memory.poke": lambda runner, address, value: runner.ram.__setitem__(address, value) or 0,
+                "Array.new": VMRunner.alloc,
+                "Array.dispose": lambda runner, address: 0,
+                "String.new": new_string,
+                "String.appendChar": append_char,
+                "String.dispose": lambda runner, address: 0,
+                "Math.multiply": lambda runner, a, b: s16(a * b),
+                "Math.divide": divide,
+                "Math.abs": lambda runner, x: s16(abs(x)),
+                "Math.min": lambda runner, a, b: min(a, b),
+                "Math.max": lambda runner, a, b: max(a, b),
+                "Output.printInt": lambda runner, x: print_value(runner, str(x)),
+                "Output.printString": lambda runner, address: print_value(runner, "".join(runner.strings[address]))}
+
+# conditions of if and while statements, and values of x to run them with (condition_class)
+CONDITIONS = ["x", "x & 1", "x | 2", "~x", "-x", "x + 1", "x = 1", "x < 2", "x > 0", "~(x = 1)", "~(x < 2)",
+              "~~x", "true", "false", "(x = 1) | (x = 2)", "(x < 3) & (x > -2)"]
+X_VALUES = [-2, -1, 0, 1, 2, 3, 255]
+
+
+# a class whose function Main.run(x) tests condition in an if/else, an if and a while statement
+def condition_class(condition):
+    return """class Main {
+    function int run(int x) {
+        var int r;
+        if (%s) { let r = 1; } else { let r = 2; }
+        if (%s) { let r = r + 10; }
+        while (%s) {
+            let r = r + 100;
+            let x = x + 1;
+            if (r > 1000) { return r; }
+        }
+        return r;
+    }
+}""" % (condition, condition, condition)
@@ -0,0 +1,157 @@
+"""Binary encoding of VM code (.vmb files), as an alternative to the textual .vm format.
+
+A file is a header, the instructions and a string table, all little-endian:
+  header        magic b"JVMB", format version (16 bits), 0 (16 bits), number of instructions (32 bits),
+                length of the string table in bytes (32 bits)
+  instructions  three 16-bit words each: opcode, first operand, second operand
+  string table  the function and label names in UTF-8, separated by newlines
+push and pop have the segment code and the index as operands, label, goto and if-goto the number of the
+name in the string table, function and call the number of the name and the number of locals or arguments.
+The other commands have no operands (both words 0). Comments are not encoded.
+
+Since every instruction has the same width, a loader gets all of them into an array with a single copy
+from the memory-mapped file, without parsing any line, and disassemble reproduces the canonical text.
+
+Usage: python3 vmbytecode.py FILE.vmb  prints the VM code of the file."""
+from array import array
+import mmap
+import struct
+import sys
+
+MAGIC = b"JVMB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+WORDS_PER_INSTRUCTION = 3
+
+OPCODES = ("push", "pop", "add", "sub", "neg", "eq", "gt", "lt", "and", "or", "not",
+           "label", "goto", "if-goto", "function", "call", "return")
+OPCODE = {name: code for code, name in enumerate(OPCODES)}
+PUSH, POP, LABEL, GOTO, IF_GOTO, FUNCTION, CALL = \
+    (OPCODE[name] for name in ("push", "pop", "label", "goto", "if-goto", "function", "call"))
+NAMED = (LABEL, GOTO, IF_GOTO, FUNCTION, CALL)          # opcodes whose first operand is a name
+COUNTED = (FUNCTION, CALL)                              # opcodes with a count as second operand
+SEGMENTS = ("argument", "local", "static", "constant", "this", "that", "pointer", "temp")
+SEGMENT = {name: code for code, name in enumerate(SEGMENTS)}
+MAX_OPERAND = 0xFFFF
+
+
+class BytecodeSink:
+    """Sink for VMWriter that encodes the VM code written to it; getvalue returns the .vmb file contents.
+    It can also be fed the text of a VM file, such as the output of the compile server."""
+
+    def __init__(self):
+        self.instructions = array("H")
+        self.names = {}                   # name -> number in the string table
+
+    def write(self, text):
+        for line in text.splitlines():
+            self.add(line)
+
+    def writelines(self, lines):
+        self.write("".join(lines))
+
+    def close(self):
+        pass
+
+    def name_number(self, name):
+        if name not in self.names:
+            self.names[name] = len(self.names)
+        return self.names[name]
+
+    # encodes one line of VM code
+    def add(self, line):
+        words = line.split()
+        if not words or words[0].startswith("//"):
+            return
+        if words[0] not in OPCODE:
+            raise ValueError("Unknown VM command: " + line)
+        opcode = OPCODE[words[0]]
+        first = second = 0
+        if opcode in (PUSH, POP):
+            if words[1] not in SEGMENT:
+                raise ValueError("Unknown segment in VM command: " + line)
+            first, second = SEGMENT[words[1]], int(words[2])
+        elif opcode in NAMED:
+            first = self.name_number(words[1])
+            if opcode in COUNTED:
+                second = int(words[2])
+        if not (0 <= second <= MAX_OPERAND and len(self.names) <= MAX_OPERAND + 1):
+            raise ValueError("Operand out of range in VM command: " + line)
+        self.instructions.extend((opcode, first, second))
+
+    def getvalue(self):
+        instructions = self.instructions
+        if sys.byteorder == "big":
+            instructions = array("H", instructions)
+            instructions.byteswap()
+        strings = "\n".join(self.names).encode()
+        return HEADER.pack(MAGIC, VERSION, 0, len(self.instructions) // WORDS_PER_INSTRUCTION, len(strings)) + \
+            instructions.tobytes() + strings
+
+
+# the .vmb encoding of VM code given as text
+def encode(vm):
+    sink = BytecodeSink()
+    sink.write(vm)
+    return sink.getvalue()
+
+
+class VMBytecode:
+    """Decoded .vmb file: instructions is an array with three words per instruction, names the string table."""
+
+    def __init__(self, instructions, names):
+        self.instructions = instructions
+        self.names = names
+
+    '''from_bytes decodes the contents of a .vmb file, given as bytes or as a memory map,
+    copying the instructions into an array in one piece'''
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER.size:
+            raise ValueError("Not a VM bytecode file: too short")
+        magic, version, _, n_instructions, strings_size = HEADER.unpack(data[:HEADER.size])
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a VM bytecode file of version " + str(VERSION))
+        strings_start = HEADER.size + 2 * WORDS_PER_INSTRUCTION * n_instructions
+        if len(data) != strings_start + strings_size:
+            raise ValueError("VM bytecode file of the wrong size")
+        instructions = array("H")
+        instructions.frombytes(data[HEADER.size:strings_start])
+        if sys.byteorder == "big":
+            instructions.byteswap()
+        names = data[strings_start:].decode().split("\n") if strings_size > 0 else []
+        return cls(instructions, names)
+
+    def __len__(self):
+        return len(self.instructions) // WORDS_PER_INSTRUCTION
+
+    # instruction i as the words of its VM command
+    def command(self, i):
+        opcode, first, second = self.instructions[WORDS_PER_INSTRUCTION * i:WORDS_PER_INSTRUCTION * (i + 1)]
+        if opcode in (PUSH, POP):
+            return [OPCODES[opcode], SEGMENTS[first], str(second)]
+        if opcode in COUNTED:
+            return [OPCODES[opcode], self.names[first], str(second)]
+        if opcode in NAMED:
+            return [OPCODES[opcode], self.names[first]]
+        return [OPCODES[opcode]]
+
+    # the VM code as text, one command per line
+    def disassemble(self):
+        return "".join(" ".join(self.command(i)) + "\n" for i in range(len(self)))
+
+
+# loads a .vmb file through a memory map
+def load(fpath):
+    with open(fpath, 'rb') as file:
+        if file.seek(0, 2) == 0:
+            return VMBytecode.from_bytes(b"")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return VMBytecode.from_bytes(data)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    sys.stdout.write(load(sys.argv[1]).disassemble())
@@ -0,0 +1,84 @@
+"""Checks of the binary VM format (vmbytecode.py):
+  the VM code of the programs in tests/, compiled with each optimization, is encoded by the engine's
+  bytecode sink and disassembles back to the same text, also after a round trip through a .vmb file,
+  --format binary writes .vmb files that vmbytecode.py prints as the .vm files,
+  comments are not encoded, and unknown commands, operands out of range and files that are not
+  bytecode of this version are errors.
+Usage: python3 vmbytecode_unittest.py"""
+from compilationengine import CompilationEngine, compile_to_vm
+from unittestsupport import check, finish, read, jack_files, program_dirs, option_sets, run_compiler, COMPILER_DIR
+from vmbytecode import BytecodeSink, VMBytecode, encode, load, HEADER, MAGIC, VERSION
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BAD_COMMANDS = ["jump L1", "push stack 1", "push constant 65536", "call Main.f -1"]
+
+
+def check_round_trip(workdir):
+    for name, options in option_sets():
+        for directory in program_dirs():
+            for fpath in jack_files(directory):
+                sink = BytecodeSink()
+                CompilationEngine(fpath, options, outfile=sink).compile_class()
+                vm, stats = compile_to_vm(fpath, read(fpath), options)
+                data = sink.getvalue()
+                check(data == encode(vm), name + ": the engine's bytecode of " + fpath + " is not the encoded VM code")
+                check(VMBytecode.from_bytes(data).disassemble() == vm,
+                      name + ": bytecode of " + fpath + " does not disassemble to its VM code")
+                vmb = os.path.join(workdir, "Class.vmb")
+                with open(vmb, 'wb') as file:
+                    file.write(data)
+                check(load(vmb).disassemble() == vm, name + ": the loaded .vmb file of " + fpath + " differs")
+
+
+def check_binary_output(workdir):
+    directory = program_dirs()[-1]
+    copy = os.path.join(workdir, os.path.basename(directory))
+    os.mkdir(copy)
+    for fpath in jack_files(directory):
+        shutil.copy(fpath, copy)
+    result = run_compiler(["--format", "binary", copy])
+    check(result.returncode == 0, "--format binary fails: " + result.stdout + result.stderr)
+    for fpath in jack_files(copy):
+        printed = subprocess.run([sys.executable, os.path.join(COMPILER_DIR, "vmbytecode.py"), fpath[:-4] + "vmb"],
+                                 capture_output=True, text=True).stdout
+        check(printed == read(os.path.join(directory, os.path.basename(fpath)[:-4] + "vm")),
+              "vmbytecode.py prints another VM code for the .vmb file of " + fpath)
+        check(not os.path.exists(fpath[:-4] + "vm"), "--format binary also writes " + fpath[:-4] + "vm")
+
+
+def check_errors(workdir):
+    check(VMBytecode.from_bytes(encode("// only a comment\n\npush constant 1 // one\n")).disassemble() ==
+          "push constant 1\n", "comments are encoded")
+    for command in BAD_COMMANDS:
+        try:
+            encode(command + "\n")
+            check(False, "encoding " + command + " gives no error")
+        except ValueError:
+            pass
+    data = encode("push constant 1\ngoto L1\n")
+    wrong_version = HEADER.pack(MAGIC, VERSION + 1, *HEADER.unpack(data[:HEADER.size])[2:]) + data[HEADER.size:]
+    for name, bad in (("empty", b""), ("too short", data[:HEADER.size - 1]), ("wrong magic", b"JVMX" + data[4:]),
+                      ("wrong version", wrong_version), ("truncated", data[:-1]), ("too long", data + b"\n")):
+        try:
+            VMBytecode.from_bytes(bad)
+            check(False, "decoding " + name + " bytecode gives no error")
+        except ValueError:
+            pass
+    empty = os.path.join(workdir, "Empty.vmb")
+    open(empty, 'wb').close()
+    try:
+        load(empty)
+        check(False, "loading an empty file gives no error")
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    for check_files in (check_round_trip, check_binary_output, check_errors):
+        with tempfile.TemporaryDirectory() as workdir:
+            check_files(workdir)
+    finish()
@@ -0,0 +1,75 @@
+"""Whole-program view of the VM code of all classes of a program, for optimizations that need to see
+every class at once, such as dropping the subroutines that can never be called (tree shaking)."""
+
+ENTRY_POINT = "Main.main"
+
+
+# the functions of the VM code of one class, as a list of (name, list of lines) with the function line first
+def split_functions(vm):
+    functions = []
+    for line in vm.splitlines():
+        if line.startswith("function "):
+            functions.append((line.split()[1], []))
+        if line == "":
+            continue
+        if not functions:
+            raise ValueError("VM code before the first function: " + line)
+        functions[-1][1].append(line)
+    return functions
+
+# the names of the functions called in the given lines, in order of first call
+def called_functions(lines):
+    callees = {}
+    for line in lines:
+        if line.startswith("call "):
+            callees[line.split()[1]] = True
+    return list(callees)
+
+
+class VMProgram:
+    """The VM code of a program: the functions of each class, in the order of the class's VM file.
+    Calls of functions that are not part of the program are calls of the operating system."""
+
+    def __init__(self):
+        self.classes = {}           # class name -> names of its functions
+        self.functions = {}         # function name -> lines of its code
+
+    def add_class(self, classname, vm):
+        self.classes[classname] = []
+        for name, lines in split_functions(vm):
+            if name in self.functions:
+                raise ValueError("Function defined twice: " + name)
+            self.classes[classname].append(name)
+            self.functions[name] = lines
+
+    def vm_text(self, classname):
+        return "".join(line + "\n" for name in self.classes[classname] for line in self.functions[name])
+
+    # names of the functions that can be called, directly or indirectly, from the entry point
+    def reachable(self, entry=ENTRY_POINT):
+        if entry not in self.functions:
+            raise ValueError("The program has no " + entry)
+        found = {entry}
+        todo = [entry]
+        while todo:
+            for callee in called_functions(self.functions[todo.pop()]):
+                if callee in self.functions and callee not in found:
+                    found.add(callee)
+                    todo.append(callee)
+        return found
+
+    '''shake removes the functions that cannot be reached from the entry point
+    and returns their names, in program order'''
+    def shake(self, entry=ENTRY_POINT):
+        keep = self.reachable(entry)
+        dropped = []
+        for classname, names in self.classes.items():
+            dropped += [name for name in names if name not in keep]
+            self.classes[classname] = [name for name in names if name in keep]
+        for name in dropped:
+            del self.functions[name]
+        return dropped
+
+    # names of the classes that have no functions left, in program order
+    def empty_classes(self):
+        return [classname for classname, names in self.classes.items() if not names]
@@ -0,0 +1,95 @@
+"""Checks of whole-program compilation (vmprogram.py):
+  tree shaking keeps exactly the functions reachable from Main.main, also through other classes,
+  --whole-program writes no VM file for a class without called subroutines, removes an old one and lists it,
+  compile_sources leaves such a class out, and the shaken program runs like the whole program.
+Usage: python3 vmprogram_unittest.py"""
+from compilationengine import compile_to_vm
+from jackapi import compile_sources
+from unittestsupport import check, finish, read, write, run_compiler, VMRunner
+from vmprogram import VMProgram
+import os
+import tempfile
+
+SOURCES = {"Main": """class Main {
+    function void main() {
+        do Output.printInt(Main.twice(Util.square(3)));
+        return;
+    }
+    function int twice(int x) {
+        return x + x;
+    }
+    function int unused() {
+        return Unused.f();
+    }
+}""",
+           "Util": """class Util {
+    function int square(int x) {
+        return x * x;
+    }
+    function int cube(int x) {
+        return x * Util.square(x);
+    }
+}""",
+           "Unused": """class Unused {
+    function int f() {
+        return 1;
+    }
+}"""}
+
+
+def program_of(sources):
+    program = VMProgram()
+    for classname, source in sources.items():
+        program.add_class(classname, compile_to_vm(classname + ".jack", source)[0])
+    return program
+
+
+def check_shake():
+    program = program_of(SOURCES)
+    check(program.reachable() == {"Main.main", "Main.twice", "Util.square"}, "wrong reachable functions")
+    check(program.shake() == ["Main.unused", "Util.cube", "Unused.f"], "shake drops the wrong functions")
+    check(program.classes == {"Main": ["Main.main", "Main.twice"], "Util": ["Util.square"], "Unused": []},
+          "shake keeps the wrong functions")
+    check(program.empty_classes() == ["Unused"], "wrong empty classes: " + str(program.empty_classes()))
+    check(program.vm_text("Unused") == "", "an empty class has VM code")
+    runner = VMRunner({classname: program.vm_text(classname) for classname in program.classes})
+    runner.run("Main.main")
+    check(runner.output == ["18"], "the shaken program prints " + str(runner.output))
+    vms = compile_sources(SOURCES, whole_program=True)
+    check(list(vms) == ["Main", "Util"] and vms["Util"] == program.vm_text("Util"),
+          "compile_sources returns the wrong classes for a whole program: " + ", ".join(vms))
+
+    try:
+        program_of({"Util": SOURCES["Util"]}).shake()
+        check(False, "a program without Main.main is shaken")
+    except ValueError:
+        pass
+    program = program_of({"Main": SOURCES["Main"]})
+    try:
+        program.add_class("Copy", program.vm_text("Main"))
+        check(False, "Main.main defined twice is accepted")
+    except ValueError:
+        pass
+
+
+def check_whole_program_build():
+    with tempfile.TemporaryDirectory() as workdir:
+        for classname, source in SOURCES.items():
+            write(os.path.join(workdir, classname + ".jack"), source)
+        write(os.path.join(workdir, "Unused.vm"), "// left from an earlier build\n")
+        result = run_compiler(["--whole-program", workdir])
+        check(result.returncode == 0, "--whole-program build failed: " + result.stderr)
+        check(sorted(f for f in os.listdir(workdir) if f.endswith(".vm")) == ["Main.vm", "Util.vm"],
+              "--whole-program writes or keeps Unused.vm: " + ", ".join(sorted(os.listdir(workdir))))
+        check("Dropped 3 subroutines that are never called: Main.unused, Unused.f, Util.cube" in result.stdout,
+              "--whole-program does not list the dropped subroutines: " + result.stdout)
+        check("classes without called subroutines: Unused" in result.stdout,
+              "--whole-program does not list the class without a VM file: " + result.stdout)
+        check(read(os.path.join(workdir, "Util.vm")).splitlines()[0] == "function Util.square 0",
+              "Util.vm does not start with Util.square")
+
+
+if __name__ == "__main__":
+    check_shake()
+    check_whole_program_build()
+    finish()
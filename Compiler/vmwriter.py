@@ -1,48 +1,129 @@
+FLUSH_THRESHOLD = 1 << 16            # characters of finished code collected before they are written out
+
+
+class NullSink:
+    """Output that discards everything written to it, for benchmarks."""
+
+    def write(self, text):
+        pass
+
+    def writelines(self, lines):
+        pass
+
+    def close(self):
+        pass
+
+
 class VMWriter:
 
-    def __init__(self, filename):
-        self.file = open(filename, 'w')
-        self.buffer = ""
-    
+    # output goes to the given sink if there is one (any object with write and writelines, such as a file,
+    # an io.StringIO, sys.stdout or a NullSink), otherwise to a new file filename.
+    # the given optimizers rewrite the buffered code of each subroutine in turn when it is flushed.
+    # The code of the current subroutine is kept as a list with one command per entry, and finished code
+    # is collected until it has flush_threshold characters and then written out with one writelines call
+    def __init__(self, filename, file=None, optimizers=(), flush_threshold=FLUSH_THRESHOLD):
+        self.owns_file = file is None
+        self.file = file if file is not None else open(filename, 'w')
+        self.commands = []                # code of the current subroutine, one command per entry
+        self.optimizers = optimizers
+        self.flush_threshold = flush_threshold
+        self.output = []                  # finished code that is not written out yet
+        self.output_size = 0
+
+    # writes a line before the buffered code, such as the function header that compile_subroutine_dec
+    # only knows after counting the locals of the subroutine
     def putnow(self, string):
-        self.file.write(string + "\n")
+        self.put_output([string + "\n"])
 
+    # ends the code of the current subroutine
     def flush(self):
-        self.file.write(self.buffer)
-        self.buffer = ""
+        lines = self.commands
+        if self.optimizers:
+            code = "".join(lines)
+            for optimizer in self.optimizers:
+                code = optimizer.optimize(code)
+            lines = [code]
+        self.put_output(lines)
+        self.commands = []
+
+    def put_output(self, lines):
+        self.output += lines
+        self.output_size += sum(len(line) for line in lines)
+        if self.output_size >= self.flush_threshold:
+            self.flush_output()
+
+    # writes out all finished code
+    def flush_output(self):
+        if self.output:
+            self.file.writelines(self.output)
+        self.output = []
+        self.output_size = 0
+
+    # positions in the buffered code of the current subroutine, counted in commands, used to take back code
+    # that was already emitted, for example when the engine folds the code of a subexpression into a constant
+    def mark(self):
+        return len(self.commands)
+
+    # the code between the marks start and end (by default: up to the end)
+    def text_since(self, start, end=None):
+        return "".join(self.commands[start:end])
+
+    # the command at mark i, without its newline
+    def command(self, i):
+        return self.commands[i][:-1]
+
+    # whether the code since mark start ends with the given commands
+    def ends_with(self, start, commands):
+        n = len(commands)
+        return len(self.commands) - start >= n and \
+            self.commands[len(self.commands) - n:] == [command + "\n" for command in commands]
+
+    # removes the code between the marks start and end (by default: up to the end) and returns it
+    def cut(self, start, end=None):
+        end = len(self.commands) if end is None else end
+        code = "".join(self.commands[start:end])
+        del self.commands[start:end]
+        return code
+
+    # puts code at the mark position, for example code that has to run before code already emitted
+    def insert(self, position, code):
+        self.commands[position:position] = code.splitlines(keepends=True)
 
     def push(self, segment, idx):
-        self.buffer += "push " + segment + " " + str(idx) + "\n"
-    
+        self.commands.append("push " + segment + " " + str(idx) + "\n")
+
     def pop(self, segment, idx):
-        self.buffer += "pop " + segment + " " + str(idx) + "\n"
-    
+        self.commands.append("pop " + segment + " " + str(idx) + "\n")
+
     def arithmetic(self, command):
-        self.buffer += command + "\n"
+        self.commands.append(command + "\n")
 
     def label(self, name):
-        self.buffer += "label " + name + "\n"
-    
+        self.commands.append("label " + name + "\n")
+
     def goto(self, name):
-        self.buffer += "goto " + name + "\n"
-    
+        self.commands.append("goto " + name + "\n")
+
     def ifgoto(self, name):
-        self.buffer += "if-goto " + name + "\n"
-    
+        self.commands.append("if-goto " + name + "\n")
+
     def call(self, name, n_args):
-        self.buffer += "call " + name + " " + str(n_args) + "\n"
-    
+        self.commands.append("call " + name + " " + str(n_args) + "\n")
+
     def function(self, name, n_locals):
-        self.buffer += "function " + name + str(n_locals) + "\n"
+        self.commands.append("function " + name + str(n_locals) + "\n")
 
     def ret(self):
-        self.buffer += "return\n"
-    
+        self.commands.append("return\n")
+
+    # writes out all finished code, and closes the output if the writer opened it
     def close(self):
-        self.file.close()
+        self.flush_output()
+        if self.owns_file:
+            self.file.close()
 
     def comment(self, line):
-        self.buffer += "// " + line + "\n"
-    
+        self.commands.append("// " + line + "\n")
+
     def commentnow(self, line):
-        self.file.write("// " + line + "\n")
\ No newline at end of file
+        self.put_output(["// " + line + "\n"])
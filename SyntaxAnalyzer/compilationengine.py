@@ -1,4 +1,4 @@
-from jacktokenizer import JackTokenizer
+from jacktokenizer import TOKENIZERS, DEFAULT_TOKENIZER
 
 JACK_SUBROUTINE_NAMES = ["constructor", "function", "method"]
 JACK_STATEMENT_KEYWORDS = ["if", "let", "while", "do", "return"]
@@ -9,10 +9,11 @@ INDENT_SIZE = 2
 
 class CompilationEngine:
     # constructor
-    def __init__(self, filename):
-        self.tokenizer = JackTokenizer(filename)
+    # source and outfile optionally replace reading filename and writing the .xml file next to it
+    def __init__(self, filename, tokenizer=DEFAULT_TOKENIZER, source=None, outfile=None):
+        self.tokenizer = TOKENIZERS[tokenizer](filename, source)
         self.outfilename = filename[:-4] + "xml"
-        self.outfile = open(self.outfilename, 'w')
+        self.outfile = outfile if outfile is not None else open(self.outfilename, 'w')
         self.current_level = 0
     
     # advance & write functions:
@@ -1,17 +1,89 @@
 from compilationengine import CompilationEngine
-import sys
+from jacktokenizer import TOKENIZERS, DEFAULT_TOKENIZER
+from jackstream import read_units, write_unit, output_name
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import io
 import os
+import sys
+import traceback
 
+STDIN_PATH = "-"                 # path argument that makes the analyzer read classes from stdin
 
-def treatfile(fpath):
-    engine = CompilationEngine(fpath)
+
+def treatfile(fpath, tokenizer):
+    engine = CompilationEngine(fpath, tokenizer)
     engine.compile_class()
-    print("XML file written for " + fpath)
-
-thepath = sys.argv[1]
-if os.path.isfile(thepath):
-    treatfile(thepath)
-else:
-    for fpath in os.listdir(thepath + "/"):
-        if fpath[-5:] == ".jack":
-            treatfile("./" + thepath + "/" + fpath)
+    return "XML file written for " + fpath
+
+'''treatfile_safely treats one file and returns (message, error), so that an error in one file
+can be reported by the parent process without stopping the other files'''
+def treatfile_safely(fpath, tokenizer):
+    try:
+        return treatfile(fpath, tokenizer), None
+    except Exception as e:
+        return None, error_message(fpath, e)
+
+def error_message(fpath, e):
+    return "Error in " + fpath + ": " + "".join(traceback.format_exception_only(type(e), e)).strip()
+
+def treatfiles(fpaths, tokenizer, jobs):
+    if jobs > 1 and len(fpaths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(fpaths))) as executor:
+            chunksize = max(1, len(fpaths) // (jobs * 4))
+            results = executor.map(treatfile_safely, fpaths, [tokenizer] * len(fpaths), chunksize=chunksize)
+            return report(results)
+    return report(treatfile_safely(fpath, tokenizer) for fpath in fpaths)
+
+# prints the per-file results in input order and returns the number of failed files
+def report(results):
+    n_errors = 0
+    for message, error in results:
+        if error is None:
+            print(message)
+        else:
+            print(error, file=sys.stderr)
+            n_errors += 1
+    return n_errors
+
+'''analyze_stream analyzes the classes framed in the text stream instream (jackstream.py) one at a time,
+and writes the XML of each to outstream as soon as it is done. Returns the number of failed classes.'''
+def analyze_stream(instream, outstream, tokenizer):
+    n_errors = 0
+    for name, source in read_units(instream):
+        xml = io.StringIO()
+        try:
+            CompilationEngine(name, tokenizer, source, xml).compile_class()
+        except Exception as e:
+            print(error_message(name, e), file=sys.stderr)
+            n_errors += 1
+            continue
+        write_unit(outstream, output_name(name, "xml"), xml.getvalue())
+    return n_errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the XML parse tree of a .jack file, or of all .jack files in a directory.")
+    parser.add_argument("path", help=".jack file or directory containing .jack files, or " + STDIN_PATH +
+                                     " to read classes from stdin and write their XML to stdout, " +
+                                     "framed as described in jackstream.py")
+    parser.add_argument("--tokenizer", choices=sorted(TOKENIZERS), default=DEFAULT_TOKENIZER,
+                        help="tokenizer engine: whole-buffer regex scanner or the old per-character scanner " +
+                             "(default: " + DEFAULT_TOKENIZER + ")")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of files to analyze in parallel worker processes (default: number of cores)")
+    args = parser.parse_args()
+
+    if args.path == STDIN_PATH:
+        sys.exit(1 if analyze_stream(sys.stdin, sys.stdout, args.tokenizer) > 0 else 0)
+
+    thepath = args.path
+    if os.path.isfile(thepath):
+        fpaths = [thepath]
+    else:
+        fpaths = [os.path.join(thepath, fpath) for fpath in os.listdir(thepath) if fpath[-5:] == ".jack"]
+
+    if treatfiles(fpaths, args.tokenizer, args.jobs) > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
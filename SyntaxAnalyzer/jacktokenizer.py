@@ -1,10 +1,23 @@
+import io
 import os
+import re
 from jacktoken import Token
 
 JACK_SYMBOLS = "\{\}()\[\].,;+-*/&|<>=~"
 JACK_WHITE = " \n\t"
 SPECIAL_TOKENS = {"<" : "&lt;", ">" : "&gt;", "&" : "&amp;"}
 
+# master regular expression used by RegexJackTokenizer:
+# at every position we either skip a run of whitespace and comments, or match exactly one token.
+# an opening /* or " that is never closed is caught by the "unclosed" alternative.
+JACK_TOKEN_RE = re.compile(r"""
+      (?P<skip>(?:\s+|//[^\n]*|/\*.*?\*/)+)
+    | "(?P<stringConstant>[^"]*)"
+    | (?P<unclosed>/\*|")
+    | (?P<symbol>[{}()\[\].,;+\-*/&|<>=~])
+    | (?P<word>[^\s{}()\[\].,;+\-*/&|<>=~"]+)
+    """, re.VERBOSE | re.DOTALL)
+
 class JackTokenizer:
     current_token = None
     next_token = None
@@ -119,12 +132,16 @@ class JackTokenizer:
     # API methods
 
     # constructor
-    def __init__(self, filename):
+    # the source text can also be passed directly, in which case filename only names it in messages
+    def __init__(self, filename, source=None):
         self.filename = filename
-        try:
-            self.file = open(filename, 'r')
-        except FileNotFoundError:
-            print(f"File {filename} not found")
+        if source is not None:
+            self.file = io.StringIO(source, newline=None)
+        else:
+            try:
+                self.file = open(filename, 'r')
+            except FileNotFoundError:
+                print(f"File {filename} not found")
         self.find_next_token()
 
     def has_more_tokens(self):
@@ -155,4 +172,51 @@ class JackTokenizer:
         return self.next_token.content
 
 
-    
\ No newline at end of file
+class RegexJackTokenizer(JackTokenizer):
+    """Tokenizer with the same API as JackTokenizer, which reads the whole source once
+    and then scans it with the master regular expression JACK_TOKEN_RE,
+    instead of reading the file one character at a time."""
+
+    source = None
+    pos = 0
+    scan_line = 1
+
+    # main auxiliary method find_next_token:
+    # sets the self.next_token field to the next Token matched in self.source
+    def find_next_token(self):
+        self.next_token = None            # reset next token
+
+        while self.pos < len(self.source):
+            match = JACK_TOKEN_RE.match(self.source, self.pos)
+            kind = match.lastgroup
+            self.pos = match.end()
+            self.current_line = self.scan_line
+
+            if kind == "skip":
+                self.scan_line += match.group().count("\n")
+                continue
+            if kind == "unclosed":
+                raise ValueError("Parsing error: end of file reached while parsing " +
+                                 ("multiline comment" if match.group() == "/*" else "string constant") +
+                                 " started on line " + str(self.current_line) + " of " + self.filename)
+
+            if kind == "word":
+                self.next_token = Token.from_content(match.group())
+            else:
+                self.next_token = Token(kind, match.group(kind))
+                self.scan_line += self.next_token.content.count("\n")
+            return
+
+    # constructor
+    def __init__(self, filename, source=None):
+        self.filename = filename
+        if source is None:
+            with open(filename, 'r') as file:
+                source = file.read()
+        self.source = source
+        self.find_next_token()
+
+
+# tokenizer engines that can be selected with the --tokenizer flag
+TOKENIZERS = {"char": JackTokenizer, "regex": RegexJackTokenizer}
+DEFAULT_TOKENIZER = "regex"